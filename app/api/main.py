@@ -1,17 +1,74 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import Future, wait as futures_wait
+from typing import Optional
 
-from app.api.models import ProvisionRequest
-from app.services import project_builder, github_service, render_service, notification_service
+from app.api.models import ProvisionRequest, BatchProvisionRequest, CampaignDetails, CampaignUpdate
+from app.services import project_builder, github_service, render_service, notification_service, pipeline, template_cache, deploy_tracker, status_writer, shared_runtime, warm_pool, telemetry, checkpoints, janitor
+from app.services.instance_store import store as instance_store, STATUS_DEPLOYING, STATUS_FAILED, STATUS_LIVE
+from app.services.job_queue import ProvisioningQueue, QueueFullError, TERMINAL_STATUSES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Número máximo de campanhas aceites num único pedido de lote
+PROVISION_BATCH_MAX_ITEMS = int(os.getenv("PROVISION_BATCH_MAX_ITEMS", "100"))
+
+def _run_provisioning_job(payload: str) -> dict:
+    """Ponto de entrada dos workers da fila: reconstrói o pedido persistido e executa o fluxo."""
+    return provision_instance_flow(ProvisionRequest.model_validate_json(payload))
+
+provisioning_queue = ProvisioningQueue(handler=_run_provisioning_job)
+
+# Lidas a cada recolha do /metrics
+telemetry.Gauge("bcl_provision_queue_depth", "Jobs de provisionamento à espera ou em curso.",
+                function=provisioning_queue.depth)
+telemetry.Gauge("bcl_pending_deploys", "Deploys no Render à espera de ficarem 'live'.",
+                function=lambda: deploy_tracker.tracker.pending_count())
+telemetry.Gauge("bcl_warm_pool_instances", "Instâncias do warm pool por estado.", ("status",),
+                function=lambda: warm_pool.pool.metrics()["depth"])
+telemetry.Gauge("bcl_cleanups_pending", "Limpezas agendadas ou em curso, por tipo.", ("kind",),
+                function=lambda: checkpoints.store.pending_cleanups())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carrega e pré-compila o template uma única vez antes de aceitar pedidos
+    template_cache.get_manifest()
+    status_writer.writer.start()
+    deploy_tracker.tracker.start()
+    # Deploys que estavam a ser acompanhados quando a fábrica parou
+    _resume_deploy_tracking()
+    # Os workers arrancam com a aplicação e retomam jobs pendentes de execuções anteriores
+    provisioning_queue.start()
+    # Instâncias pré-construídas para ativação imediata (WARM_POOL_SIZE > 0)
+    warm_pool.pool.start()
+    # Compensações de provisionamentos falhados e cópias de trabalho abandonadas
+    janitor.janitor.start()
+    yield
+    janitor.janitor.stop()
+    warm_pool.pool.stop()
+    provisioning_queue.stop()
+    deploy_tracker.tracker.stop()
+    status_writer.writer.stop()
+
 app = FastAPI(
     title="Blue Connect Lead Factory",
     description="API para provisionar novas instâncias do BCL Activate",
-    version="0.2.0" # Version bump for new features
+    version="0.3.0",
+    lifespan=lifespan
 )
 
 # Configuração do CORS
@@ -31,68 +88,443 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def provision_instance_flow(req: ProvisionRequest):
+@telemetry.traced("provision")
+def provision_instance_flow(req: ProvisionRequest) -> dict:
     """
     Orquestra a criação completa de uma nova instância do BCL Activate,
-    com gestão de erros robusta.
+    com gestão de erros robusta. Cada etapa corre dentro do seu limite de
+    concorrência e a sua duração é devolvida em `stage_timings`.
+    Cada passo concluído (repositório, push, serviço) fica registado com os
+    seus artefactos: uma nova tentativa continua do último passo bom, e o que
+    não for retomado dentro da janela é removido pelo janitor.
     """
-    supabase_client = None # Inicializa fora do try para estar acessível no except
     campaign_id = req.campaign_id # Guarda o ID para o bloco except
+    timings = {}
+    remote_repo = None
+
+    # Uma campanha já provisionada é atualizada no sítio, sem novo repositório nem serviço;
+    # se a atualização falhar, a instância atual continua a servir e a campanha não fica 'failed'
+    existing = instance_store.get(campaign_id)
+    if existing and not _instance_usable(existing):
+        # O deploy falhou (ou ficou por acompanhar): o registo não serve para atualizar, a campanha é provisionada de novo
+        logger.info(f"A instância registada da campanha {campaign_id} não ficou 'live' "
+                    f"({existing['status']}); a provisionar de novo.")
+        instance_store.delete(campaign_id)
+        existing = None
+    if existing and (existing["mode"] == "shared") == (req.mode == "shared"):
+        return update_instance_flow(campaign_id, req.campaign_details, existing)
 
     try:
         user_email = req.user_email
         details = req.campaign_details
-        
-        # Cria o cliente Supabase para reportar o status
-        supabase_client = render_service._get_supabase_client()
-        
+        job_start = time.perf_counter()
+
         logger.info(f"Iniciando provisionamento para Campanha ID: {campaign_id}...")
 
-        # 1. Criar uma cópia personalizada do projeto
-        repo_path, repo_name = project_builder.create_project_from_template(campaign_id, details)
-        logger.info(f"Projeto criado em: {repo_path}")
+        if req.mode == "shared":
+            return _provision_shared(req, timings, job_start)
+
+        # Passos concluídos numa tentativa anterior que falhou (cancela a compensação agendada)
+        steps = checkpoints.store.resume(campaign_id)
+        if steps:
+            logger.info(f"A retomar o provisionamento de {campaign_id}; passos já concluídos: {', '.join(steps)}.")
 
-        # 2. Criar repositório no GitHub e fazer push
-        repo_url = github_service.create_and_push_to_github(repo_path, repo_name)
-        logger.info(f"Repositório criado no GitHub: {repo_url}")
+        # Uma instância do warm pool só precisa de receber a configuração da campanha
+        if warm_pool.pool.enabled and not steps:
+            with pipeline.stage("pool", timings):
+                claimed = warm_pool.pool.claim(campaign_id, details)
+            if claimed:
+                result = _activate_from_pool(req, claimed, timings, job_start)
+                _retire_shared_registration(campaign_id, existing)
+                return result
+
+        # 1. Criar o repositório no GitHub em paralelo com a cópia personalizada do projeto
+        if checkpoints.STEP_REPO in steps:
+            repo_name = steps[checkpoints.STEP_REPO]["repo_name"]
+            remote_repo = _completed(steps[checkpoints.STEP_REPO]["repo_url"])
+        else:
+            repo_name = project_builder.generate_repo_name(campaign_id)
+            remote_repo = pipeline.submit("github", timings, _create_repo_step, campaign_id, repo_name)
+
+        if checkpoints.STEP_PUSH in steps:
+            repo_url = remote_repo.result()
+            commit_sha = steps[checkpoints.STEP_PUSH]["commit_sha"]
+            rendered = _render(details)
+        elif github_service.GITHUB_PUSH_MODE == "packstream":
+            # Sem diretório de trabalho: só o main.py personalizado é renderizado e hasheado
+            with pipeline.stage("builder", timings):
+                manifest = template_cache.get_manifest()
+                rendered = project_builder.render_files(manifest, details)
+            repo_url = remote_repo.result()
+            logger.info(f"Repositório criado no GitHub: {repo_url}")
+            with pipeline.stage("github", timings):
+                commit_sha = github_service.push_rendered_to_github(manifest, rendered, repo_name, repo_url)
+            checkpoints.store.record(campaign_id, checkpoints.STEP_PUSH, commit_sha=commit_sha)
+        else:
+            with pipeline.stage("builder", timings):
+                # Uma cópia deixada por uma tentativa anterior é refeita do zero
+                shutil.rmtree(os.path.join(project_builder.OUTPUT_DIR, repo_name), ignore_errors=True)
+                repo_path, repo_name = project_builder.create_project_from_template(campaign_id, details, repo_name)
+            logger.info(f"Projeto criado em: {repo_path}")
+
+            # 2. Fazer push para o repositório criado no GitHub
+            repo_url = remote_repo.result()
+            logger.info(f"Repositório criado no GitHub: {repo_url}")
+            with pipeline.stage("github", timings):
+                commit_sha = github_service.push_to_github(repo_path, repo_name, repo_url)
+            checkpoints.store.record(campaign_id, checkpoints.STEP_PUSH, commit_sha=commit_sha)
+            # Depois do push a cópia de trabalho já não é precisa; o janitor apaga-a
+            checkpoints.store.schedule_cleanup(checkpoints.CLEANUP_WORKDIR, repo_path, campaign_id)
+            rendered = project_builder.render_files(template_cache.get_manifest(), details)
 
         # 3. Fazer deploy no Render
-        service_url = render_service.deploy_to_render(repo_name, repo_url, campaign_id)
+        if checkpoints.STEP_SERVICE in steps:
+            service = steps[checkpoints.STEP_SERVICE]
+            service_id, service_url, bcl_api_key = service["service_id"], service["service_url"], service["api_key"]
+        else:
+            with pipeline.stage("render", timings):
+                service_id, service_url, bcl_api_key = render_service.create_render_service(repo_name, repo_url, campaign_id)
+            checkpoints.store.record(campaign_id, checkpoints.STEP_SERVICE, service_id=service_id,
+                                     service_url=service_url, api_key=bcl_api_key)
         logger.info(f"Deploy iniciado no Render. URL do serviço será: {service_url}")
 
-        # 4. Notificar o usuário (a atualização do status já foi feita pelo render_service)
-        notification_service.send_provisioning_complete_email(user_email, service_url)
-        logger.info(f"Processo de provisionamento para {campaign_id} concluído com sucesso.")
+        # 4. Registar a campanha como 'deploying' no Supabase
+        with pipeline.stage("supabase", timings):
+            render_service._update_campaign_in_supabase(campaign_id, service_url, bcl_api_key, status='deploying')
+        instance_store.save(
+            campaign_id, mode="dedicated", details=details.model_dump(), repo_name=repo_name, repo_url=repo_url,
+            service_id=service_id, service_url=service_url, api_key=bcl_api_key, commit_sha=commit_sha,
+            file_hashes=project_builder.hash_files(rendered), status=STATUS_DEPLOYING, user_email=req.user_email
+        )
+        _retire_shared_registration(campaign_id, existing)
+
+        # 5. A campanha só fica 'active' (e o usuário só é notificado) quando o deploy estiver 'live';
+        # até lá os passos continuam registados, para compensar um deploy que falhe
+        _track_deploy(campaign_id, service_id, service_url, bcl_api_key, user_email)
+
+        timings["total"] = round(time.perf_counter() - job_start, 4)
+        logger.info(f"Provisionamento para {campaign_id} submetido; a aguardar o deploy. Tempos por etapa: {timings}")
+        return {"service_id": service_id, "service_url": service_url, "resumed_steps": sorted(steps),
+                "stage_timings": timings}
 
     except Exception as e:
         error_message = str(e)
         logger.error(f"Falha no fluxo de provisionamento para Campanha ID: {campaign_id}. Erro: {error_message}", exc_info=True)
-        # Tenta atualizar o status da campanha para 'failed'
-        if supabase_client and campaign_id:
-            try:
-                # Trunca a mensagem de erro para caber no campo do URL, se necessário
-                error_for_db = f"Erro: {error_message[:250]}"
-                supabase_client.table('campaigns').update({
-                    'status': 'failed',
-                    'service_url': error_for_db
-                }).eq('id', campaign_id).execute()
-                logger.info(f"Status da campanha {campaign_id} atualizado para 'failed'.")
-            except Exception as db_error:
-                logger.error(f"Não foi possível atualizar o status da campanha {campaign_id} para 'failed'. Erro no DB: {db_error}")
-
-@app.post("/provision/new-instance")
-async def provision_new_instance(req: ProvisionRequest, background_tasks: BackgroundTasks):
+        # Atualiza o status da campanha para 'failed'
+        if campaign_id:
+            render_service._mark_campaign_failed(campaign_id, error_message)
+            # O repositório pode ainda estar a ser criado em paralelo; espera-se por ele para o incluir na compensação
+            if remote_repo is not None:
+                futures_wait([remote_repo])
+            # Os artefactos ficam disponíveis para uma nova tentativa; sem ela, o janitor remove-os
+            if checkpoints.store.schedule_compensation(campaign_id):
+                logger.info(f"Compensação dos artefactos de {campaign_id} agendada para daqui a "
+                            f"{int(checkpoints.PROVISION_RESUME_WINDOW)}s, se não houver nova tentativa.")
+        # Propaga o erro para que a fila registe o job como 'failed'
+        raise
+
+def _track_deploy(campaign_id: str, service_id: str, service_url: str, api_key: str, user_email: str):
+    """Acompanha o deploy de uma instância dedicada até ficar 'live' ou falhar."""
+    def on_ready():
+        ready_timings = {}
+        instance_store.save(campaign_id, status=STATUS_LIVE)
+        # Os artefactos pertencem agora à instância registada
+        checkpoints.store.complete(campaign_id)
+        with pipeline.stage("supabase", ready_timings):
+            render_service._update_campaign_in_supabase(campaign_id, service_url, api_key)
+        # Registos anteriores à coluna user_email não têm a quem notificar
+        if user_email:
+            with pipeline.stage("notify", ready_timings):
+                notification_service.send_provisioning_complete_email(user_email, service_url)
+
+    def on_failed(reason: str):
+        instance_store.save(campaign_id, status=STATUS_FAILED)
+        render_service._mark_campaign_failed(campaign_id, reason)
+        # Um serviço com o deploy falhado não se retoma: é removido já, e a nova tentativa cria outro
+        # a partir do mesmo repositório; o resto segue a compensação de uma falha síncrona
+        checkpoints.store.discard(campaign_id, checkpoints.STEP_SERVICE)
+        checkpoints.store.schedule_cleanup(checkpoints.CLEANUP_SERVICE, service_id)
+        if checkpoints.store.schedule_compensation(campaign_id):
+            logger.info(f"Compensação dos artefactos de {campaign_id} agendada para daqui a "
+                        f"{int(checkpoints.PROVISION_RESUME_WINDOW)}s, se não houver nova tentativa.")
+
+    deploy_tracker.tracker.track(str(campaign_id), service_id, on_ready=on_ready, on_failed=on_failed)
+
+def _resume_deploy_tracking():
+    """Volta a acompanhar os deploys registados como 'deploying'; o acompanhamento só vive em memória."""
+    for instance in instance_store.pending_deploys():
+        if not instance["service_id"]:
+            continue
+        logger.info(f"A retomar o acompanhamento do deploy da campanha {instance['campaign_id']}.")
+        _track_deploy(instance["campaign_id"], instance["service_id"], instance["service_url"],
+                      instance["api_key"], instance["user_email"])
+
+def _instance_usable(instance: dict) -> bool:
+    """Só uma instância 'live' (ou com o deploy ainda acompanhado) é atualizada no sítio."""
+    if instance["status"] in (None, STATUS_LIVE):
+        return True
+    if instance["status"] == STATUS_DEPLOYING:
+        deploy = deploy_tracker.tracker.status(str(instance["campaign_id"]))
+        return bool(deploy and deploy["state"] == "pending")
+    return False
+
+def _retire_shared_registration(campaign_id: str, previous: Optional[dict]):
+    """A campanha passou do runtime partilhado para uma instância própria: deixa de ser servida pelo partilhado."""
+    if not previous or previous["mode"] != "shared":
+        return
+    try:
+        shared_runtime.deactivate_campaign(campaign_id)
+    except Exception as e:
+        logger.error(f"Não foi possível desativar a campanha {campaign_id} no runtime partilhado: {e}")
+
+def _create_repo_step(campaign_id: str, repo_name: str) -> str:
+    repo_url = github_service.create_remote_repo(repo_name)
+    checkpoints.store.record(campaign_id, checkpoints.STEP_REPO, repo_name=repo_name, repo_url=repo_url)
+    return repo_url
+
+def _completed(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+def _provision_shared(req: ProvisionRequest, timings: dict, job_start: float) -> dict:
+    """Modo partilhado: a campanha é servida pelo runtime multi-tenant, sem repositório nem serviço."""
+    with pipeline.stage("supabase", timings):
+        service_url, bcl_api_key, webhook_id = shared_runtime.register_campaign(req.campaign_id, req.campaign_details)
+        render_service._update_campaign_in_supabase(req.campaign_id, service_url, bcl_api_key)
+        # Sem serviço próprio, o webhook_id é o que identifica a campanha no runtime partilhado
+        webhook_url = shared_runtime.webhook_url(service_url, webhook_id)
+        status_writer.writer.write(req.campaign_id, {'webhook_id': webhook_id, 'webhook_url': webhook_url})
+    instance_store.save(
+        req.campaign_id, mode="shared", details=req.campaign_details.model_dump(), service_url=service_url,
+        api_key=bcl_api_key, file_hashes=project_builder.hash_files(_render(req.campaign_details)),
+        webhook_id=webhook_id, status=STATUS_LIVE
+    )
+    with pipeline.stage("notify", timings):
+        notification_service.send_provisioning_complete_email(req.user_email, service_url)
+
+    timings["total"] = round(time.perf_counter() - job_start, 4)
+    logger.info(f"Campanha {req.campaign_id} ativa no runtime partilhado. Tempos por etapa: {timings}")
+    return {"service_url": service_url, "webhook_id": webhook_id, "webhook_url": webhook_url, "mode": "shared",
+            "stage_timings": timings}
+
+def _activate_from_pool(req: ProvisionRequest, claimed: dict, timings: dict, job_start: float) -> dict:
+    """A instância já está 'live': a campanha fica ativa de imediato."""
+    with pipeline.stage("supabase", timings):
+        render_service._update_campaign_in_supabase(req.campaign_id, claimed["service_url"], claimed["api_key"])
+    instance_store.save(
+        req.campaign_id, mode="warm_pool", details=req.campaign_details.model_dump(),
+        file_hashes=project_builder.hash_files(_render(req.campaign_details)),
+        status=STATUS_LIVE,
+        **{k: claimed[k] for k in ("repo_name", "repo_url", "service_id", "service_url", "api_key", "admin_key")}
+    )
+    with pipeline.stage("notify", timings):
+        notification_service.send_provisioning_complete_email(req.user_email, claimed["service_url"])
+
+    timings["total"] = round(time.perf_counter() - job_start, 4)
+    logger.info(f"Campanha {req.campaign_id} ativa numa instância do warm pool. Tempos por etapa: {timings}")
+    return {"service_id": claimed["service_id"], "service_url": claimed["service_url"], "mode": "warm_pool",
+            "stage_timings": timings}
+
+# Atualizações da mesma campanha são serializadas
+_campaign_locks: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+
+@telemetry.traced("update")
+def update_instance_flow(campaign_id: str, details: CampaignDetails, instance: dict) -> dict:
+    """
+    Aplica uma edição da campanha à instância existente. Só os ficheiros
+    renderizados cujo hash mudou contam como alteração; sem alterações não
+    há push nem deploy. Instâncias dedicadas recebem um único commit pequeno
+    (o Render faz o redeploy); as do warm pool e do runtime partilhado são
+    reconfiguradas no sítio.
+    """
+    timings = {}
+    job_start = time.perf_counter()
+    with _campaign_locks[str(campaign_id)]:
+        instance = instance_store.get(campaign_id) or instance
+        with pipeline.stage("builder", timings):
+            manifest = template_cache.get_manifest()
+            rendered = project_builder.render_files(manifest, details)
+            hashes = project_builder.hash_files(rendered)
+        previous = instance["file_hashes"] or {}
+        changed = sorted(path for path, digest in hashes.items() if previous.get(path) != digest)
+
+        result = {"service_url": instance["service_url"], "mode": instance["mode"], "changed_files": changed}
+        if instance["mode"] == "shared" and instance["webhook_id"]:
+            result["webhook_id"] = instance["webhook_id"]
+            result["webhook_url"] = shared_runtime.webhook_url(instance["service_url"], instance["webhook_id"])
+        if not changed:
+            instance_store.save(campaign_id, details=details.model_dump())
+            logger.info(f"Campanha {campaign_id} sem alterações nos ficheiros renderizados; nada a enviar.")
+            return {**result, "status": "unchanged", "stage_timings": timings}
+
+        system_prompt = project_builder.build_system_prompt(details)
+        fields = {"details": details.model_dump(), "file_hashes": hashes}
+        if instance["mode"] == "dedicated":
+            with pipeline.stage("github", timings):
+                fields["commit_sha"] = github_service.push_update_to_github(
+                    manifest, rendered, instance["repo_name"], instance["repo_url"], instance["commit_sha"]
+                )
+            result["commit_sha"] = fields["commit_sha"]
+        elif instance["mode"] == "warm_pool":
+            with pipeline.stage("render", timings):
+                warm_pool.configure_instance(instance, system_prompt, instance["api_key"])
+        else:
+            with pipeline.stage("supabase", timings):
+                shared_runtime.update_campaign(campaign_id, system_prompt)
+        instance_store.save(campaign_id, **fields)
+
+    timings["total"] = round(time.perf_counter() - job_start, 4)
+    logger.info(f"Campanha {campaign_id} atualizada ({', '.join(changed)}). Tempos por etapa: {timings}")
+    return {**result, "status": "updated", "stage_timings": timings}
+
+def _render(details: CampaignDetails) -> dict[str, str]:
+    return project_builder.render_files(template_cache.get_manifest(), details)
+
+@app.post("/provision/new-instance", status_code=202)
+async def provision_new_instance(req: ProvisionRequest):
     """
     Endpoint para solicitar a criação de uma nova instância.
-    Recebe os detalhes da campanha e inicia o processo em segundo plano.
+    Recebe os detalhes da campanha e coloca o provisionamento na fila persistente.
     """
     if not req.campaign_id or not req.user_email or not req.campaign_details:
         raise HTTPException(status_code=400, detail="Dados da campanha, ID e e-mail do usuário são obrigatórios.")
 
     logger.info(f"Requisição de provisionamento recebida para o usuário: {req.user_email}")
-    background_tasks.add_task(provision_instance_flow, req)
+    try:
+        job = provisioning_queue.enqueue(req.campaign_id, req.model_dump_json())
+    except QueueFullError as e:
+        logger.warning(f"Pedido de provisionamento para {req.campaign_id} recusado: {e}")
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "A fábrica está com a capacidade máxima. Tente novamente em alguns minutos."},
+            headers={"Retry-After": "30"}
+        )
+
+    return {
+        "message": f"Ativação iniciada! O motor da campanha '{req.campaign_details.campaignName}' está sendo construído. Você receberá um e-mail quando estiver pronto.",
+        "job_id": job["job_id"],
+        "status": job["status"]
+    }
+
+@app.post("/provision/batch", status_code=202)
+async def provision_batch(batch: BatchProvisionRequest):
+    """
+    Enfileira o provisionamento de várias campanhas de uma vez. Pedidos repetidos
+    da mesma campanha são descartados; o progresso de cada item pode ser
+    acompanhado em /provision/batch/{batch_id}/stream.
+    """
+    if len(batch.items) > PROVISION_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"O lote pode ter no máximo {PROVISION_BATCH_MAX_ITEMS} campanhas.")
+
+    unique, duplicates, seen = [], [], {}
+    for index, req in enumerate(batch.items):
+        if not req.campaign_id or not req.user_email:
+            raise HTTPException(status_code=400, detail=f"Item {index}: ID da campanha e e-mail do usuário são obrigatórios.")
+        config_hash = hashlib.sha1(req.model_dump_json().encode()).hexdigest()
+        first = seen.get(req.campaign_id)
+        if first is not None:
+            duplicates.append({
+                "index": index, "campaign_id": req.campaign_id, "duplicate_of": first[0],
+                "reason": "identical" if first[1] == config_hash else "conflicting_config"
+            })
+            continue
+        seen[req.campaign_id] = (index, config_hash)
+        unique.append(req)
+
+    batch_id = uuid.uuid4().hex
+    try:
+        jobs = provisioning_queue.enqueue_many(
+            [(req.campaign_id, req.model_dump_json()) for req in unique], batch_id=batch_id
+        )
+    except QueueFullError as e:
+        logger.warning(f"Lote com {len(unique)} campanhas recusado: {e}")
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "A fábrica não tem capacidade para este lote agora. Tente novamente em alguns minutos."},
+            headers={"Retry-After": "30"}
+        )
+
+    logger.info(f"Lote {batch_id} recebido: {len(unique)} campanhas, {len(duplicates)} duplicada(s).")
+    return {
+        "batch_id": batch_id,
+        "accepted": len(jobs),
+        "duplicates": duplicates,
+        "items": [{"campaign_id": job["campaign_id"], "job_id": job["job_id"], "status": job["status"]} for job in jobs],
+        "stream_url": f"/provision/batch/{batch_id}/stream"
+    }
+
+@app.get("/provision/batch/{batch_id}/stream")
+async def stream_batch_progress(batch_id: str):
+    """
+    Stream NDJSON com uma linha por item à medida que cada provisionamento do
+    lote termina, seguida de uma linha de resumo.
+    """
+    if not provisioning_queue.list_batch(batch_id):
+        raise HTTPException(status_code=404, detail="Lote não encontrado.")
+
+    async def progress():
+        reported = set()
+        while True:
+            jobs = provisioning_queue.list_batch(batch_id)
+            for job in jobs:
+                if job["status"] in TERMINAL_STATUSES and job["job_id"] not in reported:
+                    reported.add(job["job_id"])
+                    yield json.dumps({"type": "item", **job}) + "\n"
+            if len(reported) == len(jobs):
+                summary = {status: sum(1 for job in jobs if job["status"] == status) for status in TERMINAL_STATUSES}
+                yield json.dumps({"type": "summary", "batch_id": batch_id, "total": len(jobs), **summary}) + "\n"
+                return
+            await asyncio.sleep(1.0)
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@app.get("/provision/{campaign_id}/status")
+def get_provision_status(campaign_id: str):
+    """Permite ao frontend consultar o estado do provisionamento de uma campanha."""
+    job = provisioning_queue.get_status(campaign_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Nenhum provisionamento encontrado para esta campanha.")
+    job["deploy"] = deploy_tracker.tracker.status(campaign_id)
+    # Passos já concluídos de um provisionamento por terminar (retomados na próxima tentativa)
+    job["completed_steps"] = sorted(checkpoints.store.get(campaign_id))
+    return job
+
+@app.patch("/provision/{campaign_id}")
+async def update_campaign_instance(campaign_id: str, update: CampaignUpdate):
+    """
+    Atualiza a instância já provisionada de uma campanha com os campos alterados.
+    Responde em segundos: não cria repositório nem serviço, e não envia nada se
+    o resultado renderizado for igual ao atual.
+    """
+    instance = instance_store.get(campaign_id)
+    if not instance:
+        raise HTTPException(status_code=404, detail="Nenhuma instância provisionada para esta campanha.")
+    details = CampaignDetails(**{**instance["details"], **update.model_dump(exclude_none=True)})
+    try:
+        return await run_in_threadpool(update_instance_flow, campaign_id, details, instance)
+    except Exception as e:
+        logger.error(f"Falha ao atualizar a instância da campanha {campaign_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=502, detail=f"Falha ao atualizar a instância: {str(e)[:200]}")
+
+@app.get("/provision/metrics/stages")
+def get_stage_metrics():
+    """Duração agregada de cada etapa, para identificar a dependência externa mais lenta."""
+    return {
+        "queue_depth": provisioning_queue.depth(),
+        "pending_deploys": deploy_tracker.tracker.pending_count(),
+        "stages": pipeline.get_stage_stats()
+    }
+
+@app.get("/provision/metrics/pool")
+def get_pool_metrics():
+    """Profundidade do warm pool por estado e latência das atribuições."""
+    return warm_pool.pool.metrics()
 
-    return {"message": f"Ativação iniciada! O motor da campanha '{req.campaign_details.campaignName}' está sendo construído. Você receberá um e-mail quando estiver pronto."}
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    """Contadores e histogramas da fábrica no formato de texto do Prometheus."""
+    return PlainTextResponse(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
 
 
 @app.get("/")
@@ -1,6 +1,7 @@
 # fabrica-bcl/app/api/models.py
 
-from pydantic import BaseModel
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
 
 class CampaignDetails(BaseModel):
     """Define a estrutura dos detalhes da campanha vindos do frontend."""
@@ -15,4 +16,19 @@ class ProvisionRequest(BaseModel):
     """Define a estrutura completa do pedido de provisionamento."""
     campaign_id: str
     user_email: str
-    campaign_details: CampaignDetails
\ No newline at end of file
+    campaign_details: CampaignDetails
+    # "dedicated": repositório e serviço próprios; "shared": registada no runtime multi-tenant
+    mode: Literal["dedicated", "shared"] = "dedicated"
+
+class BatchProvisionRequest(BaseModel):
+    """Pedido de provisionamento em lote, para agências que ativam várias campanhas de uma vez."""
+    items: list[ProvisionRequest] = Field(min_length=1)
+
+class CampaignUpdate(BaseModel):
+    """Campos da campanha a alterar numa instância existente; os omitidos mantêm o valor atual."""
+    campaignName: Optional[str] = None
+    objective: Optional[str] = None
+    assistantPersona: Optional[str] = None
+    toneOfVoice: Optional[str] = None
+    offer: Optional[str] = None
+    customerProfile: Optional[str] = None
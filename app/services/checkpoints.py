@@ -0,0 +1,233 @@
+# fabrica-bcl/app/services/checkpoints.py
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+from app.services import project_builder
+
+logger = logging.getLogger(__name__)
+
+# Ficheiro SQLite com os passos concluídos de cada provisionamento e as limpezas pendentes
+PROVISION_CHECKPOINT_DB = os.getenv(
+    "PROVISION_CHECKPOINT_DB", os.path.join('/tmp', 'bcl_factory', 'checkpoints.sqlite3')
+)
+# Tempo (segundos) durante o qual um provisionamento falhado pode ser retomado antes de ser desfeito
+PROVISION_RESUME_WINDOW = float(os.getenv("PROVISION_RESUME_WINDOW", "3600"))
+
+# Passos do provisionamento dedicado, pela ordem em que acontecem
+STEP_REPO = "repo"
+STEP_PUSH = "push"
+STEP_SERVICE = "service"
+
+# Tipos de limpeza: o alvo é o nome do repositório, o ID do serviço ou o caminho local
+CLEANUP_REPO = "repo"
+CLEANUP_SERVICE = "service"
+CLEANUP_WORKDIR = "workdir"
+
+CLEANUP_PENDING = "pending"
+CLEANUP_RUNNING = "running"
+CLEANUP_DONE = "done"
+CLEANUP_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS provisioning_steps (
+    campaign_id TEXT NOT NULL,
+    step TEXT NOT NULL,
+    artifacts TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (campaign_id, step)
+);
+CREATE TABLE IF NOT EXISTS cleanup_tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id TEXT,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    due_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (kind, target)
+);
+CREATE INDEX IF NOT EXISTS idx_cleanup_due ON cleanup_tasks (status, due_at);
+"""
+
+
+class CheckpointStore:
+    """
+    Passos já concluídos de cada provisionamento dedicado, com os artefactos
+    criados (repositório, commit, serviço), para que uma nova tentativa
+    continue do último passo bom em vez de recomeçar. Guarda também as
+    limpezas (compensações) agendadas, que o janitor executa em segundo plano.
+    """
+
+    def __init__(self, db_path: str = PROVISION_CHECKPOINT_DB):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_dir = os.path.dirname(self._db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    # --- PASSOS ---
+    def record(self, campaign_id, step: str, **artifacts):
+        """Regista um passo concluído e os artefactos que criou."""
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO provisioning_steps (campaign_id, step, artifacts, completed_at) VALUES (?, ?, ?, ?)",
+                (str(campaign_id), step, json.dumps(artifacts), time.time())
+            )
+
+    def get(self, campaign_id) -> dict[str, dict]:
+        with self._lock:
+            return self._steps_locked(str(campaign_id))
+
+    def resume(self, campaign_id) -> dict[str, dict]:
+        """
+        Devolve os passos a retomar e cancela a compensação ainda pendente da
+        campanha. Se o janitor já estiver a desfazer os artefactos, descarta os
+        passos e a nova tentativa recomeça do início.
+        """
+        campaign_id = str(campaign_id)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cleanup_tasks WHERE campaign_id = ? AND status = ?", (campaign_id, CLEANUP_PENDING))
+            running = conn.execute("SELECT 1 FROM cleanup_tasks WHERE campaign_id = ? AND status = ? AND kind != ?",
+                                   (campaign_id, CLEANUP_RUNNING, CLEANUP_WORKDIR)).fetchone()
+            if running:
+                conn.execute("DELETE FROM provisioning_steps WHERE campaign_id = ?", (campaign_id,))
+                return {}
+            return self._steps_locked(campaign_id)
+
+    def discard(self, campaign_id, step: str):
+        """Esquece um passo que não pode ser retomado; a próxima tentativa volta a executá-lo."""
+        with self._lock:
+            self._connect().execute("DELETE FROM provisioning_steps WHERE campaign_id = ? AND step = ?",
+                                    (str(campaign_id), step))
+
+    def complete(self, campaign_id):
+        """O provisionamento terminou: os artefactos passam a pertencer à instância registada."""
+        with self._lock:
+            self._connect().execute("DELETE FROM provisioning_steps WHERE campaign_id = ?", (str(campaign_id),))
+
+    def in_progress_repo_names(self) -> set[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT artifacts FROM provisioning_steps WHERE step = ?", (STEP_REPO,)).fetchall()
+        return {json.loads(row["artifacts"])["repo_name"] for row in rows}
+
+    def _steps_locked(self, campaign_id: str) -> dict[str, dict]:
+        rows = self._connect().execute(
+            "SELECT step, artifacts FROM provisioning_steps WHERE campaign_id = ?", (campaign_id,)).fetchall()
+        return {row["step"]: json.loads(row["artifacts"]) for row in rows}
+
+    # --- COMPENSAÇÃO ---
+    def schedule_compensation(self, campaign_id, delay: float = PROVISION_RESUME_WINDOW) -> int:
+        """
+        Agenda a remoção dos artefactos de um provisionamento falhado para daqui
+        a `delay` segundos (a janela em que ainda pode ser retomado). O serviço
+        é removido antes do repositório de que depende.
+        """
+        steps = self.get(campaign_id)
+        tasks = []
+        if STEP_SERVICE in steps:
+            tasks.append((CLEANUP_SERVICE, steps[STEP_SERVICE]["service_id"]))
+        if STEP_REPO in steps:
+            repo_name = steps[STEP_REPO]["repo_name"]
+            tasks.append((CLEANUP_REPO, repo_name))
+            # Cópia de trabalho deixada pelo modo workdir, se existir
+            tasks.append((CLEANUP_WORKDIR, os.path.join(project_builder.OUTPUT_DIR, repo_name)))
+        for kind, target in tasks:
+            self.schedule_cleanup(kind, target, campaign_id, delay)
+        return len(tasks)
+
+    def schedule_cleanup(self, kind: str, target: str, campaign_id=None, delay: float = 0.0):
+        """
+        Agenda uma limpeza. Só as associadas a `campaign_id` são canceladas
+        quando a campanha é retomada; sem campanha, a limpeza corre sempre.
+        """
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO cleanup_tasks (campaign_id, kind, target, status, due_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, target) DO UPDATE SET status = excluded.status, due_at = excluded.due_at, "
+                "campaign_id = excluded.campaign_id, updated_at = excluded.updated_at "
+                "WHERE cleanup_tasks.status != ?",
+                (None if campaign_id is None else str(campaign_id), kind, target, CLEANUP_PENDING,
+                 now + delay, now, CLEANUP_RUNNING)
+            )
+
+    def claim_cleanups(self, limit: int) -> list[dict]:
+        """
+        Reserva as limpezas vencidas. Os passos das campanhas afetadas são
+        descartados na mesma operação, para que nenhuma nova tentativa retome
+        artefactos que estão a ser removidos.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT * FROM cleanup_tasks WHERE status = ? AND due_at <= ? ORDER BY due_at, id LIMIT ?",
+                (CLEANUP_PENDING, now, limit)
+            ).fetchall()
+            if not rows:
+                return []
+            conn.execute("BEGIN")
+            for row in rows:
+                conn.execute("UPDATE cleanup_tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                             (CLEANUP_RUNNING, now, row["id"]))
+                if row["campaign_id"] and row["kind"] != CLEANUP_WORKDIR:
+                    conn.execute("DELETE FROM provisioning_steps WHERE campaign_id = ?", (row["campaign_id"],))
+            conn.execute("COMMIT")
+        return [dict(row) for row in rows]
+
+    def finish_cleanup(self, task_id: int, error: Optional[str] = None, retry_in: Optional[float] = None):
+        """Fecha uma limpeza; com `retry_in` volta a ficar pendente para nova tentativa."""
+        if error is None:
+            status, due = CLEANUP_DONE, None
+        elif retry_in is not None:
+            status, due = CLEANUP_PENDING, time.time() + retry_in
+        else:
+            status, due = CLEANUP_FAILED, None
+        with self._lock:
+            self._connect().execute(
+                "UPDATE cleanup_tasks SET status = ?, error = ?, due_at = COALESCE(?, due_at), updated_at = ? WHERE id = ?",
+                (status, error, due, time.time(), task_id)
+            )
+
+    def requeue_interrupted(self) -> int:
+        """Limpezas interrompidas por um reinício voltam à fila."""
+        with self._lock:
+            return self._connect().execute(
+                "UPDATE cleanup_tasks SET status = ? WHERE status = ?", (CLEANUP_PENDING, CLEANUP_RUNNING)).rowcount
+
+    def pending_cleanups(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT kind, COUNT(*) AS n FROM cleanup_tasks WHERE status IN (?, ?) GROUP BY kind",
+                (CLEANUP_PENDING, CLEANUP_RUNNING)
+            ).fetchall()
+        return {row["kind"]: row["n"] for row in rows}
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+
+# Instância partilhada pela fábrica
+store = CheckpointStore()
@@ -0,0 +1,112 @@
+# fabrica-bcl/app/services/clients.py
+
+import os
+import logging
+import threading
+from typing import Any, Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do pool de ligações HTTP (por host) partilhado pelos jobs de provisionamento
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# Timeouts (segundos) de ligação e de leitura para chamadas às APIs externas
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_lock = threading.Lock()
+_clients: dict[str, Any] = {}
+_factories: dict[str, Callable[[], Any]] = {}
+
+
+def register(name: str, factory: Callable[[], Any]):
+    """Regista a fábrica de um cliente. A instância só é criada no primeiro `get`."""
+    with _lock:
+        _factories[name] = factory
+        _clients.pop(name, None)
+
+
+def get(name: str) -> Any:
+    """Devolve o cliente partilhado `name`, criando-o na primeira utilização."""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            if name not in _factories:
+                raise KeyError(f"Nenhum cliente registado com o nome '{name}'.")
+            client = _factories[name]()
+            _clients[name] = client
+            logger.info(f"Cliente partilhado '{name}' inicializado.")
+        return client
+
+
+def override(name: str, client: Any):
+    """Substitui um cliente já construído (útil para apontar para serviços locais)."""
+    with _lock:
+        _clients[name] = client
+
+
+def reset(name: str = None):
+    """Descarta um (ou todos os) clientes; a próxima chamada a `get` volta a criá-los."""
+    with _lock:
+        names = [name] if name else list(_clients)
+        for key in names:
+            client = _clients.pop(key, None)
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"Erro ao fechar o cliente '{key}': {e}")
+
+
+def http_session() -> requests.Session:
+    return get("http")
+
+
+def supabase():
+    return get("supabase")
+
+
+def github():
+    return get("github")
+
+
+# --- FÁBRICAS PADRÃO ---
+def _build_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _build_supabase_client():
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("As variáveis de ambiente SUPABASE_URL e SUPABASE_KEY são obrigatórias.")
+    options = SyncClientOptions(postgrest_client_timeout=HTTP_READ_TIMEOUT)
+    return create_client(url, key, options=options)
+
+
+def _build_github_client():
+    from github import Github
+
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise ValueError("A variável de ambiente GITHUB_TOKEN é obrigatória.")
+    return Github(token, timeout=int(HTTP_READ_TIMEOUT), pool_size=HTTP_POOL_SIZE)
+
+
+register("http", _build_http_session)
+register("supabase", _build_supabase_client)
+register("github", _build_github_client)
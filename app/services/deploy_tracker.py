@@ -0,0 +1,193 @@
+# fabrica-bcl/app/services/deploy_tracker.py
+
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from app.services import render_service, telemetry
+
+logger = logging.getLogger(__name__)
+
+# Backoff exponencial (segundos) entre consultas ao estado de um deploy
+DEPLOY_POLL_INITIAL_DELAY = float(os.getenv("DEPLOY_POLL_INITIAL_DELAY", "5"))
+DEPLOY_POLL_MAX_DELAY = float(os.getenv("DEPLOY_POLL_MAX_DELAY", "60"))
+# Tempo máximo à espera que um deploy fique 'live' antes de o dar como falhado
+DEPLOY_READY_TIMEOUT = float(os.getenv("DEPLOY_READY_TIMEOUT", "1800"))
+# Consultas simultâneas à API do Render
+DEPLOY_POLL_CONCURRENCY = int(os.getenv("DEPLOY_POLL_CONCURRENCY", "8"))
+
+READY_STATUSES = {"live"}
+FAILED_STATUSES = {"build_failed", "update_failed", "pre_deploy_failed", "canceled", "deactivated"}
+# Número de resultados finais guardados para consulta
+_MAX_RESULTS = 1000
+
+DEPLOY_DURATION = telemetry.Histogram(
+    "bcl_deploy_duration_seconds", "Tempo desde a criação do serviço até o deploy ficar 'live' ou falhar.", ("state",),
+    buckets=(5, 15, 30, 60, 120, 180, 300, 600, 900, 1800)
+)
+
+
+@dataclass
+class PendingDeploy:
+    key: str
+    service_id: str
+    on_ready: Callable[[], None]
+    on_failed: Callable[[str], None]
+    started_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    last_status: Optional[str] = None
+
+
+class DeployTracker:
+    """
+    Acompanha muitos deploys pendentes a partir de uma única tarefa asyncio,
+    numa thread dedicada. Cada deploy é consultado com backoff exponencial
+    com jitter até ficar 'live', falhar ou exceder o timeout.
+    A função `poll(service_id) -> status` pode ser síncrona ou assíncrona.
+    """
+
+    def __init__(self, poll: Callable, initial_delay: float = DEPLOY_POLL_INITIAL_DELAY,
+                 max_delay: float = DEPLOY_POLL_MAX_DELAY, timeout: float = DEPLOY_READY_TIMEOUT,
+                 concurrency: int = DEPLOY_POLL_CONCURRENCY):
+        self._poll = poll
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._timeout = timeout
+        self._concurrency = concurrency
+        self._pending: dict[str, PendingDeploy] = {}
+        self._results: OrderedDict[str, str] = OrderedDict()
+        self._schedule: list[tuple[float, int, PendingDeploy]] = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    # --- CICLO DE VIDA ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="deploy-tracker", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout: float = 5.0):
+        if self._loop and self._thread and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+        self._thread = None
+
+    # --- API PÚBLICA ---
+    def track(self, key: str, service_id: str, on_ready: Callable[[], None], on_failed: Callable[[str], None]):
+        """Passa a acompanhar um deploy (thread-safe). `key` identifica a campanha."""
+        if not self._loop:
+            raise RuntimeError("O DeployTracker não foi iniciado.")
+        deploy = PendingDeploy(key=key, service_id=service_id, on_ready=on_ready, on_failed=on_failed)
+        # Registado já, para que status() o veja 'pending' assim que track() regressa;
+        # só o agendamento da primeira consulta passa pelo event loop
+        self._pending[key] = deploy
+        self._results.pop(key, None)
+        self._loop.call_soon_threadsafe(self._reschedule, deploy)
+
+    def status(self, key: str) -> Optional[dict]:
+        deploy = self._pending.get(key)
+        if deploy:
+            return {"state": "pending", "service_id": deploy.service_id, "last_status": deploy.last_status,
+                    "polls": deploy.attempts, "waiting_seconds": round(time.monotonic() - deploy.started_at, 1)}
+        if key in self._results:
+            return {"state": self._results[key]}
+        return None
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    # --- INTERNOS ---
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._loop.create_task(self._scheduler())
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+            self._loop = None
+
+    def _reschedule(self, deploy: PendingDeploy):
+        heapq.heappush(self._schedule, (time.monotonic() + self._next_delay(deploy), next(self._sequence), deploy))
+        self._wakeup.set()
+
+    def _next_delay(self, deploy: PendingDeploy) -> float:
+        delay = min(self._max_delay, self._initial_delay * (2 ** deploy.attempts))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _scheduler(self):
+        """Única tarefa que dorme até ao próximo deploy a vencer e lança as consultas."""
+        semaphore = asyncio.Semaphore(self._concurrency)
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._schedule and self._schedule[0][0] <= now:
+                _, _, deploy = heapq.heappop(self._schedule)
+                # Ignora entradas de um deploy que entretanto foi substituído ou concluído
+                if self._pending.get(deploy.key) is deploy:
+                    asyncio.ensure_future(self._check(deploy, semaphore))
+            timeout = self._schedule[0][0] - now if self._schedule else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, deploy: PendingDeploy, semaphore: asyncio.Semaphore):
+        deploy.attempts += 1
+        try:
+            async with semaphore:
+                if asyncio.iscoroutinefunction(self._poll):
+                    status = await self._poll(deploy.service_id)
+                else:
+                    status = await asyncio.to_thread(self._poll, deploy.service_id)
+            deploy.last_status = status
+        except Exception as e:
+            logger.warning(f"Falha ao consultar o deploy do serviço {deploy.service_id}: {e}")
+            status = None
+
+        if status in READY_STATUSES:
+            await self._finish(deploy, "live", deploy.on_ready)
+        elif status in FAILED_STATUSES:
+            await self._finish(deploy, "failed", deploy.on_failed, f"Deploy terminou com o estado '{status}'.")
+        elif time.monotonic() - deploy.started_at > self._timeout:
+            await self._finish(deploy, "failed", deploy.on_failed,
+                               f"O deploy não ficou disponível em {int(self._timeout)} segundos.")
+        else:
+            self._reschedule(deploy)
+
+    async def _finish(self, deploy: PendingDeploy, state: str, callback: Callable, *args):
+        self._pending.pop(deploy.key, None)
+        self._results[deploy.key] = state
+        DEPLOY_DURATION.observe(time.monotonic() - deploy.started_at, state=state)
+        while len(self._results) > _MAX_RESULTS:
+            self._results.popitem(last=False)
+        logger.info(f"Deploy do serviço {deploy.service_id} (campanha {deploy.key}) terminou: {state} "
+                    f"após {deploy.attempts} consulta(s) e {time.monotonic() - deploy.started_at:.1f}s.")
+        try:
+            await asyncio.to_thread(callback, *args)
+        except Exception as e:
+            logger.error(f"Erro no callback do deploy {deploy.service_id}: {e}", exc_info=True)
+
+
+# Instância partilhada pela fábrica, consultando a API do Render
+tracker = DeployTracker(poll=render_service.get_deploy_status)
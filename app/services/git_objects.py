@@ -0,0 +1,354 @@
+# fabrica-bcl/app/services/git_objects.py
+
+import os
+import stat
+import zlib
+import struct
+import hashlib
+import logging
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from app.services import clients
+from app.services.template_cache import TemplateManifest
+
+logger = logging.getLogger(__name__)
+
+GIT_AUTHOR_NAME = os.getenv("GIT_AUTHOR_NAME", "BCL Factory")
+GIT_AUTHOR_EMAIL = os.getenv("GIT_AUTHOR_EMAIL", "factory@blueconnectlead.com")
+
+ZERO_SHA = "0" * 40
+_TYPE_CODES = {"commit": 1, "tree": 2, "blob": 3}
+_MODE_FILE = "100644"
+_MODE_EXEC = "100755"
+_MODE_TREE = "40000"
+
+
+@dataclass(frozen=True)
+class GitObject:
+    """Objeto git já hasheado, com a entrada do packfile (cabeçalho + zlib) pronta a enviar."""
+    sha: str
+    type: str
+    pack_entry: bytes
+
+
+@dataclass
+class TemplateObjects:
+    """Blobs e árvores do template que não mudam entre instâncias."""
+    fingerprint: str
+    blobs: dict[str, GitObject]
+    modes: dict[str, str]
+    static_trees: dict[str, GitObject]
+
+
+class PushRejectedError(Exception):
+    """O remoto recusou o pack ou a atualização da referência."""
+
+
+class StaleRefError(PushRejectedError):
+    """A ref remota já não está no commit esperado (alguém fez push entretanto)."""
+
+
+def make_object(obj_type: str, data: bytes) -> GitObject:
+    header = f"{obj_type} {len(data)}".encode() + b"\0"
+    sha = hashlib.sha1(header + data).hexdigest()
+    return GitObject(sha=sha, type=obj_type, pack_entry=_pack_header(obj_type, len(data)) + zlib.compress(data))
+
+
+_cache_lock = threading.Lock()
+_template_objects: Optional[TemplateObjects] = None
+
+
+def get_template_objects(manifest: TemplateManifest) -> TemplateObjects:
+    """Hasheia e comprime os ficheiros estáticos do template uma única vez por versão do template."""
+    global _template_objects
+    with _cache_lock:
+        if _template_objects and _template_objects.fingerprint == manifest.fingerprint:
+            return _template_objects
+
+        rendered_paths = manifest.rendered_paths
+        blobs, modes = {}, {}
+        for rel_path in manifest.files:
+            if rel_path in rendered_paths:
+                continue
+            abs_path = os.path.join(manifest.root, rel_path)
+            with open(abs_path, 'rb') as f:
+                blobs[rel_path] = make_object("blob", f.read())
+            modes[rel_path] = _MODE_EXEC if os.stat(abs_path).st_mode & stat.S_IXUSR else _MODE_FILE
+
+        dynamic_dirs = {d for rel_path in rendered_paths for d in _parent_dirs(rel_path)}
+        static_trees: dict[str, GitObject] = {}
+        layout = _layout(manifest.files)
+        for directory in _deepest_first(layout):
+            if directory in dynamic_dirs:
+                continue
+            static_trees[directory] = _tree_object(directory, layout, blobs, modes, static_trees)
+
+        _template_objects = TemplateObjects(manifest.fingerprint, blobs, modes, static_trees)
+        logger.info(f"Objetos git do template pré-calculados: {len(blobs)} blobs, {len(static_trees)} árvores estáticas.")
+        return _template_objects
+
+
+def build_commit(manifest: TemplateManifest, rendered: dict[str, str], message: str,
+                 parent: Optional[str] = None, include_template: bool = True) -> tuple[str, list[GitObject]]:
+    """
+    Constrói em memória o commit de uma instância: só os ficheiros renderizados
+    são hasheados; blobs e árvores estáticas vêm da cache do template.
+    Com `include_template=False` devolve apenas os objetos novos (para remotos que já têm o template).
+    """
+    template = get_template_objects(manifest)
+    blobs = dict(template.blobs)
+    modes = dict(template.modes)
+    new_objects = []
+    for rel_path, content in rendered.items():
+        blob = make_object("blob", content.encode('utf-8'))
+        blobs[rel_path] = blob
+        modes[rel_path] = _MODE_FILE
+        new_objects.append(blob)
+
+    layout = _layout(manifest.files)
+    trees: dict[str, GitObject] = dict(template.static_trees)
+    for directory in _deepest_first(layout):
+        if directory not in template.static_trees:
+            trees[directory] = _tree_object(directory, layout, blobs, modes, trees)
+            new_objects.append(trees[directory])
+
+    timestamp = f"{int(time.time())} +0000"
+    identity = f"{GIT_AUTHOR_NAME} <{GIT_AUTHOR_EMAIL}> {timestamp}"
+    lines = [f"tree {trees[''].sha}"]
+    if parent:
+        lines.append(f"parent {parent}")
+    lines += [f"author {identity}", f"committer {identity}", "", message]
+    commit = make_object("commit", ("\n".join(lines) + "\n").encode('utf-8'))
+    new_objects.append(commit)
+
+    if not include_template:
+        return commit.sha, new_objects
+    # Os blobs do template substituídos por ficheiros renderizados não vão no pack
+    template_blobs = [blob for rel_path, blob in template.blobs.items() if rel_path not in rendered]
+    unique = {obj.sha: obj for obj in [*template_blobs, *template.static_trees.values(), *new_objects]}
+    return commit.sha, list(unique.values())
+
+
+def iter_pack(objects: list[GitObject]) -> Iterator[bytes]:
+    """Gera um packfile v2 (sem deltas) em blocos, para ser enviado em streaming."""
+    digest = hashlib.sha1()
+    header = b"PACK" + struct.pack(">II", 2, len(objects))
+    digest.update(header)
+    yield header
+    for obj in objects:
+        digest.update(obj.pack_entry)
+        yield obj.pack_entry
+    yield digest.digest()
+
+
+def push_objects(remote_url: str, new_sha: str, objects: list[GitObject], ref: str = "refs/heads/main",
+                 old_sha: Optional[str] = None, auth: Optional[tuple[str, str]] = None) -> str:
+    """
+    Envia os objetos para `ref` usando o protocolo receive-pack. Aceita um URL
+    HTTPS (GitHub) ou o caminho de um repositório bare local. Devolve o sha anterior da ref.
+    """
+    if _is_local(remote_url):
+        transport = _LocalReceivePack(_local_path(remote_url))
+    else:
+        transport = _HttpReceivePack(remote_url, auth)
+
+    try:
+        refs, capabilities = transport.advertise()
+        current = refs.get(ref, ZERO_SHA)
+        if old_sha is not None and current != old_sha:
+            raise StaleRefError(f"A ref {ref} está em {current[:12]}, esperava {old_sha[:12]}.")
+
+        caps = "report-status" if "report-status" in capabilities else ""
+        command = _pkt_line(f"{current} {new_sha} {ref}\0 {caps}\n".encode()) + b"0000"
+        report = transport.send(command, iter_pack(objects))
+    finally:
+        transport.close()
+    _check_report(report, ref)
+    return current
+
+
+# --- INTERNOS: ÁRVORES ---
+def _parent_dirs(rel_path: str) -> list[str]:
+    parts = rel_path.split(os.sep)[:-1]
+    return [""] + ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def _layout(files: list[str]) -> dict[str, dict]:
+    """Mapeia cada diretório (posix, '' = raiz) para os seus ficheiros e subdiretórios."""
+    layout: dict[str, dict] = {"": {"files": [], "dirs": set()}}
+    for rel_path in files:
+        parents = _parent_dirs(rel_path)
+        for parent, child in zip(parents, parents[1:]):
+            layout.setdefault(child, {"files": [], "dirs": set()})
+            layout[parent]["dirs"].add(child)
+        layout[parents[-1]]["files"].append(rel_path)
+    return layout
+
+
+def _deepest_first(layout: dict) -> list[str]:
+    return sorted(layout, key=lambda d: d.count("/") + 1 if d else 0, reverse=True)
+
+
+def _tree_object(directory: str, layout: dict, blobs: dict, modes: dict, trees: dict) -> GitObject:
+    entries = []
+    for rel_path in layout[directory]["files"]:
+        name = os.path.basename(rel_path)
+        entries.append((name.encode(), modes[rel_path], blobs[rel_path].sha))
+    for child in layout[directory]["dirs"]:
+        # Subdiretórios ordenam como se terminassem em '/'
+        entries.append((child.rsplit("/", 1)[-1].encode() + b"/", _MODE_TREE, trees[child].sha))
+    entries.sort(key=lambda e: e[0])
+    data = b"".join(f"{mode} ".encode() + name.rstrip(b"/") + b"\0" + bytes.fromhex(sha) for name, mode, sha in entries)
+    return make_object("tree", data)
+
+
+# --- INTERNOS: PROTOCOLO ---
+def _pack_header(obj_type: str, size: int) -> bytes:
+    byte = (_TYPE_CODES[obj_type] << 4) | (size & 0x0F)
+    size >>= 4
+    out = bytearray()
+    while size:
+        out.append(byte | 0x80)
+        byte = size & 0x7F
+        size >>= 7
+    out.append(byte)
+    return bytes(out)
+
+
+def _pkt_line(data: bytes) -> bytes:
+    return f"{len(data) + 4:04x}".encode() + data
+
+
+def _read_pkt_lines(read) -> list[bytes]:
+    """Lê pkt-lines até ao flush-pkt ('0000')."""
+    lines = []
+    while True:
+        length_hex = read(4)
+        if len(length_hex) < 4:
+            return lines
+        length = int(length_hex, 16)
+        if length == 0:
+            return lines
+        lines.append(read(length - 4))
+
+
+def _buffer_reader(data: bytes):
+    view = memoryview(data)
+    offset = 0
+
+    def read(n):
+        nonlocal offset
+        chunk = bytes(view[offset:offset + n])
+        offset += n
+        return chunk
+    return read
+
+
+def _parse_advertisement(lines: list[bytes]) -> tuple[dict[str, str], set[str]]:
+    refs, capabilities = {}, set()
+    for i, line in enumerate(lines):
+        line = line.rstrip(b"\n")
+        if i == 0 and b"\0" in line:
+            line, caps = line.split(b"\0", 1)
+            capabilities = set(caps.decode().split())
+        sha, name = line.decode().split(" ", 1)
+        if name != "capabilities^{}":
+            refs[name] = sha
+    return refs, capabilities
+
+
+def _check_report(lines: list[bytes], ref: str):
+    report = [line.rstrip(b"\n").decode(errors="replace") for line in lines]
+    if not report:
+        return
+    if report[0] != "unpack ok":
+        raise PushRejectedError(f"O remoto recusou o pack: {report[0]}")
+    for line in report[1:]:
+        if line.startswith("ng "):
+            raise PushRejectedError(f"O remoto recusou a atualização de {ref}: {line}")
+
+
+def _is_local(remote_url: str) -> bool:
+    return remote_url.startswith("file://") or os.path.isabs(remote_url)
+
+
+def _local_path(remote_url: str) -> str:
+    return urlparse(remote_url).path if remote_url.startswith("file://") else remote_url
+
+
+class _LocalReceivePack:
+    """Fala com `git receive-pack` diretamente; usado para repositórios bare locais."""
+
+    def __init__(self, path: str):
+        self._proc = subprocess.Popen(["git", "receive-pack", path], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def advertise(self) -> tuple[dict[str, str], set[str]]:
+        return _parse_advertisement(_read_pkt_lines(self._proc.stdout.read))
+
+    def send(self, command: bytes, pack: Iterable[bytes]) -> list[bytes]:
+        try:
+            self._proc.stdin.write(command)
+            for chunk in pack:
+                self._proc.stdin.write(chunk)
+            self._proc.stdin.close()
+            report = _read_pkt_lines(self._proc.stdout.read)
+        except BaseException:
+            # O erro original é o que interessa; o processo só é terminado e recolhido
+            self._proc.kill()
+            self._proc.wait()
+            raise
+        if self._proc.wait(timeout=60) != 0:
+            raise PushRejectedError(f"git receive-pack terminou com código {self._proc.returncode}.")
+        return report
+
+    def close(self):
+        """Termina o receive-pack sem enviar nada (ex.: ref desatualizada) e recolhe o processo."""
+        try:
+            if self._proc.poll() is None and not self._proc.stdin.closed:
+                # Flush sem comandos: o receive-pack termina sem alterar nada
+                self._proc.stdin.write(b"0000")
+            self._proc.stdin.close()
+            self._proc.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self._proc.kill()
+            self._proc.wait()
+        self._proc.stdout.close()
+
+
+class _HttpReceivePack:
+    """Protocolo smart HTTP do git (o usado pelo GitHub)."""
+
+    def __init__(self, remote_url: str, auth: Optional[tuple[str, str]]):
+        self._session = clients.http_session()
+        self._url = remote_url.rstrip("/")
+        self._auth = auth
+
+    def advertise(self) -> tuple[dict[str, str], set[str]]:
+        response = self._session.get(f"{self._url}/info/refs", params={"service": "git-receive-pack"},
+                                     auth=self._auth, timeout=clients.HTTP_TIMEOUT)
+        response.raise_for_status()
+        read = _buffer_reader(response.content)
+        _read_pkt_lines(read)  # "# service=git-receive-pack" + flush
+        return _parse_advertisement(_read_pkt_lines(read))
+
+    def send(self, command: bytes, pack: Iterable[bytes]) -> list[bytes]:
+        def body():
+            yield command
+            yield from pack
+
+        response = self._session.post(
+            f"{self._url}/git-receive-pack", data=body(), auth=self._auth,
+            timeout=(clients.HTTP_CONNECT_TIMEOUT, max(clients.HTTP_READ_TIMEOUT, 120)),
+            headers={"Content-Type": "application/x-git-receive-pack-request",
+                     "Accept": "application/x-git-receive-pack-result"}
+        )
+        response.raise_for_status()
+        return _read_pkt_lines(_buffer_reader(response.content))
+
+    def close(self):
+        pass
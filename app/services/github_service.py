@@ -2,25 +2,34 @@
 
 import os
 import logging
-from github import Github
-from git import Repo
+
+from app.services import clients, git_objects
+from app.services.template_cache import TemplateManifest
 
 logger = logging.getLogger(__name__)
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-# O GITHUB_USERNAME já não é estritamente necessário para criar o repo, mas é bom para a URL de push
-GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")
+# "workdir": copia o template para /tmp e usa git init/add/push (comportamento original)
+# "packstream": constrói os objetos git em memória e envia o pack diretamente ao remoto
+GITHUB_PUSH_MODE = os.getenv("GITHUB_PUSH_MODE", "workdir")
 
 def create_and_push_to_github(repo_path: str, repo_name: str) -> str:
     """
     Cria um repositório privado no GitHub e faz push do código local.
     """
-    if not GITHUB_TOKEN or not GITHUB_USERNAME:
-        raise ValueError("As variáveis de ambiente GITHUB_TOKEN e GITHUB_USERNAME são obrigatórias.")
+    repo_url = create_remote_repo(repo_name)
+    push_to_github(repo_path, repo_name, repo_url)
+    return repo_url
+
+def create_remote_repo(repo_name: str) -> str:
+    """
+    Cria o repositório privado no GitHub e devolve o URL de clone.
+    Não depende do código local, por isso pode correr em paralelo com a construção do projeto.
+    """
+    _check_credentials()
 
     try:
-        # Autentica-se no GitHub
-        g = Github(GITHUB_TOKEN)
+        # Cliente autenticado partilhado entre jobs (mantém as ligações abertas)
+        g = clients.github()
         # Obtém o utilizador AUTENTICADO (a correção está aqui)
         user = g.get_user()
 
@@ -29,22 +38,97 @@ def create_and_push_to_github(repo_path: str, repo_name: str) -> str:
         repo = user.create_repo(repo_name, private=True)
         repo_url = repo.clone_url
         logger.info(f"Repositório criado com sucesso: {repo_url}")
+        return repo_url
+
+    except Exception as e:
+        logger.error(f"Falha ao criar o repositório GitHub: {e}", exc_info=True)
+        raise
 
+def delete_remote_repo(repo_name: str):
+    """Remove o repositório (compensação de um provisionamento falhado). Um repositório inexistente conta como removido."""
+    _check_credentials()
+    try:
+        clients.github().get_user().get_repo(repo_name).delete()
+        logger.info(f"Repositório {repo_name} removido do GitHub.")
+    except Exception as e:
+        if getattr(e, "status", None) == 404:
+            logger.info(f"Repositório {repo_name} já não existe no GitHub.")
+            return
+        raise
+
+def push_to_github(repo_path: str, repo_name: str, repo_url: str) -> str:
+    """
+    Inicializa o repositório local, faz o commit inicial e envia-o para o repositório remoto.
+    Devolve o sha do commit.
+    """
+    username, token = _check_credentials()
+    # O GitPython só é preciso no modo workdir; no packstream nem chega a ser importado
+    from git import Repo
+
+    try:
         # Inicializa o repositório local e faz o push
         local_repo = Repo.init(repo_path)
         local_repo.index.add("*")
-        local_repo.index.commit("Commit inicial da instância BCL")
+        commit = local_repo.index.commit("Commit inicial da instância BCL")
 
         origin = local_repo.create_remote("origin", repo_url)
         # A autenticação é feita no URL para o push
-        push_url = repo_url.replace("https://", f"https://{GITHUB_USERNAME}:{GITHUB_TOKEN}@")
+        push_url = repo_url.replace("https://", f"https://{username}:{token}@")
         origin.set_url(push_url)
 
         origin.push(refspec="main:main")
         logger.info(f"Push para o repositório {repo_name} concluído com sucesso.")
+        return commit.hexsha
 
-        return repo_url
+    except Exception as e:
+        logger.error(f"Falha ao fazer push para o repositório GitHub: {e}", exc_info=True)
+        raise
+
+def push_rendered_to_github(manifest: TemplateManifest, rendered: dict[str, str], repo_name: str, repo_url: str) -> str:
+    """
+    Constrói o commit inicial em memória (só os ficheiros renderizados são hasheados)
+    e envia-o em streaming para o remoto, sem diretório de trabalho. Devolve o sha do commit.
+    """
+    auth = None
+    if repo_url.startswith("https://"):
+        auth = _check_credentials()
+
+    try:
+        commit_sha, objects = git_objects.build_commit(manifest, rendered, "Commit inicial da instância BCL")
+        git_objects.push_objects(repo_url, commit_sha, objects, auth=auth)
+        logger.info(f"Pack com {len(objects)} objetos enviado para {repo_name} (commit {commit_sha[:12]}).")
+        return commit_sha
 
     except Exception as e:
-        logger.error(f"Falha ao criar ou fazer push para o repositório GitHub: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        logger.error(f"Falha ao enviar o pack para o repositório GitHub: {e}", exc_info=True)
+        raise
+
+def push_update_to_github(manifest: TemplateManifest, rendered: dict[str, str], repo_name: str, repo_url: str,
+                          parent_sha: str, message: str = "Atualização da campanha") -> str:
+    """
+    Envia um único commit sobre `parent_sha` com os ficheiros renderizados.
+    O pack leva só os blobs e árvores novos; se o remoto não tiver os objetos
+    do template (ex.: commit inicial feito noutro modo), repete com o pack completo.
+    """
+    auth = None
+    if repo_url.startswith("https://"):
+        auth = _check_credentials()
+
+    commit_sha, objects = git_objects.build_commit(manifest, rendered, message, parent=parent_sha, include_template=False)
+    try:
+        git_objects.push_objects(repo_url, commit_sha, objects, old_sha=parent_sha, auth=auth)
+    except git_objects.StaleRefError:
+        raise
+    except git_objects.PushRejectedError as e:
+        logger.warning(f"Pack incremental recusado por {repo_name} ({e}); a reenviar com os objetos do template.")
+        commit_sha, objects = git_objects.build_commit(manifest, rendered, message, parent=parent_sha)
+        git_objects.push_objects(repo_url, commit_sha, objects, old_sha=parent_sha, auth=auth)
+    logger.info(f"Commit {commit_sha[:12]} com {len(objects)} objeto(s) enviado para {repo_name}.")
+    return commit_sha
+
+def _check_credentials() -> tuple[str, str]:
+    """Lê as credenciais a cada utilização (nunca no import) e devolve (utilizador, token)."""
+    username, token = os.getenv("GITHUB_USERNAME"), os.getenv("GITHUB_TOKEN")
+    if not token or not username:
+        raise ValueError("As variáveis de ambiente GITHUB_TOKEN e GITHUB_USERNAME são obrigatórias.")
+    return username, token
@@ -0,0 +1,123 @@
+# fabrica-bcl/app/services/instance_store.py
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Ficheiro SQLite com o estado atual da instância de cada campanha
+INSTANCE_STORE_DB = os.getenv("INSTANCE_STORE_DB", os.path.join('/tmp', 'bcl_factory', 'instances.sqlite3'))
+
+# Colunas guardadas como JSON
+_JSON_FIELDS = ("details", "file_hashes")
+
+# Estado do deploy da instância; registos anteriores a esta coluna ficam a NULL e contam como 'live'
+STATUS_DEPLOYING = "deploying"
+STATUS_LIVE = "live"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    campaign_id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    details TEXT NOT NULL,
+    repo_name TEXT,
+    repo_url TEXT,
+    service_id TEXT,
+    service_url TEXT,
+    api_key TEXT,
+    admin_key TEXT,
+    commit_sha TEXT,
+    file_hashes TEXT,
+    status TEXT,
+    user_email TEXT,
+    webhook_id TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+# Colunas acrescentadas depois da criação da tabela (bases de dados já existentes)
+_ADDED_COLUMNS = {"status": "TEXT", "user_email": "TEXT", "webhook_id": "TEXT"}
+
+
+class InstanceStore:
+    """
+    Onde está cada campanha já provisionada (repositório, serviço, último
+    commit e hash de cada ficheiro renderizado), para que uma edição da
+    campanha atualize a instância existente em vez de criar outra.
+    """
+
+    def __init__(self, db_path: str = INSTANCE_STORE_DB):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_dir = os.path.dirname(self._db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(instances)")}
+            for column, column_type in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE instances ADD COLUMN {column} {column_type}")
+        return self._conn
+
+    def get(self, campaign_id) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM instances WHERE campaign_id = ?", (str(campaign_id),)).fetchone()
+        if not row:
+            return None
+        instance = dict(row)
+        for field in _JSON_FIELDS:
+            instance[field] = json.loads(instance[field]) if instance[field] else None
+        return instance
+
+    def save(self, campaign_id, **fields):
+        """Cria ou atualiza o registo da campanha com os campos dados."""
+        values = {k: json.dumps(v) if k in _JSON_FIELDS and v is not None else v for k, v in fields.items()}
+        values["updated_at"] = time.time()
+        with self._lock:
+            conn = self._connect()
+            assignments = ", ".join(f"{column} = ?" for column in values)
+            updated = conn.execute(
+                f"UPDATE instances SET {assignments} WHERE campaign_id = ?", (*values.values(), str(campaign_id))
+            ).rowcount
+            if not updated:
+                columns = ", ".join(values)
+                placeholders = ", ".join("?" for _ in values)
+                conn.execute(
+                    f"INSERT INTO instances (campaign_id, {columns}) VALUES (?, {placeholders})",
+                    (str(campaign_id), *values.values())
+                )
+
+    def pending_deploys(self) -> list[dict]:
+        """Instâncias dedicadas cujo deploy ainda não ficou 'live' (ex.: a fábrica reiniciou a meio)."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT campaign_id FROM instances WHERE mode = 'dedicated' AND status = ?", (STATUS_DEPLOYING,)
+            ).fetchall()
+        return [self.get(row["campaign_id"]) for row in rows]
+
+    def delete(self, campaign_id):
+        """Esquece a instância da campanha (ex.: o deploy falhou e vai ser provisionada de novo)."""
+        with self._lock:
+            self._connect().execute("DELETE FROM instances WHERE campaign_id = ?", (str(campaign_id),))
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+
+# Instância partilhada pela fábrica
+store = InstanceStore()
@@ -0,0 +1,144 @@
+# fabrica-bcl/app/services/janitor.py
+
+import os
+import time
+import shutil
+import logging
+import threading
+from typing import Callable, Optional
+
+from app.services import checkpoints, github_service, project_builder, render_service, telemetry
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (segundos) entre passagens do janitor
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "60"))
+# Idade (segundos) a partir da qual uma cópia de trabalho em /tmp/bcl_instances é considerada abandonada
+JANITOR_WORKDIR_TTL = float(os.getenv("JANITOR_WORKDIR_TTL", "21600"))
+# Limpezas executadas por passagem e tentativas antes de desistir de uma limpeza
+JANITOR_BATCH_SIZE = int(os.getenv("JANITOR_BATCH_SIZE", "20"))
+JANITOR_MAX_ATTEMPTS = int(os.getenv("JANITOR_MAX_ATTEMPTS", "5"))
+JANITOR_RETRY_MAX_DELAY = float(os.getenv("JANITOR_RETRY_MAX_DELAY", "3600"))
+
+CLEANUPS = telemetry.Counter("bcl_cleanups_total", "Limpezas executadas pelo janitor, por tipo e resultado.",
+                             ("kind", "result"))
+
+
+def remove_workdir(path: str, root: str = project_builder.OUTPUT_DIR):
+    """Apaga uma cópia de trabalho local; recusa caminhos fora de `root`."""
+    root = os.path.realpath(root)
+    path = os.path.realpath(path)
+    if os.path.dirname(path) != root:
+        raise ValueError(f"Caminho fora de {root}: {path}")
+    try:
+        shutil.rmtree(path)
+    except FileNotFoundError:
+        pass
+
+
+_DEFAULT_HANDLERS: dict[str, Callable[[str], None]] = {
+    checkpoints.CLEANUP_SERVICE: render_service.delete_render_service,
+    checkpoints.CLEANUP_REPO: github_service.delete_remote_repo,
+    checkpoints.CLEANUP_WORKDIR: remove_workdir,
+}
+
+
+class Janitor:
+    """
+    Thread de manutenção da fábrica. Em cada passagem executa as limpezas
+    vencidas (compensações de provisionamentos falhados e cópias de trabalho
+    já enviadas), com backoff entre tentativas, e apaga as cópias de trabalho
+    abandonadas em /tmp/bcl_instances que nenhum provisionamento em curso usa.
+    """
+
+    def __init__(self, store: checkpoints.CheckpointStore = checkpoints.store, interval: float = JANITOR_INTERVAL,
+                 workdir_root: str = project_builder.OUTPUT_DIR, workdir_ttl: float = JANITOR_WORKDIR_TTL,
+                 handlers: Optional[dict[str, Callable[[str], None]]] = None):
+        self._store = store
+        self._interval = interval
+        self._workdir_root = workdir_root
+        self._workdir_ttl = workdir_ttl
+        self._handlers = handlers or _DEFAULT_HANDLERS
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- CICLO DE VIDA ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        resumed = self._store.requeue_interrupted()
+        if resumed:
+            logger.info(f"{resumed} limpeza(s) interrompidas voltaram para a fila.")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # --- PASSAGEM ---
+    def run_once(self) -> dict:
+        """Executa uma passagem completa e devolve quantas limpezas e cópias foram tratadas."""
+        cleaned = failed = 0
+        for task in self._store.claim_cleanups(JANITOR_BATCH_SIZE):
+            if self._cleanup(task):
+                cleaned += 1
+            else:
+                failed += 1
+        swept = self._sweep_workdirs()
+        if cleaned or failed or swept:
+            logger.info(f"Janitor: {cleaned} limpeza(s) concluída(s), {failed} com erro, {swept} cópia(s) abandonada(s) apagada(s).")
+        return {"cleaned": cleaned, "failed": failed, "swept_workdirs": swept}
+
+    def _cleanup(self, task: dict) -> bool:
+        kind, target = task["kind"], task["target"]
+        try:
+            self._handlers[kind](target)
+        except Exception as e:
+            attempts = task["attempts"] + 1
+            if attempts < JANITOR_MAX_ATTEMPTS:
+                retry_in = min(JANITOR_RETRY_MAX_DELAY, self._interval * 2 ** (attempts - 1))
+                logger.warning(f"Limpeza {kind} de {target} falhou (tentativa {attempts}); nova tentativa em {retry_in:.0f}s: {e}")
+                self._store.finish_cleanup(task["id"], error=str(e)[:500], retry_in=retry_in)
+                CLEANUPS.inc(kind=kind, result="retry")
+            else:
+                logger.error(f"Limpeza {kind} de {target} falhou definitivamente: {e}")
+                self._store.finish_cleanup(task["id"], error=str(e)[:500])
+                CLEANUPS.inc(kind=kind, result="failed")
+            return False
+        self._store.finish_cleanup(task["id"])
+        CLEANUPS.inc(kind=kind, result="done")
+        return True
+
+    def _sweep_workdirs(self) -> int:
+        if not os.path.isdir(self._workdir_root):
+            return 0
+        cutoff = time.time() - self._workdir_ttl
+        in_progress = self._store.in_progress_repo_names()
+        swept = 0
+        for entry in os.scandir(self._workdir_root):
+            if not entry.is_dir(follow_symlinks=False) or entry.name in in_progress:
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                    continue
+                remove_workdir(entry.path, self._workdir_root)
+                swept += 1
+                CLEANUPS.inc(kind="stale_workdir", result="done")
+            except Exception as e:
+                logger.warning(f"Não foi possível apagar a cópia abandonada {entry.path}: {e}")
+        return swept
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erro na passagem do janitor: {e}", exc_info=True)
+
+
+# Instância partilhada pela fábrica
+janitor = Janitor()
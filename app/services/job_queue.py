@@ -0,0 +1,277 @@
+# fabrica-bcl/app/services/job_queue.py
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Any
+
+from app.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Número de workers que executam provisionamentos em paralelo
+PROVISION_WORKERS = int(os.getenv("PROVISION_WORKERS", "4"))
+# Limite de jobs pendentes (em fila + em execução) antes de recusar novos pedidos
+PROVISION_QUEUE_MAX_DEPTH = int(os.getenv("PROVISION_QUEUE_MAX_DEPTH", "100"))
+# Ficheiro SQLite onde os jobs são persistidos para sobreviverem a um restart
+PROVISION_QUEUE_DB = os.getenv("PROVISION_QUEUE_DB", os.path.join('/tmp', 'bcl_factory', 'jobs.sqlite3'))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+TERMINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+_PENDING_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+JOBS = telemetry.Counter("bcl_provision_jobs_total", "Jobs de provisionamento concluídos, por estado final.", ("status",))
+QUEUE_WAIT = telemetry.Histogram("bcl_provision_queue_wait_seconds", "Tempo que cada job esperou na fila até um worker o iniciar.")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS provisioning_jobs (
+    id TEXT PRIMARY KEY,
+    campaign_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    batch_id TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON provisioning_jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_campaign ON provisioning_jobs (campaign_id, created_at);
+"""
+_INDEXES_AFTER_MIGRATION = """
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON provisioning_jobs (batch_id);
+"""
+
+
+class QueueFullError(Exception):
+    """Levantada quando a fila atingiu o limite de profundidade configurado."""
+
+
+class ProvisioningQueue:
+    """
+    Fila de provisionamento persistida em SQLite e consumida por um pool
+    fixo de threads. Jobs que estavam em execução quando o processo parou
+    voltam para a fila no arranque seguinte.
+    """
+
+    def __init__(self, handler: Callable[[str], Any], db_path: str = PROVISION_QUEUE_DB,
+                 workers: int = PROVISION_WORKERS, max_depth: int = PROVISION_QUEUE_MAX_DEPTH):
+        self._handler = handler
+        self._db_path = db_path
+        self._workers = max(1, workers)
+        self._max_depth = max_depth
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # --- CICLO DE VIDA ---
+    def start(self):
+        """Abre a base de dados, recupera jobs interrompidos e arranca os workers."""
+        db_dir = os.path.dirname(self._db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.executescript(_INDEXES_AFTER_MIGRATION)
+
+        with self._lock:
+            self._stopping = False
+            resumed = self._conn.execute(
+                "UPDATE provisioning_jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (STATUS_QUEUED, time.time(), STATUS_RUNNING)
+            ).rowcount
+        if resumed:
+            logger.info(f"{resumed} job(s) de provisionamento interrompidos voltaram para a fila.")
+
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"provision-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Fila de provisionamento iniciada com {self._workers} worker(s) em {self._db_path}.")
+
+    def stop(self, timeout: float = 5.0):
+        """Sinaliza os workers para pararem. Jobs em curso são retomados no próximo arranque."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    # --- API PÚBLICA ---
+    def enqueue(self, campaign_id: str, payload: str) -> dict:
+        """
+        Persiste um novo job e acorda um worker. Se já existir um job pendente
+        para a mesma campanha, devolve-o em vez de criar um duplicado.
+        """
+        return self.enqueue_many([(campaign_id, payload)])[0]
+
+    def enqueue_many(self, items: list[tuple[str, str]], batch_id: Optional[str] = None) -> list[dict]:
+        """
+        Enfileira vários jobs de uma só vez (tudo ou nada): se não houver espaço
+        para todos, nenhum é aceite. Campanhas com um job pendente reutilizam-no.
+        """
+        with self._wakeup:
+            jobs, new_rows = [], []
+            for campaign_id, payload in items:
+                existing = self._conn.execute(
+                    "SELECT * FROM provisioning_jobs WHERE campaign_id = ? AND status IN (?, ?) "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (campaign_id, *_PENDING_STATUSES)
+                ).fetchone()
+                if existing:
+                    jobs.append(self._row_to_dict(existing))
+                    continue
+                new_rows.append((uuid.uuid4().hex, campaign_id, payload))
+                jobs.append(None)
+
+            if new_rows and self._depth_locked() + len(new_rows) > self._max_depth:
+                raise QueueFullError(f"A fila de provisionamento atingiu o limite de {self._max_depth} jobs.")
+
+            now = time.time()
+            self._conn.execute("BEGIN")
+            for offset, (job_id, campaign_id, payload) in enumerate(new_rows):
+                # O desvio mínimo no created_at preserva a ordem do lote na fila
+                self._conn.execute(
+                    "INSERT INTO provisioning_jobs (id, campaign_id, payload, batch_id, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, campaign_id, payload, batch_id, STATUS_QUEUED, now + offset * 1e-6, now)
+                )
+            self._conn.execute("COMMIT")
+            self._wakeup.notify(len(new_rows))
+
+            created = iter(new_rows)
+            for i, job in enumerate(jobs):
+                if job is None:
+                    row = self._conn.execute("SELECT * FROM provisioning_jobs WHERE id = ?", (next(created)[0],)).fetchone()
+                    jobs[i] = self._row_to_dict(row)
+            return jobs
+
+    def list_batch(self, batch_id: str) -> list[dict]:
+        """Devolve os jobs de um lote, pela ordem em que foram enfileirados."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM provisioning_jobs WHERE batch_id = ? ORDER BY created_at", (batch_id,)
+            ).fetchall()
+            return [self._row_to_dict(row) for row in rows]
+
+    def get_status(self, campaign_id: str) -> Optional[dict]:
+        """Devolve o job mais recente da campanha, com a posição na fila se ainda estiver à espera."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM provisioning_jobs WHERE campaign_id = ? ORDER BY created_at DESC LIMIT 1",
+                (campaign_id,)
+            ).fetchone()
+            if not row:
+                return None
+            job = self._row_to_dict(row)
+            if job["status"] == STATUS_QUEUED:
+                job["queue_position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM provisioning_jobs WHERE status = ? AND created_at <= ?",
+                    (STATUS_QUEUED, row["created_at"])
+                ).fetchone()[0]
+            return job
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._depth_locked()
+
+    # --- INTERNOS ---
+    def _migrate(self):
+        """Adiciona colunas introduzidas depois da criação inicial da tabela."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(provisioning_jobs)")}
+        if "result" not in columns:
+            self._conn.execute("ALTER TABLE provisioning_jobs ADD COLUMN result TEXT")
+        if "batch_id" not in columns:
+            self._conn.execute("ALTER TABLE provisioning_jobs ADD COLUMN batch_id TEXT")
+
+    def _depth_locked(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM provisioning_jobs WHERE status IN (?, ?)", _PENDING_STATUSES
+        ).fetchone()[0]
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        Marca atomicamente o job mais antigo em fila como 'running' (chamado com o lock).
+        O UPDATE só vale se o job ainda estiver em fila, pelo que outra fila sobre o
+        mesmo ficheiro (ex.: outro processo) nunca reclama o mesmo job.
+        """
+        while True:
+            row = self._conn.execute(
+                "SELECT * FROM provisioning_jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (STATUS_QUEUED,)
+            ).fetchone()
+            if not row:
+                return None
+            claimed = self._conn.execute(
+                "UPDATE provisioning_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_RUNNING, time.time(), row["id"], STATUS_QUEUED)
+            ).rowcount
+            if claimed:
+                return row
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None, result: Any = None):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "UPDATE provisioning_jobs SET status = ?, error = ?, result = ?, updated_at = ? WHERE id = ?",
+                (status, error, json.dumps(result) if result is not None else None, time.time(), job_id)
+            )
+
+    def _worker_loop(self):
+        while True:
+            with self._wakeup:
+                row = None
+                while not self._stopping:
+                    row = self._claim_next()
+                    if row:
+                        break
+                    # O timeout protege contra notificações perdidas
+                    self._wakeup.wait(timeout=5.0)
+                if self._stopping:
+                    return
+
+            job_id = row["id"]
+            QUEUE_WAIT.observe(max(0.0, time.time() - row["created_at"]))
+            logger.info(f"Worker {threading.current_thread().name} a processar job {job_id} (Campanha ID: {row['campaign_id']}).")
+            try:
+                result = self._handler(row["payload"])
+            except Exception as e:
+                logger.warning(f"Job {job_id} falhou: {e}")
+                self._finish(job_id, STATUS_FAILED, str(e)[:500])
+                JOBS.inc(status=STATUS_FAILED)
+            else:
+                self._finish(job_id, STATUS_COMPLETED, result=result)
+                JOBS.inc(status=STATUS_COMPLETED)
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> dict:
+        return {
+            "job_id": row["id"],
+            "campaign_id": row["campaign_id"],
+            "batch_id": row["batch_id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "error": row["error"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
@@ -36,4 +36,11 @@ def notify_client(client_email: str, service_url: str, lead_source_type: str):
     print(f"CORPO:\n{body}")
     print("-----------------------------------\n")
     
-    return True
\ No newline at end of file
+    return True
+
+def send_provisioning_complete_email(client_email: str, service_url: str):
+    """
+    Notifica o cliente de que o provisionamento terminou.
+    As instâncias são ligadas às fontes de leads via webhook.
+    """
+    return notify_client(client_email, service_url, 'webhook')
@@ -0,0 +1,100 @@
+# fabrica-bcl/app/services/pipeline.py
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from typing import Callable
+
+from app.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Cada etapa do provisionamento tem o seu próprio limite de concorrência, para que
+# o job N+1 possa estar a construir localmente enquanto o job N espera pelo GitHub.
+STAGES = ("builder", "github", "render", "supabase", "notify", "pool")
+_DEFAULT_LIMITS = {"builder": 2, "github": 4, "render": 4, "supabase": 8, "notify": 8, "pool": 8}
+STAGE_LIMITS = {
+    stage: max(1, int(os.getenv(f"PIPELINE_LIMIT_{stage.upper()}", str(_DEFAULT_LIMITS[stage]))))
+    for stage in STAGES
+}
+# Threads usadas para sobrepor chamadas independentes dentro do mesmo job
+PIPELINE_OVERLAP_WORKERS = int(os.getenv("PIPELINE_OVERLAP_WORKERS", "8"))
+
+_semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in STAGE_LIMITS.items()}
+_overlap_executor = ThreadPoolExecutor(max_workers=PIPELINE_OVERLAP_WORKERS, thread_name_prefix="pipeline-overlap")
+
+_stats_lock = threading.Lock()
+_stage_stats: dict[str, dict] = {}
+
+STAGE_DURATION = telemetry.Histogram("bcl_stage_duration_seconds", "Duração de cada etapa do provisionamento.", ("stage",))
+STAGE_WAIT = telemetry.Histogram("bcl_stage_wait_seconds", "Tempo à espera de vaga em cada etapa.", ("stage",))
+STAGE_FAILURES = telemetry.Counter("bcl_stage_failures_total", "Etapas do provisionamento que terminaram com erro.", ("stage",))
+
+
+@contextmanager
+def stage(name: str, timings: dict):
+    """
+    Executa um bloco dentro do limite de concorrência da etapa e acumula a sua
+    duração em `timings`. O tempo à espera de vaga é registado à parte.
+    """
+    semaphore = _semaphores[name]
+    wait_start = time.perf_counter()
+    semaphore.acquire()
+    start = time.perf_counter()
+    ok = False
+    try:
+        with telemetry.span(f"stage.{name}"):
+            yield
+        ok = True
+    finally:
+        semaphore.release()
+        duration = time.perf_counter() - start
+        waited = start - wait_start
+        timings[name] = round(timings.get(name, 0.0) + duration, 4)
+        if waited > 0.001:
+            timings[f"{name}_wait"] = round(timings.get(f"{name}_wait", 0.0) + waited, 4)
+        _record(name, duration, waited, ok)
+
+
+def submit(name: str, timings: dict, fn: Callable, *args, **kwargs) -> Future:
+    """Agenda `fn` numa thread de sobreposição, dentro da etapa `name`."""
+    def run():
+        with stage(name, timings):
+            return fn(*args, **kwargs)
+    # O contexto acompanha a chamada para que o span da etapa fique no trace do job
+    return _overlap_executor.submit(contextvars.copy_context().run, run)
+
+
+def get_stage_stats() -> dict:
+    """Devolve a duração agregada de cada etapa desde o arranque do processo."""
+    with _stats_lock:
+        return {
+            name: {
+                **stats,
+                "avg_seconds": round(stats["total_seconds"] / stats["count"], 4) if stats["count"] else 0.0,
+                "limit": STAGE_LIMITS[name],
+            }
+            for name, stats in _stage_stats.items()
+        }
+
+
+def _record(name: str, duration: float, waited: float, ok: bool):
+    STAGE_DURATION.observe(duration, stage=name)
+    STAGE_WAIT.observe(waited, stage=name)
+    if not ok:
+        STAGE_FAILURES.inc(stage=name)
+    with _stats_lock:
+        stats = _stage_stats.setdefault(name, {
+            "count": 0, "failures": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+            "last_seconds": 0.0, "total_wait_seconds": 0.0
+        })
+        stats["count"] += 1
+        stats["failures"] += 0 if ok else 1
+        stats["total_seconds"] = round(stats["total_seconds"] + duration, 4)
+        stats["max_seconds"] = round(max(stats["max_seconds"], duration), 4)
+        stats["last_seconds"] = round(duration, 4)
+        stats["total_wait_seconds"] = round(stats["total_wait_seconds"] + waited, 4)
@@ -1,38 +1,70 @@
 import os
-import shutil
 import uuid
-import re
+import hashlib
 from app.api.models import CampaignDetails
+from app.services import template_cache
 
-TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'templates', 'bcl-activate-template')
+TEMPLATE_PATH = template_cache.TEMPLATE_PATH
 OUTPUT_DIR = os.path.join('/tmp', 'bcl_instances')
 
-def create_project_from_template(campaign_id: int, details: CampaignDetails) -> tuple[str, str]:
+# Chave de cada provedor de LLM passada às instâncias; sem INSTANCE_LLM_PROVIDERS, entram os que a têm
+_PROVIDER_KEYS = {"gemini": "TEMPLATE_GOOGLE_API_KEY", "openai": "TEMPLATE_OPENAI_API_KEY"}
+
+def generate_repo_name(campaign_id: int) -> str:
+    """Gera um nome único para o repositório da instância."""
+    instance_uuid = str(uuid.uuid4())[:8]
+    return f"bcl-instance-{campaign_id}-{instance_uuid}"
+
+def create_project_from_template(campaign_id: int, details: CampaignDetails, repo_name: str = None) -> tuple[str, str]:
     """
     Cria uma nova instância do projeto a partir de um template,
     personalizando o prompt da IA com base nos detalhes da campanha.
+    O nome do repositório pode ser gerado antes, para que o repositório remoto
+    seja criado em paralelo com a cópia do template.
     """
-    instance_uuid = str(uuid.uuid4())[:8]
-    repo_name = f"bcl-instance-{campaign_id}-{instance_uuid}"
+    repo_name = repo_name or generate_repo_name(campaign_id)
     new_project_path = os.path.join(OUTPUT_DIR, repo_name)
 
     # Garante que o diretório de saída exista
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Copia o template para um novo diretório
-    shutil.copytree(TEMPLATE_PATH, new_project_path)
-
-    # Personaliza o arquivo principal da API (main.py)
-    _customize_main_py(new_project_path, details)
+    # Escreve apenas os arquivos personalizados; os restantes são ligados ao template em cache
+    manifest = template_cache.get_manifest(TEMPLATE_PATH)
+    template_cache.materialize(manifest, new_project_path, render_files(manifest, details))
 
     return new_project_path, repo_name
 
-def _customize_main_py(project_path: str, details: CampaignDetails):
+def render_files(manifest: template_cache.TemplateManifest, details: CampaignDetails) -> dict[str, str]:
     """
-    Lê o main.py do template, substitui o prompt da IA e salva o arquivo.
+    Renderiza os arquivos do template que mudam por campanha, a partir dos slots pré-compilados,
+    e o requirements.txt com os SDKs dos provedores de LLM das instâncias.
     """
-    main_py_path = os.path.join(project_path, 'app', 'api', 'main.py')
+    system_prompt = build_system_prompt(details)
+    rendered = {rel_path: slot.render(system_prompt) for rel_path, slot in manifest.slots.items()}
+    rendered.update(render_requirements(manifest))
+    return rendered
+
+def render_requirements(manifest: template_cache.TemplateManifest) -> dict[str, str]:
+    """requirements.txt da instância só com os SDKs dos provedores que ela vai usar."""
+    if manifest.requirements is None:
+        return {}
+    return {template_cache.REQUIREMENTS_TXT: manifest.requirements.render(instance_providers())}
+
+def instance_providers() -> list[str]:
+    """Provedores de LLM das instâncias (INSTANCE_LLM_PROVIDERS ou os que têm chave), lidos a cada utilização."""
+    configured = os.getenv("INSTANCE_LLM_PROVIDERS", "")
+    if configured.strip():
+        return [name.strip() for name in configured.split(",") if name.strip()]
+    return [name for name, env_var in _PROVIDER_KEYS.items() if os.getenv(env_var)]
 
+def hash_files(rendered: dict[str, str]) -> dict[str, str]:
+    """Hash do conteúdo de cada ficheiro renderizado, para detetar o que mudou numa edição."""
+    return {rel_path: hashlib.sha256(content.encode('utf-8')).hexdigest() for rel_path, content in rendered.items()}
+
+def build_system_prompt(details: CampaignDetails) -> str:
+    """
+    Monta o prompt da IA com base nos detalhes da campanha.
+    """
     # Mapeia os valores do frontend para descrições mais claras
     persona_map = {
         "consultor": "um consultor especialista",
@@ -71,17 +103,4 @@ def _customize_main_py(project_path: str, details: CampaignDetails):
     Baseado no nome do lead e nos seus dados (empresa, cargo, etc.), crie a mensagem perfeita.
     """
 
-    with open(main_py_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Usando regex para substituir o conteúdo entre as tags ### SYSTEM PROMPT START ### e ### SYSTEM PROMPT END ###
-    # O re.DOTALL faz com que o '.' também corresponda a quebras de linha
-    pattern = r"(# ### SYSTEM PROMPT START ###\n).*(# ### SYSTEM PROMPT END ###)"
-    
-    # O r'\1' preserva o marcador inicial, e r'\2' o final
-    replacement = f"\\1{new_system_prompt.strip()}\\2"
-    
-    new_content = re.sub(pattern, replacement, content, flags=re.DOTALL)
-
-    with open(main_py_path, 'w', encoding='utf-8') as f:
-        f.write(new_content)
\ No newline at end of file
+    return new_system_prompt.strip()
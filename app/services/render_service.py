@@ -3,42 +3,52 @@
 import os
 import requests
 import logging
-import time
-from supabase import create_client, Client
+from typing import Optional
+
+from app.services import clients, status_writer
 
 logger = logging.getLogger(__name__)
 
-RENDER_API_KEY = os.getenv("RENDER_API_KEY")
-OWNER_ID = os.getenv("RENDER_OWNER_ID") 
-# Adicione as suas credenciais do Supabase como variáveis de ambiente no Render
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-HEADERS = {
-    "Authorization": f"Bearer {RENDER_API_KEY}",
-    "Accept": "application/json",
-    "Content-Type": "application/json"
-}
-
-def _get_supabase_client() -> Client:
-    """Cria e retorna um cliente Supabase."""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("As variáveis de ambiente SUPABASE_URL e SUPABASE_KEY são obrigatórias.")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
-
-def deploy_to_render(repo_name: str, repo_url: str, campaign_id: int) -> str:
+def _api_url(path: str) -> str:
+    # Lido a cada chamada, como as credenciais, para se poder apontar para uma API local
+    return os.getenv("RENDER_API_URL", "https://api.render.com/v1").rstrip("/") + path
+
+def _headers() -> dict:
+    return {
+        "Authorization": f"Bearer {os.getenv('RENDER_API_KEY')}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+def create_render_service(repo_name: str, repo_url: str, campaign_id: int,
+                          extra_env: Optional[dict] = None) -> tuple[str, str, str]:
     """
-    Faz o deploy de um novo Web Service no Render a partir de um repositório GitHub
-    e atualiza o URL do serviço na tabela de campanhas do Supabase.
+    Cria o Web Service no Render e devolve o ID e o URL do serviço e a chave de API
+    gerada para a instância. Não espera pelo deploy nem toca no Supabase, para que
+    essas etapas possam ser limitadas e medidas separadamente.
     """
-    url = "https://api.render.com/v1/services"
+    url = _api_url("/services")
     
     # As variáveis de ambiente para a instância do cliente
     # A BCL_API_KEY é uma chave simples para o cliente usar
     bcl_api_key = f"bcl_secret_{campaign_id}_{os.urandom(16).hex()}"
     
+    env = {
+        "BCL_API_KEY": bcl_api_key,
+        # Adicione outras chaves de API que o BCL Activate precisa (OpenAI, Google, etc.)
+        # Elas devem ser obtidas do seu ambiente seguro
+        "GOOGLE_API_KEY": os.getenv("TEMPLATE_GOOGLE_API_KEY"),
+        "OPENAI_API_KEY": os.getenv("TEMPLATE_OPENAI_API_KEY"),
+        "EVOLUTION_API_URL": os.getenv("TEMPLATE_EVOLUTION_API_URL"),
+        "EVOLUTION_API_KEY": os.getenv("TEMPLATE_EVOLUTION_API_KEY"),
+        # O nome da instância precisa ser único para cada cliente
+        "EVOLUTION_INSTANCE_NAME": evolution_instance_name(campaign_id),
+    }
+    # `extra_env` acrescenta variáveis ou substitui as anteriores
+    env.update(extra_env or {})
+
     payload = {
-        "ownerId": OWNER_ID,
+        "ownerId": os.getenv("RENDER_OWNER_ID"),
         "name": repo_name,
         "type": "web_srv",
         "repo": repo_url,
@@ -47,22 +57,12 @@ def deploy_to_render(repo_name: str, repo_url: str, campaign_id: int) -> str:
         "serviceDetails": {
             "env": "docker",
             "dockerfilePath": "./Dockerfile",
-            "envVars": [
-                {"key": "BCL_API_KEY", "value": bcl_api_key},
-                # Adicione outras chaves de API que o BCL Activate precisa (OpenAI, Google, etc.)
-                # Elas devem ser obtidas do seu ambiente seguro
-                {"key": "GOOGLE_API_KEY", "value": os.getenv("TEMPLATE_GOOGLE_API_KEY")},
-                {"key": "OPENAI_API_KEY", "value": os.getenv("TEMPLATE_OPENAI_API_KEY")},
-                {"key": "EVOLUTION_API_URL", "value": os.getenv("TEMPLATE_EVOLUTION_API_URL")},
-                {"key": "EVOLUTION_API_KEY", "value": os.getenv("TEMPLATE_EVOLUTION_API_KEY")},
-                # O nome da instância precisa ser único para cada cliente
-                {"key": "EVOLUTION_INSTANCE_NAME", "value": f"bcl-instance-{campaign_id}"}
-            ]
+            "envVars": [{"key": key, "value": value} for key, value in env.items()]
         }
     }
 
     try:
-        response = requests.post(url, headers=HEADERS, json=payload)
+        response = clients.http_session().post(url, headers=_headers(), json=payload, timeout=clients.HTTP_TIMEOUT)
         response.raise_for_status()
         
         data = response.json()
@@ -70,13 +70,7 @@ def deploy_to_render(repo_name: str, repo_url: str, campaign_id: int) -> str:
         service_url = data["service"]["serviceDetails"]["url"]
         logger.info(f"Serviço criado no Render com ID: {service_id} e URL: {service_url}")
 
-        # Aguarda um pouco para garantir que o serviço esteja estável antes de atualizar o BD
-        time.sleep(5) 
-        
-        # Atualiza a tabela no Supabase
-        _update_campaign_in_supabase(campaign_id, service_url, bcl_api_key)
-        
-        return service_url
+        return service_id, service_url, bcl_api_key
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Erro ao fazer deploy no Render: {e}")
@@ -84,28 +78,62 @@ def deploy_to_render(repo_name: str, repo_url: str, campaign_id: int) -> str:
             logger.error(f"Detalhes do erro do Render: {e.response.text}")
         raise
     except Exception as e:
-        logger.error(f"Erro inesperado durante o deploy ou atualização no Supabase: {e}")
+        logger.error(f"Erro inesperado durante o deploy no Render: {e}")
         raise
 
-def _update_campaign_in_supabase(campaign_id: int, service_url: str, api_key: str):
+def evolution_instance_name(campaign_id) -> str:
+    """Nome da instância da Evolution API (WhatsApp) de uma campanha."""
+    return f"bcl-instance-{campaign_id}"
+
+def update_env_vars(service_id: str, env: dict):
+    """Cria ou atualiza variáveis de ambiente do serviço (aplicadas no próximo deploy ou restart)."""
+    session = clients.http_session()
+    for key, value in env.items():
+        url = _api_url(f"/services/{service_id}/env-vars/{key}")
+        response = session.put(url, headers=_headers(), json={"value": value}, timeout=clients.HTTP_TIMEOUT)
+        response.raise_for_status()
+    logger.info(f"{len(env)} variável(is) de ambiente atualizadas no serviço {service_id}.")
+
+def delete_render_service(service_id: str):
+    """Remove o serviço (compensação de um provisionamento falhado). Um serviço inexistente conta como removido."""
+    url = _api_url(f"/services/{service_id}")
+    response = clients.http_session().delete(url, headers=_headers(), timeout=clients.HTTP_TIMEOUT)
+    if response.status_code == 404:
+        logger.info(f"Serviço {service_id} já não existe no Render.")
+        return
+    response.raise_for_status()
+    logger.info(f"Serviço {service_id} removido do Render.")
+
+def get_deploy_status(service_id: str) -> str:
     """
-    Atualiza o registo da campanha no Supabase com o URL do serviço e a chave de API.
+    Devolve o estado do deploy mais recente do serviço no Render
+    (ex.: 'build_in_progress', 'live', 'build_failed').
     """
-    try:
-        supabase = _get_supabase_client()
-        logger.info(f"A atualizar campanha {campaign_id} no Supabase com URL: {service_url}")
-        
-        data, count = supabase.table('campaigns').update({
-            'service_url': service_url,
-            'status': 'active',
-            'api_key': api_key
-        }).eq('id', campaign_id).execute()
+    url = _api_url(f"/services/{service_id}/deploys")
+    response = clients.http_session().get(url, headers=_headers(), params={"limit": 1}, timeout=clients.HTTP_TIMEOUT)
+    response.raise_for_status()
+    deploys = response.json()
+    if not deploys:
+        return "created"
+    return deploys[0]["deploy"]["status"]
 
-        logger.info(f"Resposta da atualização do Supabase: {data}, {count}")
-        if not (data and len(data[1]) > 0):
-             logger.warning(f"Atenção: A campanha com ID {campaign_id} não foi encontrada no Supabase para ser atualizada.")
+def _mark_campaign_failed(campaign_id: int, reason: str):
+    """Marca a campanha como 'failed' no Supabase, guardando o motivo no campo do URL."""
+    logger.info(f"A marcar a campanha {campaign_id} como 'failed'.")
+    # Trunca a mensagem de erro para caber no campo do URL, se necessário
+    status_writer.writer.write(campaign_id, {
+        'status': 'failed',
+        'service_url': f"Erro: {reason[:250]}"
+    })
 
-    except Exception as e:
-        logger.error(f"Erro ao atualizar campanha no Supabase: {e}", exc_info=True)
-        # Mesmo que a atualização falhe, não interrompemos o fluxo principal,
-        # mas registamos o erro para análise posterior.
\ No newline at end of file
+def _update_campaign_in_supabase(campaign_id: int, service_url: str, api_key: str, status: str = 'active'):
+    """
+    Atualiza o registo da campanha no Supabase com o URL do serviço e a chave de API.
+    As escritas são agrupadas pelo status_writer; falhas são registadas sem interromper o fluxo.
+    """
+    logger.info(f"A atualizar campanha {campaign_id} no Supabase ({status}) com URL: {service_url}")
+    status_writer.writer.write(campaign_id, {
+        'service_url': service_url,
+        'status': status,
+        'api_key': api_key
+    })
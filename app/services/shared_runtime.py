@@ -0,0 +1,60 @@
+# fabrica-bcl/app/services/shared_runtime.py
+
+import os
+import logging
+
+from app.api.models import CampaignDetails
+from app.services import clients, project_builder, render_service
+
+logger = logging.getLogger(__name__)
+
+# URL público do runtime multi-tenant (instância do template com BCL_MULTI_TENANT=true)
+SHARED_RUNTIME_URL = os.getenv("SHARED_RUNTIME_URL")
+# Tabela lida pelo registo de campanhas do runtime partilhado
+CAMPAIGN_REGISTRY_TABLE = os.getenv("CAMPAIGN_REGISTRY_TABLE", "campaign_runtime")
+
+
+def register_campaign(campaign_id: str, details: CampaignDetails) -> tuple[str, str, str]:
+    """
+    Regista a campanha no runtime partilhado, sem criar repositório nem serviço.
+    Devolve o URL do serviço, a chave de API e o webhook_id da campanha.
+    """
+    if not SHARED_RUNTIME_URL:
+        raise ValueError("A variável de ambiente SHARED_RUNTIME_URL é obrigatória no modo partilhado.")
+
+    api_key = f"bcl_secret_{campaign_id}_{os.urandom(16).hex()}"
+    webhook_id = f"wh_{os.urandom(12).hex()}"
+    row = {
+        "campaign_id": campaign_id,
+        "webhook_id": webhook_id,
+        "api_key": api_key,
+        "system_prompt": project_builder.build_system_prompt(details),
+        # A mesma instância da Evolution API que uma instância dedicada da campanha usaria
+        "whatsapp_instance": render_service.evolution_instance_name(campaign_id),
+        "active": True,
+    }
+    clients.supabase().table(CAMPAIGN_REGISTRY_TABLE).upsert(row, on_conflict='campaign_id').execute()
+    logger.info(f"Campanha {campaign_id} registada no runtime partilhado (webhook {webhook_id}).")
+
+    return SHARED_RUNTIME_URL.rstrip("/"), api_key, webhook_id
+
+
+def webhook_url(service_url: str, webhook_id: str) -> str:
+    """URL para onde a campanha deve enviar os leads no runtime partilhado."""
+    return f"{service_url.rstrip('/')}/webhook/{webhook_id}"
+
+
+def deactivate_campaign(campaign_id: str):
+    """Retira a campanha do runtime partilhado (ex.: passou a ter uma instância dedicada)."""
+    clients.supabase().table(CAMPAIGN_REGISTRY_TABLE).update(
+        {"active": False}
+    ).eq('campaign_id', campaign_id).execute()
+    logger.info(f"Campanha {campaign_id} desativada no runtime partilhado.")
+
+
+def update_campaign(campaign_id: str, system_prompt: str):
+    """Atualiza o prompt de uma campanha já registada; o runtime recarrega-o no próximo refresh do registo."""
+    clients.supabase().table(CAMPAIGN_REGISTRY_TABLE).update(
+        {"system_prompt": system_prompt}
+    ).eq('campaign_id', campaign_id).execute()
+    logger.info(f"Prompt da campanha {campaign_id} atualizado no runtime partilhado.")
@@ -0,0 +1,102 @@
+# fabrica-bcl/app/services/status_writer.py
+
+import os
+import logging
+import threading
+from typing import Optional
+
+from app.services import clients
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (segundos) entre escritas agrupadas de status no Supabase
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "1.0"))
+
+
+class StatusWriter:
+    """
+    Agrupa as atualizações de status das campanhas e escreve-as no Supabase
+    a cada intervalo, com uma leitura e um único upsert para todas as campanhas.
+    Várias atualizações da mesma campanha dentro do intervalo são fundidas
+    numa só. Enquanto o flusher não estiver a correr, cada atualização é
+    escrita de imediato.
+    """
+
+    def __init__(self, table: str = 'campaigns', flush_interval: float = STATUS_FLUSH_INTERVAL):
+        self._table = table
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer: dict[str, dict] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def write(self, campaign_id, fields: dict):
+        """Agenda a atualização de `fields` na campanha `campaign_id`."""
+        if not (self._thread and self._thread.is_alive()):
+            self._update_one(campaign_id, fields)
+            return
+        with self._lock:
+            self._buffer.setdefault(str(campaign_id), {"campaign_id": campaign_id, "fields": {}})["fields"].update(fields)
+
+    def flush(self):
+        with self._lock:
+            pending, self._buffer = list(self._buffer.values()), {}
+        if not pending:
+            return
+        # Uma leitura das linhas completas e um único upsert para todas as campanhas, quaisquer que
+        # sejam os valores de cada uma. Só campanhas que já existem entram no upsert (nunca cria linhas),
+        # e as linhas vão completas, para não falharem nas colunas NOT NULL. Uma alteração de outras
+        # colunas entre a leitura e o upsert pode ser sobrescrita; a janela é a de um pedido.
+        campaign_ids = [update["campaign_id"] for update in pending]
+        try:
+            table = clients.supabase().table(self._table)
+            current = {str(row["id"]): row for row in table.select('*').in_('id', campaign_ids).execute().data or []}
+            rows = []
+            for update in pending:
+                row = current.get(str(update["campaign_id"]))
+                if row is None:
+                    _warn_not_found(update["campaign_id"])
+                    continue
+                rows.append({**row, **update["fields"]})
+            if rows:
+                clients.supabase().table(self._table).upsert(rows, on_conflict='id').execute()
+                logger.info(f"{len(rows)} atualização(ões) de status escritas no Supabase num único upsert.")
+        except Exception as e:
+            # Sem o lote (ex.: colunas geradas na tabela), recorre a updates individuais
+            logger.warning(f"Escrita em lote falhou ({e}); a escrever {len(pending)} atualização(ões) individualmente.")
+            for update in pending:
+                self._update_one(update["campaign_id"], update["fields"])
+
+    def _update_one(self, campaign_id, fields: dict):
+        try:
+            response = clients.supabase().table(self._table).update(fields).eq('id', campaign_id).execute()
+            if not response.data:
+                _warn_not_found(campaign_id)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar a campanha {campaign_id} no Supabase: {e}", exc_info=True)
+
+    def _run(self):
+        while not self._stop.wait(self._flush_interval):
+            self.flush()
+
+
+def _warn_not_found(campaign_id):
+    logger.warning(f"Atenção: A campanha com ID {campaign_id} não foi encontrada no Supabase para ser atualizada.")
+
+
+# Instância partilhada pela fábrica
+writer = StatusWriter()
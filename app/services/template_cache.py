@@ -0,0 +1,224 @@
+# fabrica-bcl/app/services/template_cache.py
+
+import os
+import re
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'templates', 'bcl-activate-template')
+# Intervalo mínimo (segundos) entre verificações de alterações no template em disco
+TEMPLATE_CACHE_CHECK_INTERVAL = float(os.getenv("TEMPLATE_CACHE_CHECK_INTERVAL", "2"))
+
+# Ficheiros que nunca devem ser copiados para uma instância
+JUNK_NAMES = {".DS_Store", "Thumbs.db", "__pycache__", ".pytest_cache", ".venv", "venv", ".env"}
+JUNK_SUFFIXES = (".pyc", ".pyo", ".swp")
+# Testes do template, na raiz: correm no repositório da fábrica e não vão para as instâncias
+DEV_ONLY_PATHS = {"tests", "pytest.ini", "conftest.py"}
+
+SLOT_START = "# ### SYSTEM PROMPT START ###"
+SLOT_END = "# ### SYSTEM PROMPT END ###"
+MAIN_PY = os.path.join("app", "api", "main.py")
+REQUIREMENTS_TXT = "requirements.txt"
+
+_ASSIGNMENT_RE = re.compile(r'^(?P<indent>[ \t]*)(?P<name>\w+)\s*=\s*(?:"""|\'\'\')', re.MULTILINE)
+# Linha do requirements.txt que só entra na imagem das instâncias que usam um provedor de LLM
+_PROVIDER_LINE_RE = re.compile(r'^(?P<requirement>.*?)\s*#\s*provider:\s*(?P<provider>[\w-]+)\s*$')
+
+# ioctl FICLONE do Linux (reflink em btrfs/xfs)
+_FICLONE = 0x40049409
+
+
+@dataclass(frozen=True)
+class PromptSlot:
+    """Ficheiro pré-compilado em três partes: antes do slot, atribuição do prompt e depois do slot."""
+    prefix: str
+    indent: str
+    var_name: str
+    suffix: str
+
+    def render(self, system_prompt: str) -> str:
+        escaped = system_prompt.strip().replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+        assignment = f'{self.indent}{self.var_name} = """\n{self.indent}{escaped}\n{self.indent}"""\n'
+        return f"{self.prefix}{assignment}{self.suffix}"
+
+
+@dataclass(frozen=True)
+class RequirementsSlot:
+    """requirements.txt do template dividido em dependências comuns e SDKs de cada provedor."""
+    base: tuple[str, ...]
+    providers: dict[str, tuple[str, ...]] = field(default_factory=dict)
+
+    def render(self, providers: Iterable[str]) -> str:
+        lines = list(self.base)
+        for name in providers:
+            lines.extend(self.providers.get(name, ()))
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class TemplateManifest:
+    """Lista dos ficheiros do template (sem lixo) e slots de substituição já compilados."""
+    root: str
+    files: list[str]
+    slots: dict[str, PromptSlot]
+    fingerprint: str
+    requirements: Optional[RequirementsSlot] = None
+
+    @property
+    def rendered_paths(self) -> set[str]:
+        """Ficheiros gerados por campanha, que nunca vão tal como estão no template."""
+        return set(self.slots) | ({REQUIREMENTS_TXT} if self.requirements else set())
+
+
+_lock = threading.Lock()
+_manifest: Optional[TemplateManifest] = None
+_last_check = 0.0
+_clone_strategy = "link"
+
+
+def get_manifest(template_path: str = TEMPLATE_PATH) -> TemplateManifest:
+    """
+    Devolve o manifesto em cache, reconstruindo-o apenas se o template
+    tiver mudado em disco desde a última verificação.
+    """
+    global _manifest, _last_check
+    with _lock:
+        now = time.monotonic()
+        if _manifest and _manifest.root == os.path.realpath(template_path) and now - _last_check < TEMPLATE_CACHE_CHECK_INTERVAL:
+            return _manifest
+        _last_check = now
+
+        files = _scan(template_path)
+        fingerprint = _fingerprint(template_path, files)
+        if _manifest and _manifest.fingerprint == fingerprint:
+            return _manifest
+
+        _manifest = _build_manifest(template_path, files, fingerprint)
+        logger.info(f"Template carregado em cache: {len(files)} ficheiros, assinatura {fingerprint[:12]}.")
+        return _manifest
+
+
+def materialize(manifest: TemplateManifest, dest: str, rendered: dict[str, str]):
+    """
+    Cria a instância em `dest`: escreve apenas os ficheiros renderizados e
+    liga (hardlink/reflink) os restantes ao template, sem copiar conteúdo.
+    """
+    os.makedirs(dest)
+    created_dirs = {dest}
+    for rel_path in manifest.files:
+        target = os.path.join(dest, rel_path)
+        parent = os.path.dirname(target)
+        if parent not in created_dirs:
+            os.makedirs(parent, exist_ok=True)
+            created_dirs.add(parent)
+
+        if rel_path in rendered:
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(rendered[rel_path])
+        else:
+            _clone_file(os.path.join(manifest.root, rel_path), target)
+
+
+def is_junk(name: str) -> bool:
+    return name in JUNK_NAMES or name.endswith(JUNK_SUFFIXES)
+
+
+def _scan(root: str) -> list[str]:
+    """Lista os ficheiros do template (caminhos relativos, ordenados), ignorando lixo e os testes."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        excluded = DEV_ONLY_PATHS if dirpath == root else ()
+        dirnames[:] = sorted(d for d in dirnames if not is_junk(d) and d not in excluded)
+        for name in sorted(filenames):
+            if not is_junk(name) and name not in excluded:
+                files.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return files
+
+
+def _fingerprint(root: str, files: list[str]) -> str:
+    digest = hashlib.sha1()
+    for rel_path in files:
+        st = os.stat(os.path.join(root, rel_path))
+        digest.update(f"{rel_path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _build_manifest(root: str, files: list[str], fingerprint: str) -> TemplateManifest:
+    slots = {}
+    if MAIN_PY in files:
+        with open(os.path.join(root, MAIN_PY), 'r', encoding='utf-8') as f:
+            slots[MAIN_PY] = _compile_slot(f.read())
+    requirements = None
+    if REQUIREMENTS_TXT in files:
+        with open(os.path.join(root, REQUIREMENTS_TXT), 'r', encoding='utf-8') as f:
+            requirements = _compile_requirements(f.read())
+    return TemplateManifest(root=os.path.realpath(root), files=files, slots=slots, fingerprint=fingerprint,
+                            requirements=requirements)
+
+
+def _compile_slot(content: str) -> PromptSlot:
+    """Divide o main.py do template em torno dos marcadores do prompt de sistema."""
+    start = content.find(SLOT_START)
+    end = content.find(SLOT_END)
+    if start == -1 or end == -1 or end < start:
+        raise ValueError("Marcadores do SYSTEM PROMPT não encontrados no main.py do template.")
+
+    body_start = content.index("\n", start) + 1
+    body_end = content.rfind("\n", 0, end) + 1
+    match = _ASSIGNMENT_RE.search(content[body_start:body_end])
+    if not match:
+        raise ValueError("O slot do SYSTEM PROMPT no template não contém uma atribuição de string.")
+
+    return PromptSlot(
+        prefix=content[:body_start],
+        indent=match.group("indent"),
+        var_name=match.group("name"),
+        suffix=content[body_end:],
+    )
+
+
+def _compile_requirements(content: str) -> RequirementsSlot:
+    """Separa as linhas marcadas com `# provider: <nome>` das dependências comuns."""
+    base, providers = [], {}
+    for line in content.splitlines():
+        match = _PROVIDER_LINE_RE.match(line)
+        if match:
+            providers.setdefault(match.group("provider"), []).append(match.group("requirement"))
+        else:
+            base.append(line)
+    return RequirementsSlot(base=tuple(base), providers={name: tuple(lines) for name, lines in providers.items()})
+
+
+def _clone_file(src: str, dst: str):
+    """Hardlink, depois reflink, e por fim cópia normal se o sistema de ficheiros não suportar nenhum."""
+    global _clone_strategy
+    if _clone_strategy == "link":
+        try:
+            os.link(src, dst)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            logger.info(f"Hardlinks indisponíveis para o diretório de instâncias ({e.strerror}); a tentar reflink.")
+            _clone_strategy = "reflink"
+
+    if _clone_strategy == "reflink":
+        try:
+            import fcntl
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            shutil.copymode(src, dst)
+            return
+        except (ImportError, OSError):
+            logger.info("Reflinks indisponíveis; os ficheiros do template serão copiados.")
+            _clone_strategy = "copy"
+
+    shutil.copy2(src, dst)
@@ -0,0 +1,348 @@
+# fabrica-bcl/app/services/warm_pool.py
+
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.api.models import CampaignDetails
+from app.services import checkpoints, clients, deploy_tracker, github_service, pipeline, project_builder, render_service, template_cache
+
+logger = logging.getLogger(__name__)
+
+# Número de instâncias genéricas mantidas prontas a atribuir (0 desativa o pool)
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "0"))
+# O pool só é reabastecido quando as instâncias prontas ou em construção descem abaixo deste valor
+WARM_POOL_LOW_WATERMARK = int(os.getenv("WARM_POOL_LOW_WATERMARK", str(max(1, WARM_POOL_SIZE // 2))))
+WARM_POOL_REFILL_INTERVAL = float(os.getenv("WARM_POOL_REFILL_INTERVAL", "30"))
+# Instâncias do pool construídas em simultâneo (dentro dos limites das etapas do pipeline)
+WARM_POOL_BUILD_CONCURRENCY = int(os.getenv("WARM_POOL_BUILD_CONCURRENCY", "2"))
+# Depois de construções falhadas seguidas, o reabastecimento espera o intervalo a dobrar, até este máximo
+WARM_POOL_MAX_BACKOFF = float(os.getenv("WARM_POOL_MAX_BACKOFF", "1800"))
+WARM_POOL_DB = os.getenv("WARM_POOL_DB", os.path.join('/tmp', 'bcl_factory', 'warm_pool.sqlite3'))
+
+STATUS_BUILDING = "building"
+STATUS_READY = "ready"
+STATUS_CLAIMED = "claimed"
+STATUS_FAILED = "failed"
+
+# Amostras de latência de atribuição guardadas para as métricas
+_LATENCY_SAMPLES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS warm_instances (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    repo_name TEXT NOT NULL,
+    repo_url TEXT,
+    service_id TEXT,
+    service_url TEXT,
+    admin_key TEXT NOT NULL,
+    campaign_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    ready_at REAL,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_warm_status ON warm_instances (status, ready_at);
+"""
+
+
+class WarmPool:
+    """
+    Pool de instâncias genéricas já construídas e com o deploy 'live',
+    persistido em SQLite. Uma thread de reabastecimento mantém o pool
+    entre a marca mínima e o tamanho configurado; a ativação de uma
+    campanha reclama uma instância pronta e envia-lhe apenas a
+    configuração (endpoint /admin/config e variáveis de ambiente do serviço).
+    Uma instância que falhe é descartada: o serviço e o repositório seguem
+    para a fila de limpezas do janitor e o registo é apagado.
+    """
+
+    def __init__(self, db_path: str = WARM_POOL_DB, size: int = WARM_POOL_SIZE,
+                 low_watermark: int = WARM_POOL_LOW_WATERMARK, refill_interval: float = WARM_POOL_REFILL_INTERVAL,
+                 build_concurrency: int = WARM_POOL_BUILD_CONCURRENCY,
+                 build: Optional[Callable[[str, str], dict]] = None,
+                 configure: Optional[Callable[[dict, str, str], None]] = None):
+        self._db_path = db_path
+        self._size = size
+        self._low_watermark = min(low_watermark, size)
+        self._refill_interval = refill_interval
+        self._build = build or build_instance
+        self._configure = configure or configure_instance
+        self._executor = ThreadPoolExecutor(max_workers=max(1, build_concurrency), thread_name_prefix="warm-pool-build")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._hits = 0
+        self._misses = 0
+        self._build_failures = 0
+        self._backoff_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0
+
+    # --- CICLO DE VIDA ---
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        db_dir = os.path.dirname(self._db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._discard_failed()
+        self._resume_building()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="warm-pool-refill", daemon=True)
+        self._thread.start()
+        logger.info(f"Warm pool iniciado: tamanho {self._size}, marca mínima {self._low_watermark}.")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._conn:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    # --- API PÚBLICA ---
+    def claim(self, campaign_id, details: CampaignDetails) -> Optional[dict]:
+        """
+        Atribui uma instância pronta à campanha e envia-lhe a configuração.
+        Devolve None se o pool estiver vazio ou a configuração falhar; nesse
+        caso quem chama recorre ao provisionamento completo.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM warm_instances WHERE status = ? ORDER BY ready_at LIMIT 1", (STATUS_READY,)
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE warm_instances SET status = ?, campaign_id = ?, claimed_at = ? WHERE id = ?",
+                    (STATUS_CLAIMED, str(campaign_id), time.time(), row["id"])
+                )
+        self._wakeup.set()
+        if not row:
+            self._misses += 1
+            logger.info(f"Warm pool vazio; a campanha {campaign_id} segue o provisionamento completo.")
+            return None
+
+        instance = dict(row, campaign_id=str(campaign_id))
+        api_key = f"bcl_secret_{campaign_id}_{os.urandom(16).hex()}"
+        try:
+            self._configure(instance, project_builder.build_system_prompt(details), api_key)
+        except Exception as e:
+            logger.error(f"Falha ao configurar a instância {instance['id']} do pool para a campanha {campaign_id}: {e}")
+            self._discard(instance["id"], f"Configuração falhou: {str(e)[:400]}")
+            self._misses += 1
+            return None
+
+        latency = time.perf_counter() - start
+        self._latencies.append(latency)
+        self._hits += 1
+        logger.info(f"Instância {instance['id']} do pool atribuída à campanha {campaign_id} em {latency:.2f}s.")
+        return {
+            "service_id": instance["service_id"], "service_url": instance["service_url"], "api_key": api_key,
+            "repo_name": instance["repo_name"], "repo_url": instance["repo_url"], "admin_key": instance["admin_key"],
+        }
+
+    def metrics(self) -> dict:
+        depth = {status: 0 for status in (STATUS_BUILDING, STATUS_READY, STATUS_CLAIMED, STATUS_FAILED)}
+        if self._conn:
+            with self._lock:
+                for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM warm_instances GROUP BY status"):
+                    depth[row["status"]] = row["n"]
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+        return {
+            "enabled": self.enabled, "size": self._size, "low_watermark": self._low_watermark, "depth": depth,
+            "consecutive_build_failures": self._build_failures,
+            "backoff_seconds": round(max(0.0, self._backoff_until - time.monotonic()), 1),
+            "claims": {"hits": self._hits, "misses": self._misses,
+                       "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)}},
+        }
+
+    # --- INTERNOS ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._refill()
+            except Exception as e:
+                logger.error(f"Erro ao reabastecer o warm pool: {e}", exc_info=True)
+            self._wakeup.wait(self._refill_interval)
+            self._wakeup.clear()
+
+    def _refill(self):
+        if time.monotonic() < self._backoff_until:
+            return
+        with self._lock:
+            available = self._conn.execute(
+                "SELECT COUNT(*) FROM warm_instances WHERE status IN (?, ?)", (STATUS_BUILDING, STATUS_READY)
+            ).fetchone()[0]
+            if available >= self._low_watermark:
+                return
+            missing = self._size - available
+            now = time.time()
+            new_ids = [uuid.uuid4().hex[:8] for _ in range(missing)]
+            for instance_id in new_ids:
+                self._conn.execute(
+                    "INSERT INTO warm_instances (id, status, repo_name, admin_key, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (instance_id, STATUS_BUILDING, f"bcl-pool-{instance_id}", f"bcl_admin_{os.urandom(16).hex()}", now)
+                )
+        logger.info(f"Warm pool abaixo da marca mínima ({available}/{self._low_watermark}); a construir {missing} instância(s).")
+        for instance_id in new_ids:
+            self._executor.submit(self._build_one, instance_id)
+
+    def _build_one(self, instance_id: str):
+        with self._lock:
+            row = dict(self._conn.execute("SELECT * FROM warm_instances WHERE id = ?", (instance_id,)).fetchone())
+        try:
+            built = self._build(row["repo_name"], row["admin_key"])
+        except Exception as e:
+            logger.error(f"Falha ao construir a instância {instance_id} do pool: {e}", exc_info=True)
+            self._build_failed(instance_id, str(e)[:500])
+            return
+        self._set(instance_id, **built)
+        self._track(instance_id, built["service_id"])
+
+    def _track(self, instance_id: str, service_id: str):
+        deploy_tracker.tracker.track(
+            f"pool:{instance_id}", service_id,
+            on_ready=lambda: self._ready(instance_id),
+            on_failed=lambda reason: self._build_failed(instance_id, reason),
+        )
+
+    def _ready(self, instance_id: str):
+        self._set(instance_id, status=STATUS_READY, ready_at=time.time())
+        self._build_failures = 0
+        self._backoff_until = 0.0
+
+    def _build_failed(self, instance_id: str, reason: str):
+        """Descarta a instância e adia o próximo reabastecimento (backoff exponencial)."""
+        self._discard(instance_id, reason)
+        self._build_failures += 1
+        delay = min(WARM_POOL_MAX_BACKOFF, self._refill_interval * 2 ** (self._build_failures - 1))
+        self._backoff_until = time.monotonic() + delay
+        logger.warning(f"{self._build_failures} construção(ões) do pool falhadas seguidas; "
+                       f"reabastecimento suspenso por {delay:.0f}s.")
+
+    def _discard(self, instance_id: str, reason: str):
+        """Agenda a remoção do serviço e do repositório da instância e apaga o registo."""
+        with self._lock:
+            if self._conn is None:
+                return
+            row = self._conn.execute("SELECT * FROM warm_instances WHERE id = ?", (instance_id,)).fetchone()
+            if not row:
+                return
+            self._conn.execute("DELETE FROM warm_instances WHERE id = ?", (instance_id,))
+        logger.warning(f"Instância {instance_id} do pool descartada: {reason}")
+        # O serviço é removido antes do repositório de que depende; um repositório que não chegou a ser criado conta como removido
+        if row["service_id"]:
+            checkpoints.store.schedule_cleanup(checkpoints.CLEANUP_SERVICE, row["service_id"])
+        checkpoints.store.schedule_cleanup(checkpoints.CLEANUP_REPO, row["repo_name"])
+        checkpoints.store.schedule_cleanup(checkpoints.CLEANUP_WORKDIR,
+                                           os.path.join(project_builder.OUTPUT_DIR, row["repo_name"]))
+
+    def _discard_failed(self):
+        """Compensa as instâncias que ficaram 'failed' em execuções anteriores."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, error FROM warm_instances WHERE status = ?", (STATUS_FAILED,)).fetchall()
+        for row in rows:
+            self._discard(row["id"], row["error"] or "falha anterior")
+
+    def _resume_building(self):
+        """No arranque, volta a acompanhar os deploys em curso; construções interrompidas antes do deploy falham."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, service_id FROM warm_instances WHERE status = ?", (STATUS_BUILDING,)
+            ).fetchall()
+        for row in rows:
+            if row["service_id"]:
+                self._track(row["id"], row["service_id"])
+            else:
+                self._discard(row["id"], "Construção interrompida por um restart.")
+
+    def _set(self, instance_id: str, **fields):
+        with self._lock:
+            if self._conn is None:
+                return
+            assignments = ", ".join(f"{column} = ?" for column in fields)
+            self._conn.execute(f"UPDATE warm_instances SET {assignments} WHERE id = ?", (*fields.values(), instance_id))
+
+
+def build_instance(repo_name: str, admin_key: str) -> dict:
+    """Cria o repositório com o template genérico e o serviço no Render, sem campanha."""
+    timings = {}
+    manifest = template_cache.get_manifest()
+    # Os ficheiros com slot vão tal como estão no template (prompt genérico); as dependências já vão reduzidas
+    rendered = {rel_path: _read(manifest, rel_path) for rel_path in manifest.slots}
+    rendered.update(project_builder.render_requirements(manifest))
+    with pipeline.stage("github", timings):
+        repo_url = github_service.create_remote_repo(repo_name)
+    if github_service.GITHUB_PUSH_MODE == "packstream":
+        with pipeline.stage("github", timings):
+            github_service.push_rendered_to_github(manifest, rendered, repo_name, repo_url)
+    else:
+        repo_path = os.path.join(project_builder.OUTPUT_DIR, repo_name)
+        with pipeline.stage("builder", timings):
+            template_cache.materialize(manifest, repo_path, rendered)
+        with pipeline.stage("github", timings):
+            github_service.push_to_github(repo_path, repo_name, repo_url)
+        # Depois do push a cópia de trabalho já não é precisa; o janitor apaga-a
+        checkpoints.store.schedule_cleanup(checkpoints.CLEANUP_WORKDIR, repo_path)
+    with pipeline.stage("render", timings):
+        # Sem campanha, a instância da Evolution API tem o nome do pool até ser atribuída
+        service_id, service_url, _ = render_service.create_render_service(
+            repo_name, repo_url, repo_name, extra_env={"BCL_ADMIN_KEY": admin_key, "EVOLUTION_INSTANCE_NAME": repo_name}
+        )
+    logger.info(f"Instância {repo_name} do pool criada; a aguardar o deploy. Tempos por etapa: {timings}")
+    return {"repo_url": repo_url, "service_id": service_id, "service_url": service_url}
+
+
+def configure_instance(instance: dict, system_prompt: str, api_key: str):
+    """
+    Aplica a campanha à instância em execução (efeito imediato) e grava os
+    mesmos valores nas variáveis de ambiente do serviço (sobrevivem a restarts).
+    A instância da Evolution API passa a ser a da campanha, como numa instância dedicada.
+    """
+    whatsapp_instance = render_service.evolution_instance_name(instance["campaign_id"])
+    response = clients.http_session().post(
+        f"{instance['service_url'].rstrip('/')}/admin/config",
+        headers={"X-ADMIN-KEY": instance["admin_key"]},
+        json={"system_prompt": system_prompt, "api_key": api_key, "whatsapp_instance": whatsapp_instance},
+        timeout=clients.HTTP_TIMEOUT,
+    )
+    response.raise_for_status()
+    render_service.update_env_vars(instance["service_id"], {
+        "BCL_SYSTEM_PROMPT": system_prompt, "BCL_API_KEY": api_key, "EVOLUTION_INSTANCE_NAME": whatsapp_instance
+    })
+
+
+def _read(manifest: template_cache.TemplateManifest, rel_path: str) -> str:
+    with open(os.path.join(manifest.root, rel_path), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+# Instância partilhada pela fábrica
+pool = WarmPool()
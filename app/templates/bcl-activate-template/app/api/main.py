@@ -1,33 +1,71 @@
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from typing import Optional, Any
 from fastapi import FastAPI, HTTPException, Security, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, ValidationError
-from dotenv import load_dotenv
-import google.generativeai as genai
-from openai import OpenAI
 
-# Carrega as variáveis de ambiente
-load_dotenv()
+# Carrega o .env de desenvolvimento (antes dos serviços, que leem as variáveis ao importar);
+# em produção as variáveis já vêm do ambiente e o python-dotenv nem é importado
+_ENV_FILE = os.path.join(os.path.dirname(__file__), "..", "..", ".env")
+if os.path.exists(_ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
+
+from app.services import llm, telemetry, whatsapp
+from app.services.batcher import LeadBatcher
+from app.services.generation_cache import GenerationCache, chave_do_lead
+from app.services.lead_log import LeadLog
+from app.services.lead_mapping import LeadNormalizer
+from app.services.campaign_registry import CampaignRegistry, CampaignConfig
 
 # Configuração do Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração dos Clientes de IA
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Agrupa leads em rajada num único pedido ao LLM (ativo com LLM_BATCH_WINDOW_MS > 0)
+lead_batcher = LeadBatcher()
+generation_cache = GenerationCache()
+# Registo durável dos webhooks recebidos, drenado por um consumidor em segundo plano
+lead_log = LeadLog()
+# Fila persistente das mensagens de WhatsApp, enviadas pela Evolution API em segundo plano
+outbox = whatsapp.Outbox()
 
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+WEBHOOKS = telemetry.Counter(
+    "bcl_webhooks_total", "Webhooks recebidos, por resultado (accepted, duplicate, invalid, unknown, error).", ("result",)
+)
+# Lidas a cada recolha do /metrics
+telemetry.Gauge("bcl_lead_log_pending", "Leads registados à espera de processamento ou em curso.",
+                function=lambda: lead_log.pending_count())
+telemetry.Gauge("bcl_outbox_pending", "Mensagens de WhatsApp à espera de envio.",
+                function=lambda: outbox.pending_count())
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    outbox.open()
+    if whatsapp.is_configured():
+        outbox.start_sender()
+    else:
+        logger.warning("Evolution API não configurada; as mensagens ficam na fila sem envio.")
+    lead_log.open()
+    lead_log.start_consumer(_processar_lead_registado)
+    # Os SDKs dos provedores carregam em segundo plano, sem atrasar a primeira resposta
+    asyncio.get_running_loop().run_in_executor(None, llm.preload)
+    yield
+    await lead_log.stop_consumer()
+    lead_log.close()
+    await outbox.stop_sender()
+    outbox.close()
 
 app = FastAPI(
     title="BCL Activate API",
     description="API para ativar leads e receber webhooks.",
-    version="1.0.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 # --- MODELOS DE DADOS ---
@@ -53,78 +91,186 @@ async def get_api_key(api_key: str = Security(api_key_header)):
     else:
         raise HTTPException(status_code=403, detail="Chave de API inválida ou em falta")
 
+# --- MODO MULTI-TENANT ---
+# Um único processo serve várias campanhas; a configuração de cada uma vem do registo
+BCL_MULTI_TENANT = os.getenv("BCL_MULTI_TENANT", "false").lower() in ("1", "true", "yes")
+BCL_ADMIN_KEY = os.getenv("BCL_ADMIN_KEY")
+campaign_registry = CampaignRegistry() if BCL_MULTI_TENANT else None
+admin_key_header = APIKeyHeader(name="X-ADMIN-KEY", auto_error=False)
+
+async def get_admin_key(admin_key: str = Security(admin_key_header)):
+    if not BCL_ADMIN_KEY or admin_key != BCL_ADMIN_KEY:
+        raise HTTPException(status_code=403, detail="Chave de administração inválida ou em falta")
+    return admin_key
+
+async def get_campaign(api_key: str = Security(api_key_header)) -> Optional[CampaignConfig]:
+    """No modo multi-tenant, a chave de API identifica a campanha; caso contrário valida a BCL_API_KEY."""
+    if not BCL_MULTI_TENANT:
+        await get_api_key(api_key)
+        return None
+    campaign = await run_in_threadpool(campaign_registry.get_by_api_key, api_key)
+    if not campaign:
+        raise HTTPException(status_code=403, detail="Chave de API inválida ou em falta")
+    return campaign
+
 # --- LÓGICA CENTRAL ---
+# O prompt de sistema é montado uma única vez por processo
+# ### SYSTEM PROMPT START ###
+# (Este conteúdo será substituído pela fábrica)
+SYSTEM_PROMPT = """
+Você é um assistente de vendas especialista. Crie uma mensagem curta e humana para o WhatsApp.
+"""
+# ### SYSTEM PROMPT END ###
+SYSTEM_PROMPT = SYSTEM_PROMPT.strip()
+# Instâncias do warm pool da fábrica recebem o prompt da campanha por variável de ambiente
+SYSTEM_PROMPT = os.getenv("BCL_SYSTEM_PROMPT") or SYSTEM_PROMPT
+
 def criar_prompt_para_lead(lead: Lead) -> str:
-    # ### SYSTEM PROMPT START ###
-    # (Este conteúdo será substituído pela fábrica)
-    system_prompt = """
-    Você é um assistente de vendas especialista. Crie uma mensagem curta e humana para o WhatsApp.
-    """
-    # ### SYSTEM PROMPT END ###
-    
-    user_prompt = f"Crie a mensagem para o seguinte lead:\nNome: {lead.name}\nEmail: {lead.email}\nTelefone: {lead.phone}\nEmpresa: {lead.company}\nCargo: {lead.position}\nInteresse: {lead.interest}"
-    return f"{system_prompt}\n\n{user_prompt}"
+    """Parte do prompt específica do lead; o prompt da campanha vai como instrução de sistema."""
+    return f"Crie a mensagem para o seguinte lead:\nNome: {lead.name}\nEmail: {lead.email}\nTelefone: {lead.phone}\nEmpresa: {lead.company}\nCargo: {lead.position}\nInteresse: {lead.interest}"
 
-def gerar_mensagem(prompt: str) -> str:
-    try:
-        if GOOGLE_API_KEY:
-            model = genai.GenerativeModel('gemini-pro')
-            response = model.generate_content(prompt)
-            return response.text
-        elif openai_client:
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response.choices[0].message.content
-        else:
-            return "Olá! Vi que se interessou pelo nosso produto. Gostaria de conversar?"
-    except Exception as e:
-        logger.error(f"Erro ao gerar mensagem com IA: {e}")
-        return "Olá! Percebi o seu interesse em nossa proposta e gostaria de entender melhor como posso ajudar."
+async def gerar_mensagem(prompt: str, system_prompt: str = SYSTEM_PROMPT) -> str:
+    return await llm.gerar_mensagem(prompt, system_prompt)
 
 # --- ENDPOINTS DA API ---
-@app.post("/activate", dependencies=[Depends(get_api_key)])
-def activate_lead(lead_data: Lead):
+@app.post("/activate")
+async def activate_lead(lead_data: Lead, campaign: Optional[CampaignConfig] = Depends(get_campaign)):
     logger.info(f"Recebido lead para ativação: {lead_data.name}")
-    prompt = criar_prompt_para_lead(lead_data)
-    mensagem = gerar_mensagem(prompt)
-    logger.info(f"Mensagem gerada: {mensagem}")
-    # Aqui viria a lógica para enviar a mensagem via WhatsApp
-    return {"status": "sucesso", "lead_name": lead_data.name, "generated_message": mensagem}
+    mensagem = await _gerar_para_lead(lead_data, campaign)
+    telemetry.log_payload(logger, "Mensagem gerada", mensagem)
+    delivery_id = _agendar_envio(lead_data, mensagem, campaign)
+    return {"status": "sucesso", "lead_name": lead_data.name, "generated_message": mensagem, "delivery_id": delivery_id}
+
+def _agendar_envio(lead: Lead, mensagem: str, campaign: Optional[CampaignConfig],
+                   dedup_key: Optional[str] = None) -> Optional[int]:
+    """Põe a mensagem na fila de envio; o envio em si nunca prende o pedido."""
+    numero = whatsapp.normalizar_numero(lead.phone)
+    if not numero:
+        logger.info(f"Lead {lead.name} sem telefone; mensagem não agendada.")
+        return None
+    instance = campaign.whatsapp_instance if campaign else None
+    delivery_id, _ = outbox.enqueue(numero, mensagem, instance=instance, dedup_key=dedup_key)
+    return delivery_id
+
+async def _gerar_para_lead(lead_data: Lead, campaign: Optional[CampaignConfig]) -> str:
+    system_prompt = campaign.system_prompt if campaign else SYSTEM_PROMPT
+    user_prompt = criar_prompt_para_lead(lead_data)
+
+    async def gerar() -> str:
+        if lead_batcher.enabled and llm.provider():
+            return await lead_batcher.submit(system_prompt, user_prompt)
+        return await gerar_mensagem(user_prompt, system_prompt)
+
+    # Entregas repetidas do mesmo lead reutilizam a mensagem já gerada
+    chave = chave_do_lead(lead_data.model_dump(), system_prompt)
+    return await generation_cache.get_or_generate(chave, gerar, cacheable=lambda m: not llm.is_fallback(m))
 
 # --- ENDPOINT DE WEBHOOK UNIVERSAL ---
-FIELD_MAP = {
-    "full_name": "name", "first_name": "name", "user_name": "name",
-    "email_address": "email", "e-mail": "email",
-    "phone_number": "phone", "telefone": "phone",
-}
+# Um extrator compilado por webhook_id (Meta, RD Station ou formulário genérico)
+lead_normalizer = LeadNormalizer(fields=Lead.model_fields)
 
-def normalize_lead_data(raw_data: dict) -> dict:
+def normalize_lead_data(raw_data: dict, webhook_id: str = "") -> dict:
     """Traduz os campos de entrada para o nosso modelo Lead."""
-    normalized = {}
-    for key, value in raw_data.items():
-        clean_key = key.lower().replace(" ", "_")
-        target_key = FIELD_MAP.get(clean_key, clean_key)
-        if target_key in Lead.model_fields:
-            normalized[target_key] = value
-    return normalized
-
-@app.post("/webhook/{webhook_id}")
+    return lead_normalizer.normalize(webhook_id, raw_data)
+
+@app.post("/webhook/{webhook_id}", status_code=202)
 async def receive_webhook(webhook_id: str, raw_lead: dict):
-    """Endpoint universal para receber webhooks de várias fontes."""
-    logger.info(f"Webhook recebido para {webhook_id} com dados: {raw_lead}")
+    """
+    Endpoint universal para receber webhooks de várias fontes. O lead é gravado
+    no registo durável e confirmado de imediato; a geração corre em segundo plano.
+    Entregas repetidas do mesmo evento são confirmadas sem novo processamento.
+    """
+    if BCL_MULTI_TENANT and not await run_in_threadpool(campaign_registry.get_by_webhook, webhook_id):
+        WEBHOOKS.inc(result="unknown")
+        raise HTTPException(status_code=404, detail="Webhook desconhecido.")
     try:
-        lead_data_dict = normalize_lead_data(raw_lead)
-        lead_instance = Lead(**lead_data_dict)
-        return activate_lead(lead_instance)
+        Lead(**normalize_lead_data(raw_lead, webhook_id))
     except ValidationError as e:
-        logger.error(f"Erro de validação no webhook: {e.errors()}")
-        missing_fields = [err['loc'][0] for err in e.errors() if err['type'] == 'missing']
+        WEBHOOKS.inc(result="invalid")
+        # Os erros do pydantic incluem o payload inteiro; esse só vai para o log com DEBUG ou em amostra
+        errors = e.errors(include_input=False, include_url=False)
+        logger.error(f"Erro de validação no webhook {webhook_id}: {errors}")
+        telemetry.log_payload(logger, f"Payload inválido do webhook {webhook_id}", raw_lead)
+        missing_fields = [err['loc'][0] for err in errors if err['type'] == 'missing']
         raise HTTPException(status_code=422, detail={"error": "Dados do lead incompletos.", "missing_fields": missing_fields})
+
+    try:
+        lead_id, is_new = lead_log.append(webhook_id, raw_lead)
     except Exception as e:
-        logger.error(f"Erro inesperado no processamento do webhook: {e}")
+        WEBHOOKS.inc(result="error")
+        logger.error(f"Erro ao gravar o lead do webhook {webhook_id}: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao processar o lead.")
+    WEBHOOKS.inc(result="accepted" if is_new else "duplicate")
+
+    logger.info(f"Webhook {webhook_id}: lead {lead_id} {'aceite' if is_new else 'repetido, ignorado'}.")
+    return {"status": "aceite", "lead_id": lead_id, "duplicate": not is_new}
+
+async def _processar_lead_registado(seq: int, webhook_id: str, raw_lead: dict) -> str:
+    """Consumidor do registo: normaliza, resolve a campanha, gera a mensagem e agenda o envio."""
+    campaign = None
+    if BCL_MULTI_TENANT:
+        campaign = await run_in_threadpool(campaign_registry.get_by_webhook, webhook_id)
+        if not campaign:
+            raise ValueError(f"Webhook {webhook_id} já não pertence a nenhuma campanha ativa.")
+    lead = Lead(**normalize_lead_data(raw_lead, webhook_id))
+    mensagem = await _gerar_para_lead(lead, campaign)
+    logger.info(f"Mensagem gerada para o lead {lead.name}.")
+    # A chave do lead garante um único envio mesmo que o lead seja reprocessado
+    _agendar_envio(lead, mensagem, campaign, dedup_key=f"lead:{seq}")
+    return mensagem
+
+@app.get("/leads/{lead_id}")
+def get_lead_status(lead_id: int, campaign: Optional[CampaignConfig] = Depends(get_campaign)):
+    """Estado de um lead recebido por webhook."""
+    lead = lead_log.get(lead_id)
+    if not lead or (campaign and campaign_registry.get_by_webhook(lead["webhook_id"]) != campaign):
+        raise HTTPException(status_code=404, detail="Lead não encontrado.")
+    status = {k: lead[k] for k in ("seq", "webhook_id", "status", "attempts", "result", "error", "received_at", "updated_at")}
+    status["delivery"] = outbox.get(dedup_key=f"lead:{lead_id}")
+    return status
+
+@app.get("/deliveries/{delivery_id}")
+def get_delivery_status(delivery_id: int, campaign: Optional[CampaignConfig] = Depends(get_campaign)):
+    """Estado do envio de uma mensagem pelo WhatsApp."""
+    delivery = outbox.get(delivery_id)
+    if not delivery or (campaign and delivery["instance"] != (campaign.whatsapp_instance or whatsapp.EVOLUTION_INSTANCE_NAME)):
+        raise HTTPException(status_code=404, detail="Envio não encontrado.")
+    return delivery
+
+@app.post("/admin/registry/reload", dependencies=[Depends(get_admin_key)])
+def reload_registry():
+    """Força a recarga do registo de campanhas (modo multi-tenant)."""
+    if not BCL_MULTI_TENANT:
+        raise HTTPException(status_code=404, detail="O modo multi-tenant não está ativo.")
+    return {"status": "ok", "campaigns": campaign_registry.reload()}
+
+class InstanceConfig(BaseModel):
+    system_prompt: str
+    api_key: str
+    # Instância da Evolution API da campanha; sem ela mantém-se a do processo
+    whatsapp_instance: Optional[str] = None
+
+@app.post("/admin/config", dependencies=[Depends(get_admin_key)])
+def configure_instance(config: InstanceConfig):
+    """
+    Atribui esta instância a uma campanha sem novo deploy (warm pool da fábrica).
+    A fábrica grava os mesmos valores nas variáveis de ambiente do serviço,
+    para que sobrevivam a um restart.
+    """
+    global SYSTEM_PROMPT, BCL_API_KEY
+    if BCL_MULTI_TENANT:
+        raise HTTPException(status_code=409, detail="No modo multi-tenant as campanhas vêm do registo.")
+    SYSTEM_PROMPT = config.system_prompt.strip()
+    BCL_API_KEY = config.api_key
+    if config.whatsapp_instance:
+        whatsapp.EVOLUTION_INSTANCE_NAME = config.whatsapp_instance
+    logger.info("Configuração da campanha aplicada pela fábrica.")
+    return {"status": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    """Contadores e histogramas da instância no formato de texto do Prometheus."""
+    return PlainTextResponse(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
 
 @app.get("/")
 def read_root():
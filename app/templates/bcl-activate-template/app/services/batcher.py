@@ -0,0 +1,114 @@
+import os
+import re
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from app.services import llm
+
+logger = logging.getLogger(__name__)
+
+# Janela (ms) durante a qual os leads são agrupados; 0 desativa o micro-batching
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "0"))
+# Número máximo de leads num único pedido ao LLM
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "20"))
+
+_INSTRUCOES_LOTE = (
+    "Vai receber vários leads numerados. Crie uma mensagem independente para cada um, "
+    "seguindo todas as regras das instruções de sistema. Responda APENAS com um array JSON de strings, "
+    "com exatamente {n} elementos, na mesma ordem dos leads, sem texto adicional."
+)
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
+
+
+class LeadBatcher:
+    """
+    Junta os leads que chegam dentro de uma janela curta (ou até ao tamanho
+    máximo) num único pedido ao LLM e devolve a cada lead a sua mensagem.
+    Os leads são agrupados por prompt de sistema, para não misturar campanhas.
+    Se a resposta em lote não puder ser separada, cada lead é gerado individualmente.
+    """
+
+    def __init__(self, window_ms: float = LLM_BATCH_WINDOW_MS, max_size: int = LLM_BATCH_MAX_SIZE,
+                 generate: Callable[..., Awaitable[str]] = llm.gerar_texto,
+                 fallback: Callable[[str, str], Awaitable[str]] = llm.gerar_mensagem):
+        self._window = window_ms / 1000
+        self._max_size = max(1, max_size)
+        self._generate = generate
+        self._fallback = fallback
+        self._pending: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        # O event loop só guarda referências fracas às tarefas; estas mantêm os lotes em curso vivos
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._window > 0 and self._max_size > 1
+
+    async def submit(self, system_prompt: str, user_prompt: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(system_prompt, [])
+        batch.append((user_prompt, future))
+        if len(batch) >= self._max_size:
+            self._start_flush(system_prompt)
+        elif len(batch) == 1:
+            self._timers[system_prompt] = asyncio.get_running_loop().call_later(
+                self._window, self._start_flush, system_prompt
+            )
+        return await future
+
+    def _start_flush(self, system_prompt: str):
+        timer = self._timers.pop(system_prompt, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(system_prompt, None)
+        if batch:
+            task = asyncio.ensure_future(self._flush(system_prompt, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, system_prompt: str, batch: list[tuple[str, asyncio.Future]]):
+        """Resolve sempre todos os futures do lote, com a mensagem ou com o erro, para nenhum pedido ficar à espera."""
+        try:
+            results = await self._generate_batch(system_prompt, [prompt for prompt, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Falha ao gerar o lote de {len(batch)} lead(s): {e}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), message in zip(batch, results):
+            if not future.done():
+                future.set_result(message)
+
+    async def _generate_batch(self, system_prompt: str, user_prompts: list[str]) -> list[str]:
+        if len(user_prompts) == 1:
+            return [await self._fallback(user_prompts[0], system_prompt)]
+        try:
+            # O timeout cresce com o tamanho do lote, que gera várias mensagens de uma vez
+            timeout = llm.LLM_TIMEOUT * min(len(user_prompts), 3)
+            raw = await self._generate(_prompt_em_lote(user_prompts), timeout, system_prompt=system_prompt)
+            results = _separar_mensagens(raw, len(user_prompts))
+            logger.info(f"Lote de {len(user_prompts)} leads gerado num único pedido ao LLM.")
+            return results
+        except Exception as e:
+            logger.warning(f"Geração em lote falhou ({e}); a gerar {len(user_prompts)} leads individualmente.")
+            return await asyncio.gather(*(self._fallback(prompt, system_prompt) for prompt in user_prompts))
+
+
+def _prompt_em_lote(user_prompts: list[str]) -> str:
+    leads = "\n\n".join(f"### Lead {i}\n{prompt}" for i, prompt in enumerate(user_prompts, start=1))
+    return f"{_INSTRUCOES_LOTE.format(n=len(user_prompts))}\n\n{leads}"
+
+
+def _separar_mensagens(raw: str, expected: int) -> list[str]:
+    messages = json.loads(_CODE_FENCE_RE.sub("", raw.strip()))
+    if not isinstance(messages, list) or len(messages) != expected or not all(isinstance(m, str) for m in messages):
+        raise ValueError(f"Resposta em lote com formato inesperado (esperados {expected} elementos).")
+    return messages
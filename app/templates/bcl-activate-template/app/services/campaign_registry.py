@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Fonte do registo: um ficheiro JSON local ou a tabela do Supabase
+CAMPAIGN_REGISTRY_FILE = os.getenv("CAMPAIGN_REGISTRY_FILE")
+CAMPAIGN_REGISTRY_TABLE = os.getenv("CAMPAIGN_REGISTRY_TABLE", "campaign_runtime")
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Segundos até o registo ser recarregado da fonte
+CAMPAIGN_REGISTRY_TTL = float(os.getenv("CAMPAIGN_REGISTRY_TTL", "30"))
+# Intervalo mínimo entre recargas forçadas por um webhook/chave desconhecidos
+CAMPAIGN_REGISTRY_MISS_INTERVAL = float(os.getenv("CAMPAIGN_REGISTRY_MISS_INTERVAL", "5"))
+
+
+@dataclass(frozen=True)
+class CampaignConfig:
+    campaign_id: str
+    webhook_id: str
+    api_key: str
+    system_prompt: str
+    # Instância da Evolution API da campanha (por omissão, a EVOLUTION_INSTANCE_NAME do processo)
+    whatsapp_instance: Optional[str] = None
+
+
+class CampaignRegistry:
+    """
+    Cache em memória das campanhas servidas por este processo, indexada por
+    webhook_id e por chave de API. Quando expira é recarregada em segundo
+    plano (os pedidos continuam a ver a versão anterior); quando chega uma
+    chave desconhecida é recarregada de imediato, com limite de frequência,
+    para que campanhas novas fiquem ativas em segundos.
+    """
+
+    def __init__(self, ttl: float = CAMPAIGN_REGISTRY_TTL):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._by_webhook: dict[str, CampaignConfig] = {}
+        self._by_api_key: dict[str, CampaignConfig] = {}
+        self._loaded_at = 0.0
+        self._last_miss_reload = 0.0
+        self._file_mtime: Optional[float] = None
+        self._refreshing = False
+
+    def get_by_webhook(self, webhook_id: str) -> Optional[CampaignConfig]:
+        return self._lookup("_by_webhook", webhook_id)
+
+    def get_by_api_key(self, api_key: str) -> Optional[CampaignConfig]:
+        return self._lookup("_by_api_key", api_key)
+
+    def reload(self) -> int:
+        """Recarrega todas as campanhas da fonte configurada. Devolve quantas foram carregadas."""
+        rows = self._fetch()
+        campaigns = [
+            CampaignConfig(
+                campaign_id=str(row["campaign_id"]),
+                webhook_id=row["webhook_id"],
+                api_key=row["api_key"],
+                system_prompt=row["system_prompt"],
+                whatsapp_instance=row.get("whatsapp_instance"),
+            )
+            for row in rows if row.get("active", True)
+        ]
+        with self._lock:
+            self._by_webhook = {c.webhook_id: c for c in campaigns}
+            self._by_api_key = {c.api_key: c for c in campaigns}
+            self._loaded_at = time.monotonic()
+        logger.info(f"Registo de campanhas recarregado: {len(campaigns)} campanha(s) ativa(s).")
+        return len(campaigns)
+
+    def __len__(self) -> int:
+        return len(self._by_webhook)
+
+    def _lookup(self, index: str, key: str) -> Optional[CampaignConfig]:
+        if not key:
+            return None
+        if self._loaded_at == 0.0:
+            self._safe_reload()
+        elif self._is_stale():
+            self._refresh_in_background()
+        config = getattr(self, index).get(key)
+        if config is None and time.monotonic() - self._last_miss_reload > CAMPAIGN_REGISTRY_MISS_INTERVAL:
+            self._last_miss_reload = time.monotonic()
+            self._safe_reload()
+            config = getattr(self, index).get(key)
+        return config
+
+    def _is_stale(self) -> bool:
+        if time.monotonic() - self._loaded_at > self._ttl:
+            return True
+        if CAMPAIGN_REGISTRY_FILE:
+            try:
+                return os.path.getmtime(CAMPAIGN_REGISTRY_FILE) != self._file_mtime
+            except OSError:
+                return False
+        return False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._safe_reload()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="campaign-registry-refresh", daemon=True).start()
+
+    def _safe_reload(self):
+        try:
+            self.reload()
+        except Exception as e:
+            # Mantém a última versão conhecida se a fonte estiver indisponível
+            logger.error(f"Falha ao recarregar o registo de campanhas: {e}")
+            self._loaded_at = time.monotonic()
+
+    def _fetch(self) -> list[dict]:
+        if CAMPAIGN_REGISTRY_FILE:
+            self._file_mtime = os.path.getmtime(CAMPAIGN_REGISTRY_FILE)
+            with open(CAMPAIGN_REGISTRY_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("Defina CAMPAIGN_REGISTRY_FILE ou SUPABASE_URL e SUPABASE_KEY para o modo multi-tenant.")
+        response = httpx.get(
+            f"{SUPABASE_URL}/rest/v1/{CAMPAIGN_REGISTRY_TABLE}",
+            params={"select": "*"},
+            headers={"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"},
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        return response.json()
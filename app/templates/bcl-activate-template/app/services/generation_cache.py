@@ -0,0 +1,84 @@
+import os
+import re
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable
+
+from cachetools import TTLCache
+
+from app.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Quantas mensagens geradas são guardadas e por quanto tempo (segundos)
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "2048"))
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "86400"))
+
+CACHE_REQUESTS = telemetry.Counter(
+    "bcl_generation_cache_requests_total", "Pedidos à cache de mensagens geradas (hit, coalesced, miss).", ("result",)
+)
+
+_NAO_DIGITOS_RE = re.compile(r"\D+")
+_ESPACOS_RE = re.compile(r"\s+")
+
+
+def chave_do_lead(lead: dict, system_prompt: str) -> str:
+    """
+    Chave estável para um lead normalizado: reenvios do mesmo lead (ex.: retries
+    da Meta) com diferenças de maiúsculas, espaços ou formatação do telefone
+    produzem a mesma chave. Inclui o prompt, para separar campanhas.
+    """
+    partes = [hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()]
+    for campo in sorted(lead):
+        valor = lead[campo]
+        if valor is None:
+            continue
+        texto = _ESPACOS_RE.sub(" ", str(valor)).strip().casefold()
+        if campo == "phone":
+            texto = _NAO_DIGITOS_RE.sub("", texto)
+        partes.append(f"{campo}={texto}")
+    return hashlib.sha256("\x1f".join(partes).encode('utf-8')).hexdigest()
+
+
+class GenerationCache:
+    """
+    Cache LRU/TTL das mensagens geradas. Pedidos simultâneos com a mesma chave
+    partilham uma única chamada ao LLM em vez de gerarem duas vezes.
+    """
+
+    def __init__(self, maxsize: int = GENERATION_CACHE_SIZE, ttl: float = GENERATION_CACHE_TTL):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]],
+                              cacheable: Callable[[str], bool] = lambda _: True) -> str:
+        if key in self._cache:
+            self.hits += 1
+            CACHE_REQUESTS.inc(result="hit")
+            logger.debug("Mensagem servida da cache (lead repetido).")
+            return self._cache[key]
+        if key in self._in_flight:
+            self.hits += 1
+            CACHE_REQUESTS.inc(result="coalesced")
+            return await asyncio.shield(self._in_flight[key])
+
+        self.misses += 1
+        CACHE_REQUESTS.inc(result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            message = await generate()
+            if cacheable(message):
+                self._cache[key] = message
+            future.set_result(message)
+            return message
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita o aviso de exceção não recuperada quando ninguém mais esperava
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Optional
+
+from app.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+LEAD_LOG_DB = os.getenv("LEAD_LOG_DB", os.path.join("/tmp", "bcl_leads.sqlite3"))
+# Leads processados em simultâneo pelo consumidor
+LEAD_CONSUMER_CONCURRENCY = int(os.getenv("LEAD_CONSUMER_CONCURRENCY", "8"))
+# Tentativas antes de um lead ficar como 'failed'
+LEAD_MAX_ATTEMPTS = int(os.getenv("LEAD_MAX_ATTEMPTS", "3"))
+LEAD_RETRY_DELAY = float(os.getenv("LEAD_RETRY_DELAY", "30"))
+
+# Campos que as fontes de leads usam como identificador do evento
+EVENT_ID_FIELDS = ("leadgen_id", "event_id", "lead_id", "uuid", "id")
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+LEADS_PROCESSED = telemetry.Counter(
+    "bcl_leads_processed_total", "Leads processados pelo consumidor, por resultado (done, retry, failed).", ("result",)
+)
+LEAD_DURATION = telemetry.Histogram("bcl_lead_processing_seconds", "Duração do processamento de cada lead.")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_key TEXT NOT NULL UNIQUE,
+    webhook_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    received_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leads_pending ON leads (status, next_attempt_at);
+"""
+
+
+def event_key(webhook_id: str, payload: dict) -> str:
+    """
+    Chave de deduplicação: o ID do evento enviado pela fonte, se existir;
+    caso contrário, o hash do payload canónico.
+    """
+    for field in EVENT_ID_FIELDS:
+        value = payload.get(field)
+        if isinstance(value, (str, int)) and str(value):
+            return f"{webhook_id}:{field}:{value}"
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"{webhook_id}:sha256:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class LeadLog:
+    """
+    Registo local (SQLite, só acrescenta) dos leads recebidos. Cada webhook é
+    gravado antes de qualquer processamento e entregas repetidas são ignoradas
+    pelo índice único da chave do evento. Um consumidor em segundo plano
+    processa os pendentes; leads interrompidos por uma falha voltam à fila no arranque.
+    """
+
+    def __init__(self, db_path: str = LEAD_LOG_DB):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._consumer: Optional[asyncio.Task] = None
+
+    def open(self):
+        db_dir = os.path.dirname(self._db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        with self._lock:
+            resumed = self._conn.execute(
+                "UPDATE leads SET status = ? WHERE status = ?", (STATUS_PENDING, STATUS_PROCESSING)
+            ).rowcount
+        if resumed:
+            logger.info(f"{resumed} lead(s) interrompidos voltaram para a fila.")
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def append(self, webhook_id: str, payload: dict) -> tuple[int, bool]:
+        """Grava o lead. Devolve (seq, novo); `novo` é False para entregas repetidas."""
+        key = event_key(webhook_id, payload)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO leads (event_key, webhook_id, payload, status, received_at, next_attempt_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, webhook_id, json.dumps(payload, ensure_ascii=False, default=str), STATUS_PENDING, now, now, now)
+            )
+            if cursor.rowcount:
+                seq, is_new = cursor.lastrowid, True
+            else:
+                seq, is_new = self._conn.execute("SELECT seq FROM leads WHERE event_key = ?", (key,)).fetchone()[0], False
+        if is_new and self._wakeup:
+            self._wakeup.set()
+        return seq, is_new
+
+    def get(self, seq: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM leads WHERE seq = ?", (seq,)).fetchone()
+        return dict(row) if row else None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM leads WHERE status IN (?, ?)", (STATUS_PENDING, STATUS_PROCESSING)
+            ).fetchone()[0]
+
+    # --- CONSUMIDOR ---
+    def start_consumer(self, process: Callable[[int, str, dict], Awaitable[str]],
+                       concurrency: int = LEAD_CONSUMER_CONCURRENCY):
+        """Arranca a tarefa que drena o registo. `process(seq, webhook_id, payload)` devolve o resultado."""
+        self._wakeup = asyncio.Event()
+        self._consumer = asyncio.create_task(self._consume(process, concurrency))
+
+    async def stop_consumer(self):
+        if self._consumer:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+
+    async def _consume(self, process: Callable[[int, str, dict], Awaitable[str]], concurrency: int):
+        in_flight: set[asyncio.Task] = set()
+        while True:
+            self._wakeup.clear()
+            free = concurrency - len(in_flight)
+            rows = self._claim(free) if free > 0 else []
+            for row in rows:
+                task = asyncio.create_task(self._process_one(row, process))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                task.add_done_callback(lambda _: self._wakeup.set())
+            if not rows:
+                # Acorda com um lead novo, com um lead concluído, ou periodicamente para as novas tentativas
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=LEAD_RETRY_DELAY / 2)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _claim(self, limit: int) -> list[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM leads WHERE status = ? AND next_attempt_at <= ? ORDER BY seq LIMIT ?",
+                (STATUS_PENDING, now, limit)
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE leads SET status = ?, attempts = attempts + 1, updated_at = ? WHERE seq = ?",
+                    [(STATUS_PROCESSING, now, row["seq"]) for row in rows]
+                )
+        return rows
+
+    async def _process_one(self, row: sqlite3.Row, process: Callable[[int, str, dict], Awaitable[str]]):
+        start = time.perf_counter()
+        try:
+            with telemetry.span("lead", seq=row["seq"], webhook_id=row["webhook_id"]):
+                result = await process(row["seq"], row["webhook_id"], json.loads(row["payload"]))
+        except Exception as e:
+            attempts = row["attempts"] + 1
+            status = STATUS_FAILED if attempts >= LEAD_MAX_ATTEMPTS else STATUS_PENDING
+            logger.error(f"Falha ao processar o lead {row['seq']} (tentativa {attempts}): {e}")
+            self._update(row["seq"], status, error=str(e)[:500],
+                         next_attempt_at=time.time() + LEAD_RETRY_DELAY * attempts)
+            LEADS_PROCESSED.inc(result="failed" if status == STATUS_FAILED else "retry")
+        else:
+            self._update(row["seq"], STATUS_DONE, result=result)
+            LEADS_PROCESSED.inc(result="done")
+        finally:
+            LEAD_DURATION.observe(time.perf_counter() - start)
+
+    def _update(self, seq: int, status: str, result: Optional[str] = None, error: Optional[str] = None,
+                next_attempt_at: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE leads SET status = ?, result = COALESCE(?, result), error = ?, "
+                "next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ? WHERE seq = ?",
+                (status, result, error, next_attempt_at, now, seq)
+            )
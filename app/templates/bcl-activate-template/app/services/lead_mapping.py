@@ -0,0 +1,208 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Esquemas por webhook: {"<webhook_id>": {"source": "meta", "aliases": {...}, "paths": {...}}}
+WEBHOOK_SCHEMAS_FILE = os.getenv("WEBHOOK_SCHEMAS_FILE")
+# Layouts de payload memorizados por webhook
+LEAD_MAPPING_LAYOUTS_MAX = int(os.getenv("LEAD_MAPPING_LAYOUTS_MAX", "32"))
+# Extratores mantidos em memória; o webhook_id vem do cliente, pelo que os menos usados são descartados
+LEAD_MAPPING_WEBHOOKS_MAX = int(os.getenv("LEAD_MAPPING_WEBHOOKS_MAX", "256"))
+# Chaves aprendidas por webhook (limita a memória com payloads de chaves arbitrárias)
+_LEARNED_KEYS_MAX = 4096
+
+# Nomes alternativos dos campos do Lead usados pelas várias fontes
+FIELD_MAP = {
+    "full_name": "name", "first_name": "name", "user_name": "name", "nome": "name",
+    "email_address": "email", "e-mail": "email",
+    "phone_number": "phone", "telefone": "phone", "mobile_phone": "phone", "personal_phone": "phone",
+    "company_name": "company", "empresa": "company",
+    "job_title": "position", "cargo": "position",
+}
+
+
+# --- FONTES ---
+# Marca um campo presente no layout mas sem valor (ex.: pergunta da Meta sem resposta)
+_AUSENTE = object()
+
+
+def _nome(campo: dict) -> Optional[str]:
+    """Nome de um campo da Meta; nomes que não sejam texto (ex.: números) são convertidos."""
+    name = campo["name"]
+    return name if isinstance(name, str) or name is None else str(name)
+
+
+def _ler_chave(registo: dict, key: str, position: int) -> Any:
+    return registo[key]
+
+
+def _ler_resposta_meta(campos: list, key: str, position: int) -> Any:
+    valores = campos[position].get("values")
+    return valores[0] if isinstance(valores, list) and valores else _AUSENTE
+
+
+@dataclass(frozen=True)
+class Source:
+    """Onde estão os campos do lead num payload e como ler cada um."""
+    detect: Callable[[dict], bool]
+    locate: Callable[[dict], Any]
+    layout: Callable[[Any], tuple]
+    read: Callable[[Any, str, int], Any]
+
+
+SOURCES: dict[str, Source] = {
+    # Lead Ads da Meta: `field_data: [{"name": ..., "values": [...]}]`
+    "meta": Source(detect=lambda p: isinstance(p.get("field_data"), list),
+                   locate=lambda p: p["field_data"],
+                   layout=lambda campos: tuple(map(_nome, campos)),
+                   read=_ler_resposta_meta),
+    # RD Station: `{"leads": [{...}]}`; o primeiro lead é o da conversão
+    "rdstation": Source(detect=lambda p: isinstance(p.get("leads"), list) and bool(p["leads"]),
+                        locate=lambda p: p["leads"][0],
+                        layout=lambda lead: tuple(lead.keys()),
+                        read=_ler_chave),
+    "generic": Source(detect=lambda p: True, locate=lambda p: p, layout=tuple, read=_ler_chave),
+}
+
+
+def detect_source(payload: dict) -> str:
+    for name, source in SOURCES.items():
+        if source.detect(payload):
+            return name
+    return "generic"
+
+
+# --- CAMINHOS ANINHADOS ---
+def compile_path(path: str) -> Callable[[Any], Any]:
+    """
+    Compila um caminho como `leads.0.last_conversion.content.identificador`
+    numa função de acesso. Devolve None se algum passo não existir.
+    """
+    steps = [int(part) if part.isdigit() else part for part in path.split(".")]
+
+    def get(value: Any) -> Any:
+        for step in steps:
+            try:
+                value = value[step]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+
+    return get
+
+
+class LeadExtractor:
+    """
+    Extrator compilado para um webhook: sabe de que fonte vêm os payloads,
+    que nomes de campo correspondem a que campos do Lead e que caminhos
+    aninhados ler. O mapeamento chave -> campo é aprendido uma vez por
+    layout de payload (o tuplo das chaves, que as fontes repetem entre
+    entregas), pelo que pedidos seguintes só leem as chaves relevantes.
+    """
+
+    def __init__(self, fields: Iterable[str], source: Optional[str] = None,
+                 aliases: Optional[dict] = None, paths: Optional[dict] = None):
+        self._fields = frozenset(fields)
+        self.source = source
+        self._aliases = {**FIELD_MAP, **(aliases or {})}
+        self._paths = [(target, compile_path(path)) for target, path in (paths or {}).items()]
+        self._learned: dict[str, Optional[str]] = {}
+        self._layouts: OrderedDict[tuple, tuple[tuple[str, int, str], ...]] = OrderedDict()
+
+    def __call__(self, payload: dict) -> dict:
+        try:
+            # Sem fonte configurada, a deteção custa apenas duas consultas ao payload
+            source = SOURCES[self.source or detect_source(payload)]
+            registo = source.locate(payload)
+            layout = source.layout(registo)
+        except (KeyError, IndexError, TypeError, AttributeError):
+            # O payload não tem a forma esperada da fonte; lê-o como formulário plano
+            source = SOURCES["generic"]
+            registo = payload
+            layout = tuple(payload)
+
+        normalized = {}
+        for key, position, target in self._plan(layout):
+            value = source.read(registo, key, position)
+            if value is not _AUSENTE:
+                normalized[target] = value
+        for target, get in self._paths:
+            value = get(payload)
+            if value is not None:
+                normalized[target] = value
+        return normalized
+
+    def _plan(self, layout: tuple) -> tuple[tuple[str, int, str], ...]:
+        plan = self._layouts.get(layout)
+        if plan is not None:
+            return plan
+        chaves: dict[str, tuple[str, int]] = {}
+        for position, key in enumerate(layout):
+            target = self._target(key)
+            # Se várias chaves correspondem ao mesmo campo, a última ganha, como no mapeamento original
+            if target:
+                chaves[target] = (key, position)
+        plan = tuple((key, position, target) for target, (key, position) in chaves.items())
+        self._layouts[layout] = plan
+        if len(self._layouts) > LEAD_MAPPING_LAYOUTS_MAX:
+            self._layouts.popitem(last=False)
+        return plan
+
+    def _target(self, key: str) -> Optional[str]:
+        if not isinstance(key, str):
+            return None
+        if key in self._learned:
+            return self._learned[key]
+        clean_key = key.lower().replace(" ", "_")
+        target = self._aliases.get(clean_key, clean_key)
+        target = target if target in self._fields else None
+        if len(self._learned) < _LEARNED_KEYS_MAX:
+            self._learned[key] = target
+        return target
+
+
+class LeadNormalizer:
+    """
+    Registo de esquemas por webhook_id. Cada webhook ganha o seu extrator
+    compilado no primeiro pedido (a partir de WEBHOOK_SCHEMAS_FILE, se o
+    webhook lá estiver, ou com deteção automática da fonte) e reutiliza-o depois.
+    Só os LEAD_MAPPING_WEBHOOKS_MAX usados mais recentemente ficam em memória.
+    """
+
+    def __init__(self, fields: Iterable[str], schemas: Optional[dict] = None,
+                 max_webhooks: int = LEAD_MAPPING_WEBHOOKS_MAX):
+        self._fields = tuple(fields)
+        self._schemas = self._load(WEBHOOK_SCHEMAS_FILE) if schemas is None else schemas
+        self._max_webhooks = max_webhooks
+        self._lock = threading.Lock()
+        self._extractors: OrderedDict[str, LeadExtractor] = OrderedDict()
+
+    def normalize(self, webhook_id: str, payload: dict) -> dict:
+        with self._lock:
+            extractor = self._extractors.get(webhook_id)
+            if extractor is None:
+                extractor = LeadExtractor(self._fields, **self._schemas.get(webhook_id, {}))
+                self._extractors[webhook_id] = extractor
+                if len(self._extractors) > self._max_webhooks:
+                    self._extractors.popitem(last=False)
+            else:
+                self._extractors.move_to_end(webhook_id)
+        return extractor(payload)
+
+    @staticmethod
+    def _load(schemas_file: Optional[str]) -> dict:
+        if not schemas_file:
+            return {}
+        with open(schemas_file, 'r', encoding='utf-8') as f:
+            schemas = json.load(f)
+        for webhook_id, schema in schemas.items():
+            if schema.get("source", "generic") not in SOURCES:
+                raise ValueError(f"Fonte desconhecida '{schema['source']}' no esquema do webhook {webhook_id}.")
+        logger.info(f"{len(schemas)} esquema(s) de webhook carregados de {schemas_file}.")
+        return schemas
@@ -0,0 +1,199 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+import importlib.util
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from app.services import llm_router, telemetry
+
+# Os SDKs dos provedores só são importados na primeira utilização (ou pelo `preload` depois do arranque)
+if TYPE_CHECKING:
+    import google.generativeai as genai
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+# Tempo máximo (segundos) de uma chamada ao LLM, hedge e failover incluídos, antes de usar a mensagem de recurso
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+# Provedores por ordem de preferência (usada até haver medições de latência); só entram os que têm chave
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "gemini,openai").split(",") if name.strip()]
+# Chamadas simultâneas permitidas por provedor
+LLM_CONCURRENCY = {
+    "gemini": int(os.getenv("LLM_MAX_CONCURRENCY_GEMINI", "8")),
+    "openai": int(os.getenv("LLM_MAX_CONCURRENCY_OPENAI", "8")),
+}
+
+MENSAGEM_PADRAO = "Olá! Vi que se interessou pelo nosso produto. Gostaria de conversar?"
+MENSAGEM_RECURSO = "Olá! Percebi o seu interesse em nossa proposta e gostaria de entender melhor como posso ajudar."
+
+# Módulo do SDK de cada provedor
+_SDK_MODULES = {"gemini": "google.generativeai", "openai": "openai"}
+
+_sdk_lock = threading.Lock()
+_genai = None
+_openai_client: Optional["AsyncOpenAI"] = None
+_semaphores: dict[str, asyncio.Semaphore] = {}
+# Modelos Gemini por prompt de sistema (um por campanha no modo multi-tenant)
+_GEMINI_MODELS_MAX = int(os.getenv("GEMINI_MODELS_CACHE_SIZE", "64"))
+_gemini_models: OrderedDict[str, "genai.GenerativeModel"] = OrderedDict()
+
+
+def provider() -> Optional[str]:
+    """Provedor que o router escolheria agora (o primeiro configurado se todos tiverem o circuito aberto)."""
+    candidates = router.candidates()
+    if candidates:
+        return candidates[0]
+    return router.providers[0] if router.providers else None
+
+
+async def gerar_mensagem(prompt: str, system_prompt: Optional[str] = None) -> str:
+    """
+    Gera a mensagem sem bloquear o event loop, respeitando o limite de
+    concorrência de cada provedor e o LLM_TIMEOUT. O prompt de sistema vai como
+    instrução de sistema separada, para beneficiar da cache de prefixo do provedor.
+    """
+    if provider() is None:
+        return MENSAGEM_PADRAO
+    try:
+        return await gerar_texto(prompt, system_prompt=system_prompt)
+    except asyncio.TimeoutError:
+        logger.error(f"Timeout de {LLM_TIMEOUT}s ao gerar mensagem ({', '.join(router.providers)}).")
+    except Exception as e:
+        logger.error(f"Erro ao gerar mensagem com IA ({', '.join(router.providers)}): {e}")
+    return MENSAGEM_RECURSO
+
+
+async def gerar_texto(prompt: str, timeout: float = LLM_TIMEOUT, system_prompt: Optional[str] = None) -> str:
+    """Chamada crua através do router (hedge e failover); propaga erros e timeouts para quem chama."""
+    if not router.providers:
+        raise RuntimeError("Nenhum provedor de LLM configurado.")
+    return await router.call(prompt, system_prompt, timeout)
+
+
+def is_fallback(message: str) -> bool:
+    """Mensagens de recurso não devem ser guardadas em cache."""
+    return message in (MENSAGEM_PADRAO, MENSAGEM_RECURSO)
+
+
+async def _call_provider(name: str, prompt: str, system_prompt: Optional[str]) -> str:
+    async with _semaphore(name):
+        with telemetry.span("llm", provider=name):
+            return await _CALLS[name](prompt, system_prompt)
+
+
+def _semaphore(name: str) -> asyncio.Semaphore:
+    if name not in _semaphores:
+        _semaphores[name] = asyncio.Semaphore(LLM_CONCURRENCY[name])
+    return _semaphores[name]
+
+
+def preload():
+    """
+    Importa os SDKs dos provedores configurados. Corre numa thread depois do
+    arranque, para que a instância responda logo e o primeiro lead não pague o import.
+    """
+    for name in router.providers:
+        start = time.perf_counter()
+        try:
+            if name == "gemini":
+                _get_genai()
+            else:
+                importlib.import_module(_SDK_MODULES[name])
+        except Exception as e:
+            logger.error(f"Falha ao carregar o SDK do provedor {name}: {e}")
+            continue
+        logger.info(f"SDK do provedor {name} carregado em {time.perf_counter() - start:.2f}s.")
+
+
+def _get_genai():
+    """Importa e configura o SDK do Gemini na primeira utilização."""
+    global _genai
+    if _genai is None:
+        with _sdk_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GOOGLE_API_KEY)
+                _genai = genai
+    return _genai
+
+
+def _get_openai_client() -> "AsyncOpenAI":
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        _openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT, max_retries=1)
+    return _openai_client
+
+
+def _get_gemini_model(system_prompt: Optional[str]) -> "genai.GenerativeModel":
+    """Constrói cada modelo uma vez por prompt de sistema e reutiliza-o entre pedidos."""
+    key = system_prompt or ""
+    model = _gemini_models.get(key)
+    if model is None:
+        model = _get_genai().GenerativeModel(GEMINI_MODEL, system_instruction=system_prompt or None)
+        _gemini_models[key] = model
+        if len(_gemini_models) > _GEMINI_MODELS_MAX:
+            _gemini_models.popitem(last=False)
+    else:
+        _gemini_models.move_to_end(key)
+    return model
+
+
+async def _call_gemini(prompt: str, system_prompt: Optional[str]) -> str:
+    response = await _get_gemini_model(system_prompt).generate_content_async(prompt)
+    return response.text
+
+
+async def _call_openai(prompt: str, system_prompt: Optional[str]) -> str:
+    # O prompt de sistema fixo no início da conversa é o prefixo que o OpenAI reutiliza em cache
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    messages.append({"role": "user", "content": prompt})
+    response = await _get_openai_client().chat.completions.create(model=OPENAI_MODEL, messages=messages)
+    return response.choices[0].message.content
+
+
+_CALLS = {"gemini": _call_gemini, "openai": _call_openai}
+_KEYS = {"gemini": GOOGLE_API_KEY, "openai": OPENAI_API_KEY}
+_MODELS = {"gemini": GEMINI_MODEL, "openai": OPENAI_MODEL}
+
+
+
+def _sdk_installed(name: str) -> bool:
+    """Verifica se o SDK existe sem o importar (a imagem só instala os dos provedores escolhidos)."""
+    try:
+        return importlib.util.find_spec(_SDK_MODULES[name]) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def _configured_providers() -> list[tuple[str, str]]:
+    providers = []
+    for name in LLM_PROVIDERS:
+        if not _KEYS.get(name):
+            continue
+        if not _sdk_installed(name):
+            logger.warning(f"O provedor {name} tem chave, mas o SDK {_SDK_MODULES[name]} não está instalado; ignorado.")
+            continue
+        providers.append((name, _MODELS[name]))
+    return providers
+
+
+router = llm_router.LLMRouter(
+    _configured_providers(), call=_call_provider, is_saturated=lambda name: _semaphore(name).locked()
+)
+
+telemetry.Gauge("bcl_llm_circuit_state", "Estado do circuit breaker por provedor (0 fechado, 1 meio-aberto, 2 aberto).",
+                ("provider", "model"), function=router.circuit_states)
+telemetry.Gauge("bcl_llm_latency_p95_seconds", "p95 da latência das chamadas recentes por provedor.",
+                ("provider", "model"), function=router.latency_p95)
+telemetry.Gauge("bcl_llm_error_rate", "Taxa de erro das chamadas recentes por provedor.",
+                ("provider", "model"), function=router.error_rates)
@@ -0,0 +1,265 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from app.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Número de chamadas recentes de cada provedor usadas para a latência e a taxa de erro
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+# Pedido de cobertura (hedge): enviado a outro provedor se o primeiro não responder dentro do seu p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+# Amostras necessárias para usar o p95 medido; até lá o hedge sai ao fim de LLM_HEDGE_DEFAULT_DELAY
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.2"))
+# Circuit breaker: abre com esta taxa de erro na janela (a partir de LLM_CIRCUIT_MIN_SAMPLES chamadas)
+# ou com LLM_CIRCUIT_CONSECUTIVE_FAILURES falhas seguidas, e fica aberto LLM_CIRCUIT_COOLDOWN segundos
+LLM_CIRCUIT_ERROR_RATE = float(os.getenv("LLM_CIRCUIT_ERROR_RATE", "0.5"))
+LLM_CIRCUIT_MIN_SAMPLES = int(os.getenv("LLM_CIRCUIT_MIN_SAMPLES", "10"))
+LLM_CIRCUIT_CONSECUTIVE_FAILURES = int(os.getenv("LLM_CIRCUIT_CONSECUTIVE_FAILURES", "5"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+LLM_LATENCY = telemetry.Histogram(
+    "bcl_llm_request_duration_seconds",
+    "Duração das chamadas ao LLM por provedor e resultado (ok, error, timeout, cancelled).",
+    ("provider", "outcome")
+)
+LLM_HEDGES = telemetry.Counter(
+    "bcl_llm_hedges_total", "Pedidos de cobertura enviados e ganhos, por provedor de destino.", ("provider", "result")
+)
+LLM_FAILOVERS = telemetry.Counter(
+    "bcl_llm_failovers_total", "Chamadas reencaminhadas para outro provedor depois de uma falha, por provedor que falhou.",
+    ("provider",)
+)
+
+
+class NoProviderAvailable(RuntimeError):
+    """Todos os provedores configurados estão com o circuito aberto."""
+
+
+class ProviderStats:
+    """
+    Latência e erros das últimas chamadas a um provedor/modelo, com o
+    circuit breaker correspondente. Só é usado a partir do event loop.
+    """
+
+    def __init__(self, name: str, model: str, window: int = LLM_ROUTER_WINDOW):
+        self.name = name
+        self.model = model
+        # Latências das respostas bem-sucedidas (e das canceladas, pelo tempo que já levavam)
+        self._latencies: deque[float] = deque(maxlen=window)
+        # True por cada chamada que falhou, False por cada sucesso
+        self._errors: deque[bool] = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = CIRCUIT_CLOSED
+
+    # --- ESTATÍSTICAS ---
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    @property
+    def calls(self) -> int:
+        return len(self._errors)
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self._errors) / len(self._errors) if self._errors else 0.0
+
+    # --- CIRCUIT BREAKER ---
+    def available(self) -> bool:
+        """Circuito fechado, ou meio-aberto sem sonda em curso depois do tempo de espera."""
+        if self.state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= LLM_CIRCUIT_COOLDOWN:
+            self.state = CIRCUIT_HALF_OPEN
+            self._probing = False
+        if self.state == CIRCUIT_HALF_OPEN:
+            return not self._probing
+        return self.state == CIRCUIT_CLOSED
+
+    def begin(self):
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = True
+
+    def record_success(self, latency: float):
+        self._latencies.append(latency)
+        self._errors.append(False)
+        self._consecutive_failures = 0
+        if self.state == CIRCUIT_HALF_OPEN:
+            logger.info(f"Provedor {self.name} recuperou; circuito fechado.")
+            self.state = CIRCUIT_CLOSED
+            self._errors.clear()
+        self._probing = False
+
+    def record_failure(self):
+        self._errors.append(True)
+        self._consecutive_failures += 1
+        self._probing = False
+        if self.state == CIRCUIT_HALF_OPEN or self._consecutive_failures >= LLM_CIRCUIT_CONSECUTIVE_FAILURES or (
+                len(self._errors) >= LLM_CIRCUIT_MIN_SAMPLES and self.error_rate >= LLM_CIRCUIT_ERROR_RATE):
+            if self.state != CIRCUIT_OPEN:
+                logger.warning(f"Circuito do provedor {self.name} aberto por {LLM_CIRCUIT_COOLDOWN:.0f}s "
+                               f"(taxa de erro {self.error_rate:.0%}, {self._consecutive_failures} falhas seguidas).")
+            self.state = CIRCUIT_OPEN
+            self._opened_at = time.monotonic()
+
+    def record_cancelled(self, elapsed: float):
+        """Chamada que perdeu para outra: não conta como erro, mas o tempo já gasto entra na latência."""
+        self._latencies.append(elapsed)
+        self._probing = False
+
+
+def _speed(stats: ProviderStats) -> float:
+    """Mediana recente; um provedor nunca chamado vai à frente e um que só falhou vai para o fim."""
+    if stats.samples:
+        return stats.percentile(50)
+    return float("inf") if stats.calls else 0.0
+
+
+class LLMRouter:
+    """
+    Escolhe, para cada pedido, o provedor saudável mais rápido (mediana das
+    chamadas recentes) e, se a resposta demorar mais do que o p95 desse
+    provedor, envia um pedido de cobertura ao seguinte; fica a primeira
+    resposta e a outra é cancelada. Uma falha passa logo ao provedor seguinte,
+    e os provedores com o circuito aberto ficam de fora até ao fim da espera.
+    """
+
+    def __init__(self, providers: list[tuple[str, str]],
+                 call: Callable[[str, str, Optional[str]], Awaitable[str]],
+                 is_saturated: Callable[[str], bool] = lambda name: False):
+        # Por ordem de preferência, usada enquanto não há medições
+        self._stats = {name: ProviderStats(name, model) for name, model in providers}
+        self._call = call
+        self._is_saturated = is_saturated
+
+    @property
+    def providers(self) -> list[str]:
+        return list(self._stats)
+
+    def candidates(self) -> list[str]:
+        """Provedores disponíveis, do mais rápido para o mais lento; os que ainda não têm medições vão primeiro."""
+        order = {name: i for i, name in enumerate(self._stats)}
+        available = [stats for stats in self._stats.values() if stats.available()]
+        available.sort(key=lambda stats: (self._is_saturated(stats.name), _speed(stats), order[stats.name]))
+        return [stats.name for stats in available]
+
+    def hedge_delay(self, name: str) -> float:
+        stats = self._stats[name]
+        if stats.samples < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, stats.percentile(95))
+
+    async def call(self, prompt: str, system_prompt: Optional[str], timeout: float) -> str:
+        """Devolve a primeira resposta bem-sucedida; propaga o último erro (ou o timeout) se nenhuma chegar."""
+        candidates = self.candidates()
+        if not candidates:
+            raise NoProviderAvailable("Todos os provedores de LLM estão com o circuito aberto.")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        attempts: dict[asyncio.Task, tuple[str, float]] = {}
+        hedge: Optional[asyncio.Task] = None
+        last_error: Optional[BaseException] = None
+
+        def launch(name: str) -> asyncio.Task:
+            self._stats[name].begin()
+            task = asyncio.ensure_future(self._call(name, prompt, system_prompt))
+            attempts[task] = (name, time.perf_counter())
+            return task
+
+        def hedge_deadline(name: str) -> float:
+            return loop.time() + self.hedge_delay(name) if LLM_HEDGE_ENABLED else float("inf")
+
+        primary = candidates.pop(0)
+        launch(primary)
+        hedge_at = hedge_deadline(primary)
+        try:
+            while attempts:
+                now = loop.time()
+                if now >= deadline:
+                    raise asyncio.TimeoutError()
+                wake = min(deadline, hedge_at) if hedge is None else deadline
+                done, _ = await asyncio.wait(attempts, timeout=max(0.0, wake - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if hedge is None and loop.time() >= hedge_at:
+                        target = self._hedge_target(candidates, primary)
+                        if target:
+                            hedge = launch(target)
+                            LLM_HEDGES.inc(provider=target, result="sent")
+                        hedge_at = float("inf")
+                    continue
+                for task in done:
+                    name, start = attempts.pop(task)
+                    elapsed = time.perf_counter() - start
+                    if task.exception() is None:
+                        self._stats[name].record_success(elapsed)
+                        LLM_LATENCY.observe(elapsed, provider=name, outcome="ok")
+                        if task is hedge:
+                            LLM_HEDGES.inc(provider=name, result="won")
+                        return task.result()
+                    last_error = task.exception()
+                    self._stats[name].record_failure()
+                    LLM_LATENCY.observe(elapsed, provider=name, outcome="error")
+                    logger.warning(f"Provedor {name} falhou: {last_error}")
+                    # Sem outra chamada em curso, passa já ao provedor seguinte
+                    if not attempts:
+                        following = next((c for c in candidates if self._stats[c].available()), None)
+                        if following:
+                            candidates.remove(following)
+                            LLM_FAILOVERS.inc(provider=name)
+                            launch(following)
+                            primary = following
+                            if hedge is None:
+                                hedge_at = hedge_deadline(following)
+            raise last_error
+        except asyncio.TimeoutError:
+            for task, (name, start) in attempts.items():
+                task.cancel()
+                self._stats[name].record_failure()
+                LLM_LATENCY.observe(time.perf_counter() - start, provider=name, outcome="timeout")
+            attempts.clear()
+            raise
+        finally:
+            for task, (name, start) in attempts.items():
+                if not task.done():
+                    task.cancel()
+                    self._stats[name].record_cancelled(time.perf_counter() - start)
+                    LLM_LATENCY.observe(time.perf_counter() - start, provider=name, outcome="cancelled")
+
+    def _hedge_target(self, candidates: list[str], primary: str) -> Optional[str]:
+        """O provedor seguinte com vagas; com um único provedor, o hedge vai para o mesmo."""
+        for name in list(candidates):
+            if self._stats[name].available() and not self._is_saturated(name):
+                candidates.remove(name)
+                return name
+        if len(self._stats) == 1 and not self._is_saturated(primary):
+            return primary
+        return None
+
+    # --- OBSERVABILIDADE ---
+    def circuit_states(self) -> dict:
+        codes = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+        return {(s.name, s.model): codes[s.state] for s in self._stats.values()}
+
+    def latency_p95(self) -> dict:
+        return {(s.name, s.model): s.percentile(95) for s in self._stats.values() if s.samples}
+
+    def error_rates(self) -> dict:
+        return {(s.name, s.model): round(s.error_rate, 4) for s in self._stats.values()}
@@ -0,0 +1,192 @@
+# Métricas no formato do Prometheus (prometheus_client), spans e registo amostrado de payloads.
+# A fábrica (fabrica-bcl) tem o seu próprio app/services/telemetry.py com a mesma interface.
+
+import os
+import time
+import random
+import asyncio
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import prometheus_client
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Fração dos pedidos cujo payload completo é registado em INFO (com DEBUG ativo, são todos)
+PAYLOAD_LOG_SAMPLE_RATE = float(os.getenv("PAYLOAD_LOG_SAMPLE_RATE", "0"))
+
+# Limites (segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST
+
+# Sem as séries *_created: o /metrics fica com os mesmos nomes de sempre e os totais somam só contagens
+prometheus_client.disable_created_metrics()
+
+
+# --- MÉTRICAS ---
+class _Metric:
+    """
+    Métrica do prometheus_client com as labels passadas por nome em cada chamada
+    (`COUNTER.inc(stage="build")`); uma label em falta fica com o valor "".
+    """
+
+    def __init__(self, metric):
+        self._metric = metric
+        self.labelnames = tuple(metric._labelnames)
+
+    def _child(self, labels: dict):
+        if not self.labelnames:
+            return self._metric
+        return self._metric.labels(*(str(labels.get(label, "")) for label in self.labelnames))
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        """Devolve (nome da amostra, pares (label, valor), valor)."""
+        return [(sample.name, tuple(sample.labels.items()), sample.value)
+                for family in self._metric.collect() for sample in family.samples]
+
+
+class Counter(_Metric):
+    """Contador monotónico, um valor por combinação de labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(prometheus_client.Counter(name, documentation, tuple(labelnames)))
+
+    def inc(self, amount: float = 1.0, **labels):
+        self._child(labels).inc(amount)
+
+
+class Histogram(_Metric):
+    """Histograma cumulativo (_bucket, _sum, _count)."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(prometheus_client.Histogram(name, documentation, tuple(labelnames),
+                                                     buckets=tuple(buckets)))
+
+    def observe(self, value: float, **labels):
+        self._child(labels).observe(value)
+
+
+class Gauge:
+    """
+    Valor instantâneo. Com `function`, é lido no momento da recolha: a função
+    devolve um número ou um dict {valor da label (ou tuplo de valores): número}.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable[[], object]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._function = function
+        if function is None:
+            self._gauge = _Metric(prometheus_client.Gauge(name, documentation, self.labelnames))
+        else:
+            prometheus_client.REGISTRY.register(self)
+
+    def set(self, value: float, **labels):
+        self._gauge._child(labels).set(value)
+
+    def describe(self):
+        # Sem isto, o registo chamaria a função logo na importação para descobrir os nomes
+        return [GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)]
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        try:
+            value = self._function()
+        except Exception as e:
+            logger.warning(f"Falha ao ler a métrica {self.name}: {e}")
+            return [family]
+        if isinstance(value, dict):
+            for key, v in value.items():
+                family.add_metric([str(k) for k in key] if isinstance(key, tuple) else [str(key)], v)
+        else:
+            family.add_metric([], value)
+        return [family]
+
+
+def render() -> str:
+    """Todas as métricas registadas no formato de texto do Prometheus."""
+    return prometheus_client.generate_latest().decode("utf-8")
+
+
+# --- SPANS ---
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    attributes: dict = field(default_factory=dict)
+    start: float = field(default_factory=time.perf_counter)
+    duration: float = 0.0
+    error: Optional[str] = None
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("bcl_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Delimita uma operação. Spans aninhados na mesma tarefa asyncio (ou em
+    tarefas criadas dentro dela, que herdam o contexto) partilham o trace_id
+    do span exterior. Os spans concluídos são registados em DEBUG.
+    """
+    parent = _current_span.get()
+    current = Span(name=name, trace_id=parent.trace_id if parent else os.urandom(8).hex(),
+                   span_id=os.urandom(4).hex(), parent_id=parent.span_id if parent else None,
+                   attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current.start
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "span %s trace=%s span=%s parent=%s duration=%.4fs%s %s", current.name, current.trace_id,
+                current.span_id, current.parent_id, current.duration,
+                f" error={current.error}" if current.error else "", current.attributes
+            )
+
+
+def traced(name: str):
+    """Decorador que corre a função (síncrona ou assíncrona) dentro de um span com o nome dado."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- LOGS DE PAYLOADS ---
+def log_payload(log: logging.Logger, message: str, payload: object):
+    """
+    Regista um payload completo (lead, mensagem gerada, etc.) sem o custo de o
+    formatar em cada pedido: só com DEBUG ativo ou numa amostra de
+    PAYLOAD_LOG_SAMPLE_RATE dos pedidos em INFO.
+    """
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("%s: %s", message, payload)
+    elif PAYLOAD_LOG_SAMPLE_RATE > 0 and random.random() < PAYLOAD_LOG_SAMPLE_RATE:
+        log.info("%s (amostra): %s", message, payload)
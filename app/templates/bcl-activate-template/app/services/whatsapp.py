@@ -0,0 +1,331 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Optional
+
+import httpx
+
+from app.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+EVOLUTION_API_URL = os.getenv("EVOLUTION_API_URL")
+EVOLUTION_API_KEY = os.getenv("EVOLUTION_API_KEY")
+# A fábrica injeta EVOLUTION_INSTANCE_NAME; EVOLUTION_INSTANCE é o nome antigo do .env.example
+EVOLUTION_INSTANCE_NAME = os.getenv("EVOLUTION_INSTANCE_NAME") or os.getenv("EVOLUTION_INSTANCE")
+EVOLUTION_TIMEOUT = float(os.getenv("EVOLUTION_TIMEOUT", "15"))
+
+WHATSAPP_OUTBOX_DB = os.getenv("WHATSAPP_OUTBOX_DB", os.path.join("/tmp", "bcl_outbox.sqlite3"))
+# Limite de envio por instância do WhatsApp: mensagens por segundo e rajada máxima
+WHATSAPP_RATE_PER_SECOND = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "1"))
+WHATSAPP_BURST = int(os.getenv("WHATSAPP_BURST", "5"))
+# Envios simultâneos (todas as instâncias) e ligações mantidas abertas à Evolution API
+WHATSAPP_SEND_CONCURRENCY = int(os.getenv("WHATSAPP_SEND_CONCURRENCY", "8"))
+WHATSAPP_MAX_ATTEMPTS = int(os.getenv("WHATSAPP_MAX_ATTEMPTS", "6"))
+# Backoff exponencial (segundos) entre tentativas de envio
+WHATSAPP_RETRY_BASE_DELAY = float(os.getenv("WHATSAPP_RETRY_BASE_DELAY", "10"))
+WHATSAPP_RETRY_MAX_DELAY = float(os.getenv("WHATSAPP_RETRY_MAX_DELAY", "900"))
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+DELIVERIES = telemetry.Counter(
+    "bcl_whatsapp_deliveries_total", "Tentativas de envio pela Evolution API, por resultado (sent, retry, failed).", ("result",)
+)
+
+# Respostas da Evolution API que vale a pena repetir; os restantes 4xx são definitivos
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedup_key TEXT UNIQUE,
+    instance TEXT NOT NULL,
+    number TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    message_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at);
+"""
+
+
+class DeliveryError(Exception):
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def is_configured() -> bool:
+    return bool(EVOLUTION_API_URL and EVOLUTION_API_KEY and EVOLUTION_INSTANCE_NAME)
+
+
+def normalizar_numero(phone: Optional[str]) -> Optional[str]:
+    """Só dígitos, como a Evolution API espera (ex.: '+55 (11) 9...' -> '5511 9...')."""
+    digits = re.sub(r"\D", "", phone or "")
+    return digits or None
+
+
+class TokenBucket:
+    """Limitador assíncrono: `rate` envios por segundo com rajadas até `capacity`."""
+
+    def __init__(self, rate: float = WHATSAPP_RATE_PER_SECOND, capacity: int = WHATSAPP_BURST):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def penalize(self, seconds: float):
+        """Esvazia o balde durante `seconds` (ex.: depois de um 429 com Retry-After)."""
+        self._tokens = min(self._tokens, -seconds * self._rate)
+
+
+class EvolutionClient:
+    """Cliente assíncrono da Evolution API com um único pool de ligações."""
+
+    def __init__(self, base_url: str = EVOLUTION_API_URL, api_key: str = EVOLUTION_API_KEY,
+                 timeout: float = EVOLUTION_TIMEOUT, max_connections: int = WHATSAPP_SEND_CONCURRENCY):
+        self._client = httpx.AsyncClient(
+            base_url=(base_url or "").rstrip("/"),
+            headers={"apikey": api_key or "", "Content-Type": "application/json"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def send_text(self, instance: str, number: str, text: str) -> Optional[str]:
+        """Envia a mensagem e devolve o ID atribuído pela Evolution API."""
+        try:
+            response = await self._client.post(f"/message/sendText/{instance}", json={"number": number, "text": text})
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"Erro de rede ao contactar a Evolution API: {e}")
+        if response.status_code >= 400:
+            retry_after = response.headers.get("Retry-After")
+            raise DeliveryError(
+                f"Evolution API respondeu {response.status_code}: {response.text[:200]}",
+                retryable=response.status_code in _RETRYABLE_STATUS,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        return _message_id(response)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def _message_id(response: httpx.Response) -> Optional[str]:
+    """
+    ID da mensagem na resposta de sucesso. A mensagem já foi aceite, pelo que um
+    corpo vazio ou inesperado conta como entregue sem ID (repetir enviaria outra).
+    """
+    try:
+        key = response.json().get("key")
+        return key.get("id") if isinstance(key, dict) else None
+    except (ValueError, AttributeError):
+        logger.warning(f"Resposta da Evolution API sem ID da mensagem: {response.text[:200]!r}")
+        return None
+
+
+class Outbox:
+    """
+    Fila persistente (SQLite) das mensagens a enviar. A geração só grava a
+    mensagem aqui; um enviador em segundo plano entrega-as respeitando o
+    limite de cada instância e repete as falhas temporárias com backoff
+    exponencial. A `dedup_key` impede que a mesma mensagem seja enviada
+    duas vezes quando o lead é reprocessado.
+    """
+
+    def __init__(self, db_path: str = WHATSAPP_OUTBOX_DB, client_factory=EvolutionClient):
+        self._db_path = db_path
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._client: Optional[EvolutionClient] = None
+        self._buckets: dict[str, TokenBucket] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    def open(self):
+        db_dir = os.path.dirname(self._db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._requeue_interrupted()
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def enqueue(self, number: str, text: str, instance: Optional[str] = None,
+                dedup_key: Optional[str] = None) -> tuple[int, bool]:
+        """Agenda o envio. Devolve (id, nova); `nova` é False se a dedup_key já existia."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (dedup_key, instance, number, text, status, created_at, next_attempt_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (dedup_key, instance or EVOLUTION_INSTANCE_NAME or "", number, text, STATUS_PENDING, now, now, now)
+            )
+            if cursor.rowcount:
+                delivery_id, is_new = cursor.lastrowid, True
+            else:
+                delivery_id, is_new = self._conn.execute(
+                    "SELECT id FROM outbox WHERE dedup_key = ?", (dedup_key,)).fetchone()[0], False
+        if is_new and self._wakeup:
+            self._wakeup.set()
+        return delivery_id, is_new
+
+    def get(self, delivery_id: Optional[int] = None, dedup_key: Optional[str] = None) -> Optional[dict]:
+        column, value = ("id", delivery_id) if delivery_id is not None else ("dedup_key", dedup_key)
+        with self._lock:
+            row = self._conn.execute(f"SELECT * FROM outbox WHERE {column} = ?", (value,)).fetchone()
+        if not row:
+            return None
+        return {k: row[k] for k in ("id", "instance", "number", "status", "attempts", "message_id", "error", "updated_at")}
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (STATUS_PENDING, STATUS_SENDING)
+            ).fetchone()[0]
+
+    # --- ENVIADOR ---
+    def start_sender(self, concurrency: int = WHATSAPP_SEND_CONCURRENCY):
+        # Envios cancelados por um stop_sender anterior no mesmo processo
+        self._requeue_interrupted()
+        self._client = self._client_factory()
+        self._wakeup = asyncio.Event()
+        self._sender = asyncio.create_task(self._send_loop(concurrency))
+
+    async def stop_sender(self):
+        if self._sender:
+            self._sender.cancel()
+            try:
+                await self._sender
+            except asyncio.CancelledError:
+                pass
+            self._sender = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send_loop(self, concurrency: int):
+        in_flight: set[asyncio.Task] = set()
+        try:
+            while True:
+                self._wakeup.clear()
+                free = concurrency - len(in_flight)
+                rows = self._claim(free) if free > 0 else []
+                for row in rows:
+                    task = asyncio.create_task(self._deliver(row))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    task.add_done_callback(lambda _: self._wakeup.set())
+                if not rows:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_due())
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def _next_due(self) -> float:
+        """Segundos até à próxima mensagem agendada (no máximo 60)."""
+        with self._lock:
+            due = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (STATUS_PENDING,)).fetchone()[0]
+        return 60.0 if due is None else min(60.0, max(0.05, due - time.time()))
+
+    def _claim(self, limit: int) -> list[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+                (STATUS_PENDING, now, limit)
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(STATUS_SENDING, now, row["id"]) for row in rows]
+                )
+        return rows
+
+    async def _deliver(self, row: sqlite3.Row):
+        bucket = self._buckets.setdefault(row["instance"], TokenBucket())
+        await bucket.acquire()
+        attempts = row["attempts"] + 1
+        try:
+            message_id = await self._client.send_text(row["instance"], row["number"], row["text"])
+        except DeliveryError as e:
+            if e.retry_after:
+                bucket.penalize(e.retry_after)
+            self._retry_or_fail(row, attempts, e, e.retryable, e.retry_after)
+        except Exception as e:
+            # Erro fora do cliente (ex.: bug ou exceção do httpx não prevista): a linha não pode ficar em 'sending'
+            logger.error(f"Erro inesperado no envio {row['id']}: {e}", exc_info=True)
+            self._retry_or_fail(row, attempts, e, retryable=True)
+        else:
+            logger.info(f"Mensagem {row['id']} entregue à Evolution API (instância {row['instance']}).")
+            self._update(row["id"], STATUS_SENT, message_id=message_id)
+            DELIVERIES.inc(result="sent")
+
+    def _retry_or_fail(self, row: sqlite3.Row, attempts: int, error: Exception, retryable: bool,
+                       retry_after: Optional[float] = None):
+        if retryable and attempts < WHATSAPP_MAX_ATTEMPTS:
+            delay = retry_after or min(WHATSAPP_RETRY_MAX_DELAY, WHATSAPP_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+            delay *= random.uniform(1.0, 1.25)
+            logger.warning(f"Envio {row['id']} falhou (tentativa {attempts}); nova tentativa em {delay:.0f}s: {error}")
+            self._update(row["id"], STATUS_PENDING, error=str(error), next_attempt_at=time.time() + delay)
+            DELIVERIES.inc(result="retry")
+        else:
+            logger.error(f"Envio {row['id']} para {row['number']} falhou definitivamente: {error}")
+            self._update(row["id"], STATUS_FAILED, error=str(error))
+            DELIVERIES.inc(result="failed")
+
+    def _requeue_interrupted(self):
+        with self._lock:
+            # Um envio interrompido pode ou não ter chegado; volta à fila (a Evolution não deduplica)
+            requeued = self._conn.execute(
+                "UPDATE outbox SET status = ?, next_attempt_at = ? WHERE status = ?",
+                (STATUS_PENDING, time.time(), STATUS_SENDING)
+            ).rowcount
+        if requeued:
+            logger.info(f"{requeued} envio(s) interrompidos voltaram à fila.")
+
+    def _update(self, delivery_id: int, status: str, message_id: Optional[str] = None,
+                error: Optional[str] = None, next_attempt_at: Optional[float] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, message_id = COALESCE(?, message_id), error = ?, "
+                "next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ? WHERE id = ?",
+                (status, message_id, error, next_attempt_at, time.time(), delivery_id)
+            )
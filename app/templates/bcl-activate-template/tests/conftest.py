@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os testes importam o pacote `app` da instância, não o da fábrica
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,78 @@
+import gc
+import json
+import asyncio
+
+import pytest
+
+from app.services.batcher import LeadBatcher
+
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=5))
+
+
+async def _fallback(prompt, system_prompt):
+    return f"individual: {prompt}"
+
+
+def test_leads_in_the_window_share_one_request():
+    calls = []
+
+    async def generate(prompt, timeout, system_prompt=None):
+        calls.append(prompt)
+        return json.dumps(["m1", "m2", "m3"])
+
+    batcher = LeadBatcher(window_ms=20, max_size=10, generate=generate, fallback=_fallback)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("sistema", f"lead {i}") for i in range(3)))
+    assert _run(run()) == ["m1", "m2", "m3"]
+    assert len(calls) == 1
+
+
+def test_unparsable_batch_falls_back_to_individual_generation():
+    async def generate(prompt, timeout, system_prompt=None):
+        return "isto não é JSON"
+
+    batcher = LeadBatcher(window_ms=20, max_size=2, generate=generate, fallback=_fallback)
+
+    async def run():
+        return await asyncio.gather(batcher.submit("sistema", "a"), batcher.submit("sistema", "b"))
+    assert _run(run()) == ["individual: a", "individual: b"]
+
+
+@pytest.mark.parametrize("size", [1, 3])
+def test_failing_fallback_resolves_every_waiting_lead(size):
+    async def generate(prompt, timeout, system_prompt=None):
+        raise RuntimeError("lote falhou")
+
+    async def broken_fallback(prompt, system_prompt):
+        raise ValueError("fallback falhou")
+
+    batcher = LeadBatcher(window_ms=20, max_size=10, generate=generate, fallback=broken_fallback)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("sistema", f"lead {i}") for i in range(size)),
+                                    return_exceptions=True)
+    results = _run(run())
+    assert len(results) == size and all(isinstance(r, ValueError) for r in results)
+
+
+def test_flush_tasks_are_kept_alive_until_they_finish():
+    async def run():
+        gate = asyncio.Event()
+
+        async def slow_fallback(prompt, system_prompt):
+            await gate.wait()
+            return "ok"
+
+        batcher = LeadBatcher(window_ms=1, max_size=10, fallback=slow_fallback)
+        waiting = asyncio.ensure_future(batcher.submit("sistema", "lead"))
+        await asyncio.sleep(0.05)
+        gc.collect()
+        assert len(batcher._tasks) == 1
+        gate.set()
+        assert await waiting == "ok"
+        await asyncio.sleep(0)
+        assert not batcher._tasks
+    _run(run())
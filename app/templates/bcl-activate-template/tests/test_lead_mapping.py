@@ -0,0 +1,59 @@
+import pytest
+
+from app.services.lead_mapping import LeadExtractor, LeadNormalizer
+
+LEAD_FIELDS = ("name", "email", "phone", "company", "position", "interest")
+
+
+@pytest.fixture
+def normalizer():
+    return LeadNormalizer(fields=LEAD_FIELDS, schemas={})
+
+
+def test_meta_lead_is_mapped(normalizer):
+    payload = {"field_data": [{"name": "full_name", "values": ["Ana Silva"]},
+                              {"name": "email", "values": ["ana@exemplo.pt"]}]}
+    assert normalizer.normalize("meta", payload) == {"name": "Ana Silva", "email": "ana@exemplo.pt"}
+
+
+@pytest.mark.parametrize("name", [None, 42, 3.5, ["email"], {"x": 1}, True])
+def test_meta_field_names_that_are_not_text_are_ignored(normalizer, name):
+    payload = {"field_data": [{"name": name, "values": ["x"]},
+                              {"name": "email", "values": ["ana@exemplo.pt"]}]}
+    assert normalizer.normalize("meta", payload) == {"email": "ana@exemplo.pt"}
+
+
+@pytest.mark.parametrize("values", [None, [], "ana@exemplo.pt", 7, {"0": "x"}])
+def test_meta_answers_without_a_list_of_values_are_absent(normalizer, values):
+    payload = {"field_data": [{"name": "email", "values": values}, {"name": "phone", "values": ["+351900000000"]}]}
+    assert normalizer.normalize("meta", payload) == {"phone": "+351900000000"}
+
+
+@pytest.mark.parametrize("field_data", [[{"values": ["x"]}], ["email"], [None], [["email", "x"]]])
+def test_meta_entries_without_the_expected_shape_fall_back_to_a_flat_form(normalizer, field_data):
+    assert normalizer.normalize("meta", {"field_data": field_data, "email": "ana@exemplo.pt"}) == {"email": "ana@exemplo.pt"}
+
+
+@pytest.mark.parametrize("lead", ["texto", ["email"], None, 5])
+def test_rdstation_lead_that_is_not_an_object_falls_back_to_a_flat_form(lead):
+    extractor = LeadExtractor(LEAD_FIELDS, source="rdstation")
+    assert extractor({"leads": [lead], "email": "ana@exemplo.pt"}) == {"email": "ana@exemplo.pt"}
+
+
+def test_nested_paths_that_do_not_exist_are_skipped():
+    extractor = LeadExtractor(LEAD_FIELDS, paths={"interest": "leads.0.last_conversion.content.produto"})
+    assert extractor({"leads": "x", "email": "ana@exemplo.pt"}) == {"email": "ana@exemplo.pt"}
+
+
+def test_extractors_are_bounded_and_least_recently_used_is_evicted():
+    normalizer = LeadNormalizer(fields=LEAD_FIELDS, schemas={}, max_webhooks=2)
+    normalizer.normalize("a", {"email": "a@exemplo.pt"})
+    normalizer.normalize("b", {"email": "b@exemplo.pt"})
+    # "a" passa a ser o mais recente; "b" sai quando chega "c"
+    normalizer.normalize("a", {"email": "a@exemplo.pt"})
+    normalizer.normalize("c", {"email": "c@exemplo.pt"})
+    assert list(normalizer._extractors) == ["a", "c"]
+
+    for i in range(100):
+        normalizer.normalize(f"webhook-{i}", {"email": "x@exemplo.pt"})
+    assert len(normalizer._extractors) == 2
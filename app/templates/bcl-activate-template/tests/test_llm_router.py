@@ -0,0 +1,147 @@
+import time
+import asyncio
+
+import pytest
+
+from app.services import llm_router
+from app.services.llm_router import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, LLMRouter, NoProviderAvailable
+
+
+class FakeProviders:
+    """Provedores falsos: cada um responde ao fim de `delay` segundos ou levanta `error`."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.calls: list[tuple[str, float]] = []
+        self.cancelled: list[str] = []
+        self._start = time.monotonic()
+
+    async def __call__(self, name: str, prompt: str, system_prompt):
+        self.calls.append((name, time.monotonic() - self._start))
+        delay, error = self.behaviour[name]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(name)
+            raise
+        if error:
+            raise error
+        return f"resposta de {name}"
+
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(llm_router, "LLM_CIRCUIT_CONSECUTIVE_FAILURES", 2)
+    monkeypatch.setattr(llm_router, "LLM_CIRCUIT_COOLDOWN", 0.1)
+
+
+def _router(providers: FakeProviders) -> LLMRouter:
+    return LLMRouter([(name, f"{name}-model") for name in providers.behaviour], providers)
+
+
+def _call(router: LLMRouter, timeout: float = 2.0) -> str:
+    return asyncio.run(router.call("prompt", None, timeout))
+
+
+def test_fast_primary_answers_without_hedge():
+    providers = FakeProviders(gemini=(0.0, None), openai=(0.0, None))
+    assert _call(_router(providers)) == "resposta de gemini"
+    assert [name for name, _ in providers.calls] == ["gemini"]
+
+
+def test_hedge_fires_after_the_delay_and_the_loser_is_cancelled():
+    providers = FakeProviders(gemini=(1.0, None), openai=(0.0, None))
+    router = _router(providers)
+    assert _call(router) == "resposta de openai"
+    (primary, _), (hedge, sent_at) = providers.calls
+    assert (primary, hedge) == ("gemini", "openai")
+    assert sent_at >= llm_router.LLM_HEDGE_DEFAULT_DELAY
+    assert providers.cancelled == ["gemini"]
+    # O cancelamento não conta como erro
+    assert router._stats["gemini"].calls == 0
+
+
+def test_hedge_is_not_sent_when_disabled(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_ENABLED", False)
+    providers = FakeProviders(gemini=(0.1, None), openai=(0.0, None))
+    assert _call(_router(providers)) == "resposta de gemini"
+    assert [name for name, _ in providers.calls] == ["gemini"]
+
+
+def test_failover_to_the_next_provider_on_error():
+    providers = FakeProviders(gemini=(0.0, RuntimeError("quota")), openai=(0.0, None))
+    router = _router(providers)
+    assert _call(router) == "resposta de openai"
+    assert [name for name, _ in providers.calls] == ["gemini", "openai"]
+    assert router._stats["gemini"].error_rate == 1.0
+
+
+def test_last_error_is_raised_when_every_provider_fails():
+    providers = FakeProviders(gemini=(0.0, RuntimeError("quota")), openai=(0.0, ValueError("resposta vazia")))
+    with pytest.raises(ValueError, match="resposta vazia"):
+        _call(_router(providers))
+
+
+def test_timeout_cancels_the_calls_in_flight():
+    providers = FakeProviders(gemini=(1.0, None))
+    with pytest.raises(asyncio.TimeoutError):
+        _call(_router(providers), timeout=0.1)
+    # Com um único provedor o hedge vai para o mesmo; ambas as chamadas são canceladas
+    assert providers.cancelled == ["gemini", "gemini"]
+
+
+def test_circuit_opens_then_half_opens_and_closes_after_a_successful_probe(monkeypatch):
+    # Depois de uma falha o gemini passa para o fim da fila; basta uma para abrir o circuito
+    monkeypatch.setattr(llm_router, "LLM_CIRCUIT_CONSECUTIVE_FAILURES", 1)
+    providers = FakeProviders(gemini=(0.0, RuntimeError("503")), openai=(0.0, None))
+    router = _router(providers)
+    stats = router._stats["gemini"]
+    assert _call(router) == "resposta de openai"
+    assert stats.state == CIRCUIT_OPEN
+    # Com o circuito aberto o provedor fica de fora
+    assert router.candidates() == ["openai"]
+    providers.calls.clear()
+    _call(router)
+    assert [name for name, _ in providers.calls] == ["openai"]
+
+    time.sleep(llm_router.LLM_CIRCUIT_COOLDOWN)
+    assert "gemini" in router.candidates()
+    assert stats.state == CIRCUIT_HALF_OPEN
+    # Só uma sonda de cada vez
+    stats.begin()
+    assert not stats.available()
+    stats._probing = False
+
+    # O gemini recuperou e o openai começa a falhar: a sonda chega ao gemini pelo failover
+    providers.behaviour["gemini"] = (0.0, None)
+    providers.behaviour["openai"] = (0.0, RuntimeError("503"))
+    assert _call(router) == "resposta de gemini"
+    assert stats.state == CIRCUIT_CLOSED
+
+
+def test_failed_probe_reopens_the_circuit():
+    providers = FakeProviders(gemini=(0.0, RuntimeError("503")))
+    router = _router(providers)
+    stats = router._stats["gemini"]
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            _call(router)
+    assert stats.state == CIRCUIT_OPEN
+    with pytest.raises(NoProviderAvailable):
+        _call(router)
+
+    time.sleep(llm_router.LLM_CIRCUIT_COOLDOWN)
+    with pytest.raises(RuntimeError):
+        _call(router)
+    assert stats.state == CIRCUIT_OPEN
+
+
+def test_saturated_provider_goes_last_and_receives_no_hedge():
+    providers = FakeProviders(gemini=(1.0, None), openai=(0.0, None))
+    router = LLMRouter([("gemini", "g"), ("openai", "o")], providers, is_saturated=lambda name: name == "openai")
+    assert router.candidates() == ["gemini", "openai"]
+    with pytest.raises(asyncio.TimeoutError):
+        _call(router, timeout=0.3)
+    assert [name for name, _ in providers.calls] == ["gemini"]
@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import whatsapp
+from app.services.whatsapp import DeliveryError, EvolutionClient
+
+
+def _send(status: int, **response) -> str:
+    async def run():
+        client = EvolutionClient(base_url="http://evolution", api_key="chave")
+        await client.aclose()
+        client._client = httpx.AsyncClient(
+            base_url="http://evolution", transport=httpx.MockTransport(lambda request: httpx.Response(status, **response))
+        )
+        try:
+            return await client.send_text("bcl-instance-1", "351900000000", "Olá")
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def test_message_id_is_returned():
+    assert _send(201, json={"key": {"id": "ABC123"}}) == "ABC123"
+
+
+@pytest.mark.parametrize("response", [
+    {"content": b""}, {"content": b"<html>ok</html>"}, {"json": []}, {"json": {"key": "ABC"}}, {"json": {}},
+    {"json": {"key": None}},
+])
+def test_accepted_message_without_a_readable_id_counts_as_delivered(response):
+    assert _send(200, **response) is None
+
+
+def test_rejected_message_raises_delivery_error():
+    with pytest.raises(DeliveryError) as error:
+        _send(429, headers={"Retry-After": "3"}, content=b"")
+    assert error.value.retryable and error.value.retry_after == 3.0
+
+
+class _BrokenClient:
+    """Cliente cujo envio falha com um erro que não é DeliveryError."""
+
+    async def send_text(self, instance, number, text):
+        raise RuntimeError("bug no cliente")
+
+    async def aclose(self):
+        pass
+
+
+def _deliver_once(tmp_path, monkeypatch, max_attempts: int) -> dict:
+    monkeypatch.setattr(whatsapp, "WHATSAPP_MAX_ATTEMPTS", max_attempts)
+    outbox = whatsapp.Outbox(db_path=str(tmp_path / "outbox.sqlite3"), client_factory=_BrokenClient)
+    outbox.open()
+
+    async def run():
+        outbox.start_sender(concurrency=1)
+        delivery_id, _ = outbox.enqueue("351900000000", "Olá", instance="bcl-instance-1")
+        # A falha fica registada tanto ao reagendar como ao desistir
+        for _ in range(200):
+            if outbox.get(delivery_id)["error"]:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop_sender()
+        return outbox.get(delivery_id)
+    try:
+        return asyncio.run(run())
+    finally:
+        outbox.close()
+
+
+def test_unexpected_send_error_is_retried_instead_of_left_sending(tmp_path, monkeypatch):
+    delivery = _deliver_once(tmp_path, monkeypatch, max_attempts=6)
+    assert delivery["status"] == whatsapp.STATUS_PENDING
+    assert delivery["attempts"] == 1 and delivery["error"] == "bug no cliente"
+
+
+def test_unexpected_send_error_fails_after_the_last_attempt(tmp_path, monkeypatch):
+    delivery = _deliver_once(tmp_path, monkeypatch, max_attempts=1)
+    assert delivery["status"] == whatsapp.STATUS_FAILED
+
+
+def test_interrupted_sends_return_to_the_queue_on_open(tmp_path):
+    db_path = str(tmp_path / "outbox.sqlite3")
+    outbox = whatsapp.Outbox(db_path=db_path)
+    outbox.open()
+    delivery_id, _ = outbox.enqueue("351900000000", "Olá")
+    outbox._claim(1)
+    assert outbox.get(delivery_id)["status"] == whatsapp.STATUS_SENDING
+    outbox.close()
+
+    reopened = whatsapp.Outbox(db_path=db_path)
+    reopened.open()
+    assert reopened.get(delivery_id)["status"] == whatsapp.STATUS_PENDING
+    reopened.close()
@@ -0,0 +1,89 @@
+"""
+Benchmark do normalizador de webhooks da instância BCL Activate.
+
+Compara o mapeamento original (percorre e reescreve todas as chaves em cada
+pedido) com os extratores compilados por webhook, para payloads genéricos,
+Meta Lead Ads e RD Station com muitos campos.
+
+Uso: python benchmarks/bench_normalizer.py [--width 500] [--iterations 20000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "templates", "bcl-activate-template")
+sys.path.insert(0, os.path.abspath(TEMPLATE_DIR))
+
+from app.services.lead_mapping import FIELD_MAP, LeadNormalizer  # noqa: E402
+
+LEAD_FIELDS = ("name", "email", "phone", "company", "position", "interest")
+
+
+def normalize_original(raw_data: dict) -> dict:
+    """Mapeamento anterior, reproduzido para comparação."""
+    normalized = {}
+    for key, value in raw_data.items():
+        clean_key = key.lower().replace(" ", "_")
+        target_key = FIELD_MAP.get(clean_key, clean_key)
+        if target_key in LEAD_FIELDS:
+            normalized[target_key] = value
+    return normalized
+
+
+def payload_generico(width: int) -> dict:
+    payload = {f"Custom Field {i}": f"valor {i}" for i in range(width)}
+    payload.update({"Full Name": "Ana Silva", "E-mail": "ana@exemplo.pt", "Telefone": "+351900000000"})
+    return payload
+
+
+def payload_meta(width: int) -> dict:
+    field_data = [{"name": f"pergunta_{i}", "values": [f"resposta {i}"]} for i in range(width)]
+    field_data += [{"name": "full_name", "values": ["Ana Silva"]},
+                   {"name": "email", "values": ["ana@exemplo.pt"]},
+                   {"name": "phone_number", "values": ["+351900000000"]}]
+    return {"id": "123", "created_time": "2024-01-01T00:00:00+0000", "field_data": field_data}
+
+
+def payload_rdstation(width: int) -> dict:
+    lead = {f"cf_campo_{i}": f"valor {i}" for i in range(width)}
+    lead.update({"id": "1", "name": "Ana Silva", "email": "ana@exemplo.pt", "mobile_phone": "+351900000000",
+                 "company": "Exemplo", "job_title": "Diretora",
+                 "last_conversion": {"content": {"identificador": "ebook-vendas"}}})
+    return {"leads": [lead]}
+
+
+def medir(nome: str, fn, payload: dict, iterations: int):
+    fn(payload)  # aquecimento (compila o extrator e aprende o layout)
+    inicio = time.perf_counter()
+    for _ in range(iterations):
+        fn(payload)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<38} {iterations / duracao:>12,.0f} payloads/s  {duracao / iterations * 1e6:>8.2f} µs/payload")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=500, help="Número de campos extra por payload")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    normalizer = LeadNormalizer(fields=LEAD_FIELDS, schemas={
+        "rd": {"source": "rdstation", "paths": {"interest": "leads.0.last_conversion.content.identificador"}},
+    })
+
+    print(f"Payloads com {args.width} campos extra, {args.iterations} iterações\n")
+    generico, meta, rd = payload_generico(args.width), payload_meta(args.width), payload_rdstation(args.width)
+    medir("genérico: mapeamento original", normalize_original, generico, args.iterations)
+    medir("genérico: extrator compilado", lambda p: normalizer.normalize("form", p), generico, args.iterations)
+    medir("meta: extrator compilado", lambda p: normalizer.normalize("meta", p), meta, args.iterations)
+    medir("rdstation: extrator compilado", lambda p: normalizer.normalize("rd", p), rd, args.iterations)
+
+    print("\nResultados:")
+    for webhook_id, payload in (("form", generico), ("meta", meta), ("rd", rd)):
+        print(f"  {webhook_id}: {normalizer.normalize(webhook_id, payload)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark de ponta a ponta do `provision_instance_flow` da fábrica.
+
+Corre o fluxo real contra substitutos locais: repositórios bare em disco no
+lugar do GitHub, o servidor falso do Render (benchmarks/mock_render.py, noutro
+processo) e uma tabela do Supabase em memória. Para cada nível de
+concorrência (1, 10 e 100 jobs em simultâneo) mede:
+
+- p50/p95/p99 e débito do fluxo até devolver (repositório + push + serviço criado);
+- ready_*: tempo até a campanha ficar 'active' no Supabase (deploy 'live');
+- pico de RSS do processo da fábrica.
+
+Uso: python benchmarks/bench_provisioning.py [--levels 1,10,100] [--jobs-per-worker 3]
+     [--render-latency-ms 50] [--render-error-rate 0] [--deploy-seconds 1] [--push-mode packstream]
+"""
+
+import os
+import sys
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks import harness  # noqa: E402
+from benchmarks.fakes import FakeGitHub, InMemorySupabase, spawn_server  # noqa: E402
+
+
+def add_arguments(parser):
+    parser.add_argument("--jobs-per-worker", type=int, default=3)
+    parser.add_argument("--push-mode", choices=("packstream", "workdir"), default="packstream")
+    parser.add_argument("--render-latency-ms", type=float, default=50)
+    parser.add_argument("--render-error-rate", type=float, default=0.0)
+    parser.add_argument("--deploy-seconds", type=float, default=1.0)
+    parser.add_argument("--github-latency-ms", type=float, default=0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=0)
+    parser.add_argument("--ready-timeout", type=float, default=120)
+
+
+def run_level(concurrency: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bcl_bench_")
+    render_url, render_proc = spawn_server("benchmarks.mock_render:app", env={
+        "MOCK_RENDER_LATENCY_MS": str(args.render_latency_ms),
+        "MOCK_RENDER_ERROR_RATE": str(args.render_error_rate),
+        "MOCK_RENDER_DEPLOY_SECONDS": str(args.deploy_seconds),
+    })
+    # Configuração lida no import dos serviços; as credenciais só são lidas a cada chamada
+    os.environ.update({
+        "GITHUB_PUSH_MODE": args.push_mode,
+        "GITHUB_TOKEN": "mock", "GITHUB_USERNAME": "mock",
+        "RENDER_API_URL": render_url, "RENDER_API_KEY": "mock", "RENDER_OWNER_ID": "own-mock",
+        "INSTANCE_STORE_DB": os.path.join(workdir, "instances.sqlite3"),
+        "PROVISION_QUEUE_DB": os.path.join(workdir, "jobs.sqlite3"),
+        "WARM_POOL_SIZE": "0",
+        "DEPLOY_POLL_INITIAL_DELAY": str(max(0.05, args.deploy_seconds / 4)),
+        "DEPLOY_POLL_MAX_DELAY": str(max(0.5, args.deploy_seconds)),
+        "STATUS_FLUSH_INTERVAL": "0.2",
+        "HTTP_POOL_SIZE": str(max(16, concurrency)),
+        # Workdir: o GitPython faz push para o ramo main do repositório bare
+        "GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "init.defaultBranch", "GIT_CONFIG_VALUE_0": "main",
+    })
+
+    from app.api.main import provision_instance_flow
+    from app.api.models import ProvisionRequest, CampaignDetails
+    from app.services import clients, deploy_tracker, status_writer, template_cache
+
+    logging.getLogger().setLevel(logging.WARNING)
+    supabase = InMemorySupabase(latency=args.supabase_latency_ms / 1000)
+    clients.override("github", FakeGitHub(os.path.join(workdir, "remotes"), latency=args.github_latency_ms / 1000))
+    clients.override("supabase", supabase)
+    template_cache.get_manifest()
+    status_writer.writer.start()
+    deploy_tracker.tracker.start()
+
+    run_id = uuid.uuid4().hex[:6]
+    details = CampaignDetails(
+        campaignName="Benchmark", objective="Agendar reuniões", assistantPersona="SDR",
+        toneOfVoice="Próximo", offer="Diagnóstico gratuito", customerProfile="PMEs de serviços"
+    )
+    requests = [
+        ProvisionRequest(campaign_id=f"bench-{run_id}-{i}", user_email="bench@exemplo.pt", campaign_details=details)
+        for i in range(max(1, concurrency * args.jobs_per_worker))
+    ]
+    # As campanhas já existem quando a fábrica é chamada: o status é só atualizado
+    supabase.table("campaigns").insert([{"id": req.campaign_id, "status": "pending"} for req in requests]).execute()
+    started: dict[str, float] = {}
+
+    def job(req):
+        started[req.campaign_id] = time.perf_counter()
+        try:
+            provision_instance_flow(req)
+            return time.perf_counter() - started[req.campaign_id]
+        except Exception:
+            return None
+
+    # A notificação simulada escreve no stdout, que aqui transporta o resultado em JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(job, requests))
+        flow_wall = time.perf_counter() - wall_start
+
+        submitted = {req.campaign_id for req, latency in zip(requests, outcomes) if latency is not None}
+        deadline = time.monotonic() + args.ready_timeout
+        while time.monotonic() < deadline:
+            finished = {str(row["id"]) for row in supabase.rows("campaigns") if row.get("status") in ("active", "failed")}
+            if submitted <= finished:
+                break
+            time.sleep(0.05)
+        ready_wall = time.perf_counter() - wall_start
+        deploy_tracker.tracker.stop()
+        status_writer.writer.stop()
+    render_proc.terminate()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    ready_at: dict[str, float] = {}
+    for at, table, row in supabase.history:
+        if table == "campaigns" and row.get("status") == "active":
+            ready_at.setdefault(str(row["id"]), at)
+    ready = [ready_at[cid] - started[cid] for cid in submitted if cid in ready_at]
+
+    latencies = [latency for latency in outcomes if latency is not None]
+    summary = harness.summarize(concurrency, latencies, flow_wall, errors=len(outcomes) - len(latencies))
+    summary.update({
+        "ready": len(ready),
+        "ready_throughput": round(len(ready) / ready_wall, 2) if ready_wall else 0.0,
+        "ready_p50_ms": round(harness.percentile(ready, 50) * 1000, 1),
+        "ready_p95_ms": round(harness.percentile(ready, 95) * 1000, 1),
+        "ready_p99_ms": round(harness.percentile(ready, 99) * 1000, 1),
+    })
+    return summary
+
+
+if __name__ == "__main__":
+    harness.main(run_level, "Benchmark do provisionamento contra GitHub, Render e Supabase locais.", add_arguments)
@@ -0,0 +1,148 @@
+"""
+Benchmark do arranque a frio da instância BCL Activate e da fábrica.
+
+Cada arranque corre num processo novo (como uma instância do Render que
+acorda depois de adormecer) e mede:
+
+- import_ms: tempo de `import app.api.main`, e os SDKs que ficam carregados nesse momento;
+- first_response_ms: do lançamento do uvicorn até à primeira resposta 200 em `/`;
+- rss_mb: RSS do servidor depois da primeira resposta.
+
+Antes das medições corre um arranque de aquecimento, para que o bytecode já
+esteja compilado (a imagem da instância compila-o no build).
+
+Uso: python benchmarks/bench_startup.py [--targets template,factory] [--runs 5] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TEMPLATE_DIR = os.path.join(ROOT, "app", "templates", "bcl-activate-template")
+sys.path.insert(0, ROOT)
+
+from benchmarks import harness  # noqa: E402
+from benchmarks.fakes import spawn_server  # noqa: E402
+
+# Módulos pesados cuja presença depois do import indica carregamento antecipado
+SDK_MODULES = ("google.generativeai", "openai", "dotenv", "github", "git", "supabase", "crewai")
+
+_IMPORT_SNIPPET = """
+import sys, json, time
+start = time.perf_counter()
+import app.api.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_s": elapsed, "sdks": [m for m in %r if m in sys.modules]}))
+""" % (SDK_MODULES,)
+
+
+def _target_env(target: str, workdir: str) -> tuple[str, dict]:
+    if target == "template":
+        return TEMPLATE_DIR, {
+            "GOOGLE_API_KEY": "mock", "OPENAI_API_KEY": "mock",
+            "LEAD_LOG_DB": os.path.join(workdir, "leads.sqlite3"),
+            "WHATSAPP_OUTBOX_DB": os.path.join(workdir, "outbox.sqlite3"),
+            "EVOLUTION_API_URL": "",
+        }
+    return ROOT, {
+        "INSTANCE_STORE_DB": os.path.join(workdir, "instances.sqlite3"),
+        "PROVISION_QUEUE_DB": os.path.join(workdir, "jobs.sqlite3"),
+        "PROVISION_CHECKPOINT_DB": os.path.join(workdir, "checkpoints.sqlite3"),
+        "WARM_POOL_SIZE": "0",
+    }
+
+
+def measure_import(cwd: str, env: dict) -> dict:
+    proc = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET], cwd=cwd, env={**os.environ, **env},
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response(cwd: str, env: dict, timeout: float) -> tuple[float, float]:
+    """Devolve (segundos até ao primeiro 200 em `/`, RSS do servidor em MB)."""
+    start = time.perf_counter()
+    url, proc = spawn_server("app.api.main:app", env=env, timeout=timeout, cwd=cwd)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if requests.get(f"{url}/", timeout=timeout).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} não respondeu em {timeout:.0f} segundos.")
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        return elapsed, _rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return float("nan")
+
+
+def run_target(target: str, runs: int, timeout: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bcl_bench_")
+    try:
+        cwd, env = _target_env(target, workdir)
+        measure_import(cwd, env)  # aquecimento: compila o bytecode
+        imports, first_responses, rss, sdks = [], [], [], set()
+        for _ in range(runs):
+            result = measure_import(cwd, env)
+            imports.append(result["import_s"])
+            sdks.update(result["sdks"])
+            elapsed, rss_mb = measure_first_response(cwd, env, timeout)
+            first_responses.append(elapsed)
+            rss.append(rss_mb)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "target": target,
+        "runs": runs,
+        "import_p50_ms": round(harness.percentile(imports, 50) * 1000, 1),
+        "import_p95_ms": round(harness.percentile(imports, 95) * 1000, 1),
+        "first_response_p50_ms": round(harness.percentile(first_responses, 50) * 1000, 1),
+        "first_response_p95_ms": round(harness.percentile(first_responses, 95) * 1000, 1),
+        "rss_mb": max(rss),
+        "sdks_at_import": ",".join(sorted(sdks)) or "-",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do arranque a frio da instância e da fábrica.")
+    parser.add_argument("--targets", type=lambda s: s.split(","), default=["template", "factory"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", action="store_true", help="imprime os resultados em JSON")
+    args = parser.parse_args()
+
+    results = []
+    for target in args.targets:
+        results.append(run_target(target, args.runs, args.timeout))
+        print(f"{target}: concluído", file=sys.stderr)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        harness.print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark do caminho `/webhook` da instância BCL Activate.
+
+A aplicação do template corre no próprio processo (httpx + ASGITransport,
+com o lifespan ativo) e cada provedor de LLM é substituído por um falso com
+latência e taxa de erro configuráveis. Com `--llm-degraded-rate`, uma fração
+das chamadas ao primeiro provedor fica lenta, para medir o efeito do hedge e
+do failover do router na cauda da latência. Para cada nível de concorrência
+(1, 10 e 100 clientes em simultâneo) mede:
+
+- p50/p95/p99 e débito da confirmação 202 do webhook;
+- done_*: tempo desde a receção até o consumidor gerar a mensagem e a pôr na fila de envio;
+- hedges/failovers: pedidos de cobertura e reencaminhamentos feitos pelo router de LLM;
+- pico de RSS do processo.
+
+Uso: python benchmarks/bench_webhook.py [--levels 1,10,100] [--leads-per-worker 10]
+     [--llm-latency-ms 200] [--llm-error-rate 0] [--llm-providers openai,gemini]
+     [--llm-degraded-rate 0.1] [--llm-degraded-ms 5000]
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import logging
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TEMPLATE_DIR = os.path.join(ROOT, "app", "templates", "bcl-activate-template")
+sys.path.insert(0, ROOT)
+
+from benchmarks import harness  # noqa: E402
+
+
+def add_arguments(parser):
+    parser.add_argument("--leads-per-worker", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-providers", default="openai",
+                        help="Provedores falsos, por ordem de preferência (openai, gemini)")
+    parser.add_argument("--llm-degraded-rate", type=float, default=0.0,
+                        help="Fração das chamadas ao primeiro provedor que demoram --llm-degraded-ms")
+    parser.add_argument("--llm-degraded-ms", type=float, default=5000)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+
+
+def run_level(concurrency: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bcl_bench_")
+    os.environ.update({
+        "LEAD_LOG_DB": os.path.join(workdir, "leads.sqlite3"),
+        "WHATSAPP_OUTBOX_DB": os.path.join(workdir, "outbox.sqlite3"),
+        "LEAD_RETRY_DELAY": "0.1",
+        "LLM_PROVIDERS": args.llm_providers,
+        "GOOGLE_API_KEY": "mock" if "gemini" in args.llm_providers else "",
+        "OPENAI_API_KEY": "mock" if "openai" in args.llm_providers else "",
+        "EVOLUTION_API_URL": "",
+    })
+    # O template é um projeto à parte, com o seu próprio pacote `app`
+    sys.path.insert(0, TEMPLATE_DIR)
+    for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+        del sys.modules[name]
+    os.chdir(workdir)  # o load_dotenv do template não deve apanhar um .env local
+
+    import httpx
+    from app.api import main
+    from app.services import llm, lead_log, llm_router
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def fake_provider(degraded_rate: float):
+        async def call(prompt: str, system_prompt):
+            latency = args.llm_latency_ms * random.uniform(0.5, 1.5)
+            if random.random() < degraded_rate:
+                latency = args.llm_degraded_ms
+            await asyncio.sleep(latency / 1000)
+            if random.random() < args.llm_error_rate:
+                raise RuntimeError("Falha simulada do provedor")
+            return f"Olá! Mensagem de teste ({len(prompt)} caracteres de prompt)."
+        return call
+
+    for i, name in enumerate(llm.router.providers):
+        llm._CALLS[name] = fake_provider(args.llm_degraded_rate if i == 0 else 0.0)
+    try:
+        return asyncio.run(_run(concurrency, args, main, lead_log, llm_router, httpx))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def _run(concurrency: int, args, main, lead_log, llm_router, httpx) -> dict:
+    total = max(1, concurrency * args.leads_per_worker)
+    run_id = uuid.uuid4().hex[:6]
+    payloads = [
+        {"Full Name": f"Lead {i}", "E-mail": f"lead{i}.{run_id}@exemplo.pt", "Telefone": f"+3519{i:08d}",
+         "Empresa": "Exemplo Lda", "Cargo": "Diretor"}
+        for i in range(total)
+    ]
+    queue: asyncio.Queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    accept_latencies: list[float] = []
+    seqs: list[int] = []
+    errors = 0
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def worker():
+                nonlocal errors
+                while not queue.empty():
+                    payload = queue.get_nowait()
+                    start = time.perf_counter()
+                    response = await client.post(f"/webhook/wh_bench_{run_id}", json=payload)
+                    if response.status_code == 202:
+                        accept_latencies.append(time.perf_counter() - start)
+                        seqs.append(response.json()["lead_id"])
+                    else:
+                        errors += 1
+
+            wall_start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            accept_wall = time.perf_counter() - wall_start
+
+            deadline = time.monotonic() + args.drain_timeout
+            while main.lead_log.pending_count() and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+            drain_wall = time.perf_counter() - wall_start
+
+        leads = [main.lead_log.get(seq) for seq in seqs]
+
+    done = [lead["updated_at"] - lead["received_at"] for lead in leads if lead["status"] == lead_log.STATUS_DONE]
+    summary = harness.summarize(concurrency, accept_latencies, accept_wall, errors=errors)
+    summary.update({
+        "done": len(done),
+        "failed": sum(lead["status"] == lead_log.STATUS_FAILED for lead in leads),
+        "done_throughput": round(len(done) / drain_wall, 2) if drain_wall else 0.0,
+        "done_p50_ms": round(harness.percentile(done, 50) * 1000, 1),
+        "done_p95_ms": round(harness.percentile(done, 95) * 1000, 1),
+        "done_p99_ms": round(harness.percentile(done, 99) * 1000, 1),
+        "hedges": _counter_total(llm_router.LLM_HEDGES, result="sent"),
+        "failovers": _counter_total(llm_router.LLM_FAILOVERS),
+    })
+    return summary
+
+
+def _counter_total(counter, **labels) -> int:
+    return int(sum(value for _, pairs, value in counter.samples() if set(labels.items()) <= set(pairs)))
+
+
+if __name__ == "__main__":
+    harness.main(run_level, "Benchmark do webhook da instância com um LLM falso.", add_arguments)
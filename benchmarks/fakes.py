@@ -0,0 +1,183 @@
+"""
+Substitutos locais dos serviços externos usados pelos benchmarks.
+
+- FakeGitHub: cria cada repositório como um repositório bare local; o
+  `clone_url` devolvido é um caminho absoluto, que o git_objects e o
+  GitPython sabem usar diretamente.
+- InMemorySupabase: tabelas em memória com o subconjunto da API do
+  cliente supabase-py usado pela fábrica (select/insert/upsert/update + eq/in_).
+- spawn_server: corre um servidor falso (ex.: benchmarks.mock_render) noutro processo.
+
+Instalam-se com `clients.override("github", ...)` e
+`clients.override("supabase", ...)`, sem tocar no código dos serviços.
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import threading
+import subprocess
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+class FakeGitHub:
+    """Imita `Github(...).get_user()` (create_repo/get_repo) com repositórios bare em `root`."""
+
+    def __init__(self, root: str, latency: float = 0.0):
+        self._root = root
+        self._latency = latency
+        os.makedirs(root, exist_ok=True)
+
+    def get_user(self) -> "FakeGitHub":
+        return self
+
+    def create_repo(self, name: str, private: bool = True) -> "_FakeRepo":
+        if self._latency:
+            time.sleep(self._latency)
+        path = os.path.join(self._root, f"{name}.git")
+        subprocess.run(["git", "init", "--bare", "--quiet", "--initial-branch=main", path], check=True)
+        return _FakeRepo(name=name, clone_url=path)
+
+    def get_repo(self, name: str) -> "_FakeRepo":
+        path = os.path.join(self._root, f"{name}.git")
+        if not os.path.isdir(path):
+            raise _NotFound(f"Repositório {name} não existe.")
+        return _FakeRepo(name=name, clone_url=path)
+
+
+class _NotFound(Exception):
+    status = 404
+
+
+@dataclass
+class _FakeRepo:
+    name: str
+    clone_url: str
+
+    def delete(self):
+        shutil.rmtree(self.clone_url)
+
+
+@dataclass
+class _Result:
+    data: list[dict]
+
+
+class InMemorySupabase:
+    """Cliente supabase em memória. `history` guarda (instante, tabela, linha) de cada escrita."""
+
+    def __init__(self, latency: float = 0.0):
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.tables: dict[str, dict[Any, dict]] = {}
+        self.history: list[tuple[float, str, dict]] = []
+
+    def table(self, name: str) -> "_Query":
+        return _Query(self, name)
+
+    def rows(self, name: str) -> list[dict]:
+        with self._lock:
+            return [dict(row) for row in self.tables.get(name, {}).values()]
+
+    def _write(self, name: str, key: Any, fields: dict, replace: bool = False):
+        table = self.tables.setdefault(name, {})
+        row = fields.copy() if replace or key not in table else {**table[key], **fields}
+        table[key] = row
+        self.history.append((time.perf_counter(), name, dict(row)))
+
+
+class _Query:
+    def __init__(self, db: InMemorySupabase, name: str):
+        self._db = db
+        self._name = name
+        self._action: Optional[str] = None
+        self._payload: Any = None
+        self._on_conflict = "id"
+        self._default_to_null = True
+        self._filters: list[tuple[str, Any]] = []
+
+    def select(self, columns: str = "*") -> "_Query":
+        self._action = "select"
+        return self
+
+    def insert(self, rows) -> "_Query":
+        self._action, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", default_to_null: bool = True) -> "_Query":
+        self._action, self._payload = "upsert", rows
+        self._on_conflict, self._default_to_null = on_conflict, default_to_null
+        return self
+
+    def update(self, fields: dict) -> "_Query":
+        self._action, self._payload = "update", fields
+        return self
+
+    def eq(self, column: str, value) -> "_Query":
+        self._filters.append((column, value))
+        return self
+
+    def in_(self, column: str, values) -> "_Query":
+        self._filters.append((column, [str(value) for value in values]))
+        return self
+
+    def _matches(self, row: dict) -> bool:
+        return all(str(row.get(column)) in value if isinstance(value, list) else str(row.get(column)) == str(value)
+                   for column, value in self._filters)
+
+    def execute(self) -> _Result:
+        if self._db._latency:
+            time.sleep(self._db._latency)
+        db = self._db
+        with db._lock:
+            table = db.tables.setdefault(self._name, {})
+            if self._action == "select":
+                return _Result([dict(row) for row in table.values() if self._matches(row)])
+            if self._action == "update":
+                keys = [key for key, row in table.items() if self._matches(row)]
+                for key in keys:
+                    db._write(self._name, key, self._payload)
+                return _Result([dict(table[key]) for key in keys])
+
+            rows = self._payload if isinstance(self._payload, list) else [self._payload]
+            for row in rows:
+                key = str(row.get(self._on_conflict, len(table)))
+                # default_to_null=True: colunas omitidas no upsert ficam a None, como no PostgREST
+                db._write(self._name, key, row, replace=self._action == "insert" or self._default_to_null)
+            return _Result([dict(row) for row in rows])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(app: str, env: Optional[dict] = None, timeout: float = 15.0,
+                 cwd: Optional[str] = None) -> tuple[str, subprocess.Popen]:
+    """
+    Arranca `app` (ex.: "benchmarks.mock_render:app") com uvicorn num processo
+    à parte, para que o servidor falso não conte no RSS nem dispute o GIL do
+    processo medido. Devolve o URL base e o processo, já a aceitar ligações.
+    `cwd` permite arrancar outro projeto (ex.: o template da instância).
+    """
+    port = free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd or root, env={**os.environ, **(env or {})}
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"O servidor {app} terminou com código {proc.returncode}.")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return f"http://127.0.0.1:{port}", proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"O servidor {app} não arrancou em {timeout:.0f} segundos.")
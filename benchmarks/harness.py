@@ -0,0 +1,91 @@
+"""
+Utilitários comuns aos benchmarks: percentis, resumo de uma corrida e
+execução de cada nível de concorrência num processo próprio, para que o
+pico de RSS medido pertença só a esse nível.
+
+Cada script de benchmark chama `main(run_level, ...)`: sem `--level`, o
+script volta a invocar-se uma vez por nível e imprime a tabela final; com
+`--level N`, corre só esse nível e escreve o resultado em JSON na última linha.
+"""
+
+import sys
+import json
+import math
+import argparse
+import resource
+import subprocess
+from typing import Callable
+
+DEFAULT_LEVELS = (1, 10, 100)
+_COLUMNS = ("concurrency", "jobs", "errors", "wall_s", "throughput", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Percentil pelo método nearest-rank."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    # No Linux o ru_maxrss vem em KiB; no macOS em bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(concurrency: int, latencies: list[float], wall: float, errors: int = 0, **extra) -> dict:
+    """Resume uma corrida; `latencies` em segundos, só dos jobs bem-sucedidos."""
+    return {
+        "concurrency": concurrency,
+        "jobs": len(latencies) + errors,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **extra,
+    }
+
+
+def print_table(results: list[dict]):
+    present = {key for row in results for key in row}
+    columns = [c for c in _COLUMNS if c in present] + [c for c in results[0] if c not in _COLUMNS] + \
+        sorted(present - set(_COLUMNS) - set(results[0]))
+    widths = {c: max(len(c), *(len(str(row.get(c, ""))) for row in results)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for row in results:
+        print("  ".join(str(row.get(c, "")).rjust(widths[c]) for c in columns))
+
+
+def main(run_level: Callable[[int, argparse.Namespace], dict], description: str,
+         add_arguments: Callable[[argparse.ArgumentParser], None] = None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--levels", type=lambda s: [int(x) for x in s.split(",")], default=list(DEFAULT_LEVELS),
+                        help="níveis de concorrência, separados por vírgulas (padrão: 1,10,100)")
+    parser.add_argument("--level", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="imprime os resultados em JSON")
+    if add_arguments:
+        add_arguments(parser)
+    args, _ = parser.parse_known_args()
+
+    if args.level is not None:
+        print(json.dumps(run_level(args.level, args)))
+        return
+
+    results = []
+    forwarded = [arg for arg in sys.argv[1:] if arg != "--json"]
+    for level in args.levels:
+        proc = subprocess.run([sys.executable, sys.argv[0], *forwarded, "--level", str(level)],
+                              stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"O nível {level} terminou com código {proc.returncode}.")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print(f"nível {level}: concluído", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
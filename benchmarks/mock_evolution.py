@@ -0,0 +1,73 @@
+"""
+Servidor falso da Evolution API para testar o envio de WhatsApp localmente.
+
+Implementa `POST /message/sendText/{instance}` com latência e falhas
+configuráveis e guarda as mensagens recebidas em memória.
+
+Uso:
+    MOCK_EVOLUTION_LATENCY_MS=200 MOCK_EVOLUTION_ERROR_RATE=0.1 \\
+        uvicorn benchmarks.mock_evolution:app --port 8081
+    # na instância: EVOLUTION_API_URL=http://127.0.0.1:8081 EVOLUTION_API_KEY=mock
+
+    GET  /_mock/sent   -> mensagens recebidas, por instância
+    POST /_mock/reset  -> limpa o estado
+"""
+
+import os
+import time
+import uuid
+import random
+import asyncio
+from collections import defaultdict, deque
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+MOCK_EVOLUTION_API_KEY = os.getenv("MOCK_EVOLUTION_API_KEY", "mock")
+MOCK_EVOLUTION_LATENCY_MS = float(os.getenv("MOCK_EVOLUTION_LATENCY_MS", "50"))
+# Fração de pedidos que falham com 500
+MOCK_EVOLUTION_ERROR_RATE = float(os.getenv("MOCK_EVOLUTION_ERROR_RATE", "0"))
+# Mensagens por segundo aceites por instância antes de responder 429 (0 desativa)
+MOCK_EVOLUTION_RATE_LIMIT = float(os.getenv("MOCK_EVOLUTION_RATE_LIMIT", "0"))
+
+app = FastAPI(title="Mock Evolution API")
+sent: dict[str, list[dict]] = defaultdict(list)
+_recent: dict[str, deque] = defaultdict(deque)
+
+
+@app.post("/message/sendText/{instance}", status_code=201)
+async def send_text(instance: str, request: Request, apikey: str = Header(None)):
+    if apikey != MOCK_EVOLUTION_API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    body = await request.json()
+    if not body.get("number") or not body.get("text"):
+        raise HTTPException(status_code=400, detail="number e text são obrigatórios")
+
+    await asyncio.sleep(MOCK_EVOLUTION_LATENCY_MS / 1000 * random.uniform(0.5, 1.5))
+
+    if MOCK_EVOLUTION_RATE_LIMIT:
+        now, recent = time.monotonic(), _recent[instance]
+        while recent and now - recent[0] > 1.0:
+            recent.popleft()
+        if len(recent) >= MOCK_EVOLUTION_RATE_LIMIT:
+            return JSONResponse(status_code=429, content={"error": "rate limited"}, headers={"Retry-After": "1"})
+        recent.append(now)
+    if random.random() < MOCK_EVOLUTION_ERROR_RATE:
+        raise HTTPException(status_code=500, detail="Falha simulada")
+
+    message_id = uuid.uuid4().hex.upper()
+    sent[instance].append({"id": message_id, "number": body["number"], "text": body["text"], "at": time.time()})
+    return {"key": {"remoteJid": f"{body['number']}@s.whatsapp.net", "fromMe": True, "id": message_id},
+            "status": "PENDING"}
+
+
+@app.get("/_mock/sent")
+def list_sent():
+    return {instance: messages for instance, messages in sent.items()}
+
+
+@app.post("/_mock/reset")
+def reset():
+    sent.clear()
+    _recent.clear()
+    return {"status": "ok"}
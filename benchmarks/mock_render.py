@@ -0,0 +1,95 @@
+"""
+Servidor falso da API do Render para correr o provisionamento localmente.
+
+Implementa a criação e remoção de serviços, a consulta dos deploys e a
+atualização de variáveis de ambiente, com latência e falhas configuráveis. Cada serviço
+criado passa de 'build_in_progress' a 'live' ao fim de MOCK_RENDER_DEPLOY_SECONDS.
+
+Uso:
+    MOCK_RENDER_LATENCY_MS=100 MOCK_RENDER_ERROR_RATE=0.05 \\
+        uvicorn benchmarks.mock_render:app --port 8082
+    # na fábrica: RENDER_API_URL=http://127.0.0.1:8082 RENDER_API_KEY=mock
+
+    GET  /_mock/services -> serviços criados
+    POST /_mock/reset    -> limpa o estado
+"""
+
+import os
+import time
+import uuid
+import random
+import asyncio
+
+from fastapi import FastAPI, Header, HTTPException, Request
+
+MOCK_RENDER_API_KEY = os.getenv("MOCK_RENDER_API_KEY", "mock")
+MOCK_RENDER_LATENCY_MS = float(os.getenv("MOCK_RENDER_LATENCY_MS", "50"))
+# Fração de pedidos que falham com 500
+MOCK_RENDER_ERROR_RATE = float(os.getenv("MOCK_RENDER_ERROR_RATE", "0"))
+# Tempo (segundos) até o deploy de um serviço novo ficar 'live'
+MOCK_RENDER_DEPLOY_SECONDS = float(os.getenv("MOCK_RENDER_DEPLOY_SECONDS", "2"))
+
+app = FastAPI(title="Mock Render API")
+services: dict[str, dict] = {}
+
+
+async def _simular(authorization: str):
+    if authorization != f"Bearer {MOCK_RENDER_API_KEY}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    await asyncio.sleep(MOCK_RENDER_LATENCY_MS / 1000 * random.uniform(0.5, 1.5))
+    if random.random() < MOCK_RENDER_ERROR_RATE:
+        raise HTTPException(status_code=500, detail="Falha simulada")
+
+
+@app.post("/services", status_code=201)
+async def create_service(request: Request, authorization: str = Header(None)):
+    await _simular(authorization)
+    body = await request.json()
+    service_id = f"srv-{uuid.uuid4().hex[:20]}"
+    services[service_id] = {
+        "id": service_id,
+        "name": body["name"],
+        "repo": body["repo"],
+        "env": {var["key"]: var["value"] for var in body["serviceDetails"]["envVars"]},
+        "created_at": time.monotonic(),
+    }
+    return {"service": {"id": service_id, "name": body["name"],
+                        "serviceDetails": {"url": f"https://{body['name']}.onrender.com"}}}
+
+
+@app.get("/services/{service_id}/deploys")
+async def list_deploys(service_id: str, authorization: str = Header(None)):
+    await _simular(authorization)
+    service = services.get(service_id)
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
+    ready = time.monotonic() - service["created_at"] >= MOCK_RENDER_DEPLOY_SECONDS
+    return [{"deploy": {"id": f"dep-{service_id[4:]}", "status": "live" if ready else "build_in_progress"}}]
+
+
+@app.put("/services/{service_id}/env-vars/{key}")
+async def update_env_var(service_id: str, key: str, request: Request, authorization: str = Header(None)):
+    await _simular(authorization)
+    service = services.get(service_id)
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
+    service["env"][key] = (await request.json())["value"]
+    return {"key": key, "value": service["env"][key]}
+
+
+@app.delete("/services/{service_id}", status_code=204)
+async def delete_service(service_id: str, authorization: str = Header(None)):
+    await _simular(authorization)
+    if not services.pop(service_id, None):
+        raise HTTPException(status_code=404, detail="Service not found")
+
+
+@app.get("/_mock/services")
+def list_services():
+    return list(services.values())
+
+
+@app.post("/_mock/reset")
+def reset():
+    services.clear()
+    return {"status": "ok"}
@@ -0,0 +1,120 @@
+import os
+import subprocess
+
+import pytest
+
+from app.api.models import CampaignDetails
+from app.services import git_objects, project_builder, template_cache
+
+
+def _details(offer: str = "Diagnóstico gratuito") -> CampaignDetails:
+    return CampaignDetails(campaignName="Teste", objective="Agendar reuniões", assistantPersona="SDR",
+                           toneOfVoice="Próximo", offer=offer, customerProfile="PMEs de serviços")
+
+
+def _git(repo: str, *args: str) -> str:
+    return subprocess.run(["git", "-C", repo, *args], check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def manifest(monkeypatch):
+    # Só o Gemini: o requirements.txt renderizado difere do original do template
+    monkeypatch.setenv("INSTANCE_LLM_PROVIDERS", "gemini")
+    return template_cache.get_manifest()
+
+
+@pytest.fixture
+def bare_repo(tmp_path):
+    path = str(tmp_path / "remote.git")
+    subprocess.run(["git", "init", "--bare", "--quiet", path], check=True)
+    return path
+
+
+@pytest.fixture
+def receive_packs(monkeypatch):
+    """Processos `git receive-pack` lançados durante o teste."""
+    procs = []
+    popen = subprocess.Popen
+
+    def spy(*args, **kwargs):
+        proc = popen(*args, **kwargs)
+        procs.append(proc)
+        return proc
+    monkeypatch.setattr(git_objects.subprocess, "Popen", spy)
+    return procs
+
+
+def _push_initial(manifest, bare_repo) -> tuple[str, dict]:
+    rendered = project_builder.render_files(manifest, _details())
+    sha, objects = git_objects.build_commit(manifest, rendered, "Commit inicial")
+    assert git_objects.push_objects(bare_repo, sha, objects) == git_objects.ZERO_SHA
+    return sha, rendered
+
+
+def test_full_push_is_a_valid_repository_with_the_rendered_files(manifest, bare_repo):
+    sha, rendered = _push_initial(manifest, bare_repo)
+
+    _git(bare_repo, "fsck", "--full", "--strict")
+    assert _git(bare_repo, "rev-parse", "refs/heads/main").strip() == sha
+    assert sorted(_git(bare_repo, "ls-tree", "-r", "--name-only", "main").split()) == sorted(manifest.files)
+    for rel_path, content in rendered.items():
+        assert _git(bare_repo, "show", f"main:{rel_path}") == content
+
+
+def test_full_pack_skips_template_blobs_replaced_by_rendered_files(manifest):
+    rendered = project_builder.render_files(manifest, _details())
+    with open(f"{manifest.root}/{template_cache.REQUIREMENTS_TXT}", "rb") as f:
+        content = f.read()
+    assert rendered[template_cache.REQUIREMENTS_TXT].encode() != content
+    original = git_objects.make_object("blob", content)
+
+    _, objects = git_objects.build_commit(manifest, rendered, "Commit inicial")
+    assert original.sha not in {obj.sha for obj in objects}
+    assert template_cache.REQUIREMENTS_TXT not in git_objects.get_template_objects(manifest).blobs
+
+
+
+def test_template_tests_are_not_shipped_to_instances(manifest, bare_repo):
+    assert os.path.isdir(os.path.join(manifest.root, "tests"))
+    assert not [path for path in manifest.files if path.split("/")[0] in template_cache.DEV_ONLY_PATHS]
+
+    _push_initial(manifest, bare_repo)
+    assert not set(_git(bare_repo, "ls-tree", "--name-only", "main").split()) & template_cache.DEV_ONLY_PATHS
+
+
+def test_incremental_push_only_sends_new_objects(manifest, bare_repo):
+    parent, _ = _push_initial(manifest, bare_repo)
+    rendered = project_builder.render_files(manifest, _details(offer="Demonstração"))
+    sha, objects = git_objects.build_commit(manifest, rendered, "Atualização", parent=parent, include_template=False)
+
+    assert git_objects.push_objects(bare_repo, sha, objects, old_sha=parent) == parent
+    _git(bare_repo, "fsck", "--full", "--strict")
+    assert _git(bare_repo, "rev-list", "main").split() == [sha, parent]
+    changed = _git(bare_repo, "diff", "--name-only", parent, sha).split()
+    assert changed and set(changed) <= set(manifest.slots)
+
+
+def test_stale_ref_is_rejected_and_receive_pack_is_reaped(manifest, bare_repo, receive_packs):
+    parent, _ = _push_initial(manifest, bare_repo)
+    rendered = project_builder.render_files(manifest, _details(offer="Demonstração"))
+    sha, objects = git_objects.build_commit(manifest, rendered, "Atualização", parent=parent, include_template=False)
+
+    with pytest.raises(git_objects.StaleRefError):
+        git_objects.push_objects(bare_repo, sha, objects, old_sha="1" * 40)
+    assert _git(bare_repo, "rev-parse", "refs/heads/main").strip() == parent
+    assert all(proc.returncode is not None for proc in receive_packs)
+
+
+def test_error_while_streaming_the_pack_is_not_masked(manifest, bare_repo, receive_packs, monkeypatch):
+    rendered = project_builder.render_files(manifest, _details())
+    sha, objects = git_objects.build_commit(manifest, rendered, "Commit inicial")
+
+    def broken_pack(objects):
+        yield b"PACK"
+        raise RuntimeError("falha ao gerar o pack")
+    monkeypatch.setattr(git_objects, "iter_pack", broken_pack)
+
+    with pytest.raises(RuntimeError, match="falha ao gerar o pack"):
+        git_objects.push_objects(bare_repo, sha, objects)
+    assert all(proc.returncode is not None for proc in receive_packs)
+    assert _git(bare_repo, "for-each-ref").strip() == ""
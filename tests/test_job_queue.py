@@ -0,0 +1,125 @@
+import time
+import threading
+from collections import Counter
+
+import pytest
+
+from app.services.job_queue import (
+    ProvisioningQueue, QueueFullError, STATUS_COMPLETED, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING,
+)
+
+
+def _wait_for(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condição não satisfeita dentro do tempo limite.")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def queues():
+    started = []
+    yield started
+    for queue in started:
+        queue.stop(timeout=1)
+
+
+def _start(queues, handler, db_path, **kwargs) -> ProvisioningQueue:
+    queue = ProvisioningQueue(handler, db_path=db_path, **kwargs)
+    queue.start()
+    queues.append(queue)
+    return queue
+
+
+class Recorder:
+    """Handler que regista cada payload processado, com uma pequena pausa para forçar concorrência."""
+
+    def __init__(self, delay: float = 0.002):
+        self.delay = delay
+        self.handled: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, payload: str):
+        time.sleep(self.delay)
+        with self._lock:
+            self.handled[payload] += 1
+        return {"payload": payload}
+
+
+def test_each_job_is_claimed_by_exactly_one_worker(queues, db_path):
+    handler = Recorder()
+    queue = _start(queues, handler, db_path, workers=8, max_depth=1000)
+    jobs = queue.enqueue_many([(f"c{i}", f"p{i}") for i in range(200)])
+
+    _wait_for(lambda: queue.depth() == 0)
+    assert handler.handled == Counter({f"p{i}": 1 for i in range(200)})
+    for job in jobs:
+        status = queue.get_status(job["campaign_id"])
+        assert status["status"] == STATUS_COMPLETED and status["attempts"] == 1
+        assert status["result"] == {"payload": job["campaign_id"].replace("c", "p")}
+
+
+def test_two_queues_on_the_same_database_never_claim_the_same_job(queues, db_path):
+    handler = Recorder()
+    first = _start(queues, handler, db_path, workers=4, max_depth=1000)
+    second = _start(queues, handler, db_path, workers=4, max_depth=1000)
+    first.enqueue_many([(f"a{i}", f"a{i}") for i in range(100)])
+    second.enqueue_many([(f"b{i}", f"b{i}") for i in range(100)])
+
+    _wait_for(lambda: first.depth() == 0)
+    assert len(handler.handled) == 200
+    assert set(handler.handled.values()) == {1}
+
+
+def test_pending_job_is_reused_and_depth_is_bounded(queues, db_path):
+    release = threading.Event()
+    queue = _start(queues, lambda payload: release.wait(5), db_path, workers=1, max_depth=2)
+    first = queue.enqueue("c1", "p1")
+    assert queue.enqueue("c1", "p1-repetido")["job_id"] == first["job_id"]
+    queue.enqueue("c2", "p2")
+    with pytest.raises(QueueFullError):
+        queue.enqueue_many([("c3", "p3"), ("c4", "p4")])
+    assert queue.get_status("c3") is None
+    release.set()
+
+
+def test_jobs_left_running_by_a_restart_are_resumed(queues, db_path):
+    release = threading.Event()
+    started = threading.Event()
+
+    def stuck(payload):
+        started.set()
+        release.wait(5)
+
+    interrupted = ProvisioningQueue(stuck, db_path=db_path, workers=1)
+    interrupted.start()
+    interrupted.enqueue("c1", "p1")
+    interrupted.enqueue("c2", "p2")
+    assert started.wait(5)
+    # O processo "morre" com c1 em execução e c2 em fila
+    interrupted.stop(timeout=0.1)
+    release.set()
+
+    handler = Recorder(delay=0)
+    queue = _start(queues, handler, db_path, workers=2)
+    _wait_for(lambda: queue.depth() == 0)
+    assert handler.handled == Counter({"p1": 1, "p2": 1})
+    assert queue.get_status("c1")["attempts"] == 2
+    assert queue.get_status("c2")["attempts"] == 1
+
+
+def test_failed_handler_marks_the_job_failed(queues, db_path):
+    def failing(payload):
+        raise RuntimeError("Render indisponível")
+
+    queue = _start(queues, failing, db_path, workers=1)
+    queue.enqueue("c1", "p1")
+    _wait_for(lambda: queue.get_status("c1")["status"] not in (STATUS_QUEUED, STATUS_RUNNING))
+    job = queue.get_status("c1")
+    assert job["status"] == STATUS_FAILED and job["error"] == "Render indisponível"
@@ -0,0 +1,32 @@
+import pytest
+
+from app.api.models import CampaignDetails
+from app.services import clients, render_service, shared_runtime
+from benchmarks.fakes import InMemorySupabase
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    monkeypatch.setattr(shared_runtime, "SHARED_RUNTIME_URL", "https://bcl-shared.onrender.com/")
+    fake = InMemorySupabase()
+    clients.override("supabase", fake)
+    yield fake
+    clients.reset("supabase")
+
+
+DETAILS = CampaignDetails(campaignName="Verão", objective="vender", assistantPersona="Ana", toneOfVoice="leve",
+                          offer="10%", customerProfile="PME")
+
+
+def test_registered_campaign_uses_its_own_evolution_instance(supabase):
+    service_url, api_key, webhook_id = shared_runtime.register_campaign("c1", DETAILS)
+
+    [row] = supabase.rows(shared_runtime.CAMPAIGN_REGISTRY_TABLE)
+    assert row["whatsapp_instance"] == render_service.evolution_instance_name("c1")
+    assert (row["webhook_id"], row["api_key"]) == (webhook_id, api_key)
+    assert service_url == "https://bcl-shared.onrender.com"
+
+
+def test_webhook_url_points_at_the_campaign_route():
+    assert shared_runtime.webhook_url("https://bcl-shared.onrender.com/", "wh_1") == \
+        "https://bcl-shared.onrender.com/webhook/wh_1"
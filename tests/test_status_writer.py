@@ -0,0 +1,101 @@
+import pytest
+
+from app.services import clients
+from app.services.status_writer import StatusWriter
+from benchmarks.fakes import InMemorySupabase
+
+
+class CountingSupabase(InMemorySupabase):
+    """Regista a ação de cada pedido enviado ao Supabase."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: list[str] = []
+
+    def table(self, name: str):
+        query = super().table(name)
+        execute = query.execute
+
+        def counted():
+            self.calls.append(query._action)
+            return execute()
+        query.execute = counted
+        return query
+
+
+@pytest.fixture
+def supabase():
+    fake = CountingSupabase()
+    clients.override("supabase", fake)
+    yield fake
+    clients.reset("supabase")
+
+
+@pytest.fixture
+def writer():
+    writer = StatusWriter(flush_interval=3600)
+    writer.start()
+    yield writer
+    writer.stop()
+
+
+def _seed(supabase, campaign_ids):
+    supabase.table("campaigns").insert(
+        [{"id": cid, "name": f"Campanha {cid}", "status": "pending"} for cid in campaign_ids]
+    ).execute()
+    supabase.calls.clear()
+
+
+def test_flush_writes_campaigns_with_different_values_in_one_call(supabase, writer):
+    campaign_ids = [f"c{i}" for i in range(50)]
+    _seed(supabase, campaign_ids)
+    for cid in campaign_ids:
+        writer.write(cid, {"status": "deploying", "service_url": f"https://{cid}.onrender.com", "api_key": f"key-{cid}"})
+
+    writer.flush()
+    assert supabase.calls == ["select", "upsert"]
+    rows = {row["id"]: row for row in supabase.rows("campaigns")}
+    for cid in campaign_ids:
+        assert rows[cid] == {"id": cid, "name": f"Campanha {cid}", "status": "deploying",
+                             "service_url": f"https://{cid}.onrender.com", "api_key": f"key-{cid}"}
+
+
+def test_updates_of_the_same_campaign_are_merged(supabase, writer):
+    _seed(supabase, ["c1"])
+    writer.write("c1", {"status": "deploying", "service_url": "https://c1.onrender.com"})
+    writer.write("c1", {"status": "active", "api_key": "chave"})
+
+    writer.flush()
+    assert supabase.calls == ["select", "upsert"]
+    assert supabase.rows("campaigns") == [{"id": "c1", "name": "Campanha c1", "status": "active",
+                                           "service_url": "https://c1.onrender.com", "api_key": "chave"}]
+
+
+def test_unknown_campaigns_are_never_created(supabase, writer, caplog):
+    _seed(supabase, ["c1"])
+    writer.write("c1", {"status": "active"})
+    writer.write("fantasma", {"status": "active"})
+
+    writer.flush()
+    assert [row["id"] for row in supabase.rows("campaigns")] == ["c1"]
+    assert "A campanha com ID fantasma não foi encontrada" in caplog.text
+
+
+def test_failed_batch_falls_back_to_individual_updates(supabase, writer, monkeypatch):
+    _seed(supabase, ["c1", "c2"])
+
+    def broken_upsert(self, *args, **kwargs):
+        raise RuntimeError("coluna gerada")
+    monkeypatch.setattr(type(supabase.table("campaigns")), "upsert", broken_upsert)
+    writer.write("c1", {"status": "active"})
+    writer.write("c2", {"status": "failed"})
+
+    writer.flush()
+    assert {row["id"]: row["status"] for row in supabase.rows("campaigns")} == {"c1": "active", "c2": "failed"}
+
+
+def test_writes_go_straight_through_while_the_flusher_is_stopped(supabase):
+    _seed(supabase, ["c1"])
+    StatusWriter().write("c1", {"status": "active"})
+    assert supabase.calls == ["update"]
+    assert supabase.rows("campaigns")[0]["status"] == "active"